@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Small benchmarks that guard against performance regressions.
+
+Usage:
+    python scripts/benchmark.py importtime [--max-ms 150] [--module src.__main__]
+    python scripts/benchmark.py version [--count 2000] [--rounds 20]
+    python scripts/benchmark.py scrapers [--fixtures fixtures] [--apps youtube,tiktok] [--latency 50]
+    python scripts/benchmark.py scrapers --record fixtures   # capture fixtures from the live sites
+
+Replays default to the apps and platforms listed in the fixtures' index.json,
+which --record writes; the committed fixtures/ cover Aptoide only.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import timeit
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+PLATFORMS = ["apkmirror", "apkpure", "uptodown", "aptoide"]
+
+def importtime(args):
+    """Measure `python -X importtime` for the builder entry point"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {args.module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        return 1
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent)))
+
+    # Top-level entries (no indentation) add up to the total import cost
+    total_ms = sum(cumulative for _, _, cumulative, depth in modules if depth == 0) / 1000
+
+    print(f"Import of {args.module}: {total_ms:.1f} ms (budget {args.max_ms} ms)")
+    print("Slowest top-level imports:")
+    top = sorted((m for m in modules if m[3] == 0), key=lambda m: m[2], reverse=True)
+    for name, _, cumulative, _ in top[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if total_ms > args.max_ms:
+        print("❌ Import time over budget")
+        return 1
+    print("✅ Import time within budget")
+    return 0
+
+def version(args):
+    """Compare cached version keys with re-normalising on every comparison"""
+    from functools import cmp_to_key
+    from src.version import version_key
+
+    def normalize(v):
+        return [int(m.group(1)) if (m := re.match(r'(\d+)', part)) else 0 for part in v.split('.')]
+
+    def renormalising_cmp(a, b):
+        return (normalize(a) > normalize(b)) - (normalize(a) < normalize(b))
+
+    rng = random.Random(0)
+    suffixes = ["", "", "", "-dev.3", "-beta.1", "-release2", "-rc.1"]
+    versions = [
+        ".".join(str(rng.randint(0, 40)) for _ in range(rng.randint(2, 4))) + rng.choice(suffixes)
+        for _ in range(args.count)
+    ]
+
+    def cached():
+        version_key.cache_clear()
+        sorted(versions, key=version_key)
+        max(versions, key=version_key)
+
+    def renormalised():
+        sorted(versions, key=cmp_to_key(renormalising_cmp))
+        max(versions, key=cmp_to_key(renormalising_cmp))
+
+    cached_ms = min(timeit.repeat(cached, number=1, repeat=args.rounds)) * 1000
+    baseline_ms = min(timeit.repeat(renormalised, number=1, repeat=args.rounds)) * 1000
+    print(f"sort+max of {args.count} versions:")
+    print(f"  version_key (parsed once): {cached_ms:8.2f} ms")
+    print(f"  normalise per comparison:  {baseline_ms:8.2f} ms")
+    return 0
+
+def scrapers(args):
+    """Resolve a version and download link per app and platform against replayed fixtures"""
+    server = None
+    fixtures_dir = os.path.abspath(args.fixtures)
+    if not args.record and not (os.path.isdir(fixtures_dir) and os.listdir(fixtures_dir)):
+        print(f"❌ No fixtures in {fixtures_dir}; record them first with "
+              f"`python scripts/benchmark.py scrapers --record {os.path.relpath(fixtures_dir)}` or pass --fixtures DIR")
+        return 1
+    index = {}
+    if not args.record and os.path.exists(os.path.join(fixtures_dir, "index.json")):
+        with open(os.path.join(fixtures_dir, "index.json")) as f:
+            index = json.load(f)
+    os.chdir(ROOT)
+    if args.record:
+        os.environ["HTTP_RECORD_DIR"] = os.path.abspath(args.record)
+    else:
+        # Separate process, so its CPU time stays out of the numbers
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "scripts", "replay_server.py"),
+             "--fixtures", fixtures_dir, "--port", "0",
+             "--latency", str(args.latency), "--error-rate", str(args.error_rate), "--seed", "0"],
+            stdout=subprocess.PIPE, text=True
+        )
+        os.environ["HTTP_REPLAY_URL"] = server.stdout.readline().split()[-1]
+
+    try:
+        from importlib import import_module
+        from src import catalog, fixtures, session
+        session.headers  # build the client up front, outside the timings
+        apps = args.apps.split(",") if args.apps else index.get("apps") or sorted({b["app_name"] for b in catalog.builds()})
+        platforms = args.platforms.split(",") if args.platforms else index.get("platforms") or PLATFORMS
+
+        results = []
+        for app_name in apps:
+            for platform in platforms:
+                config = catalog.config(app_name, platform)
+                if config is None:
+                    continue
+                module = import_module(f"src.{platform}")
+                fixtures.stats.clear()
+                wall, cpu = time.perf_counter(), time.process_time()
+                error = link = None
+                try:
+                    version = config.get("version") or module.get_latest_version(app_name, config)
+                    link = module.get_download_link(version, app_name, config)
+                except Exception as e:
+                    error = str(e)[:60]
+                results.append({
+                    "app": app_name,
+                    "platform": platform,
+                    "ok": bool(link),
+                    "ms": (time.perf_counter() - wall) * 1000,
+                    "cpu_ms": (time.process_time() - cpu) * 1000,
+                    "requests": sum(fixtures.stats.values()),
+                    "error": error,
+                })
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    print(f"{'app':<20} {'platform':<10} {'ok':<3} {'ms':>8} {'cpu ms':>8} {'reqs':>5}")
+    for r in results:
+        print(f"{r['app']:<20} {r['platform']:<10} {'✓' if r['ok'] else '✗':<3} "
+              f"{r['ms']:8.1f} {r['cpu_ms']:8.1f} {r['requests']:5d}  {r['error'] or ''}")
+    for platform in platforms:
+        rows = [r for r in results if r["platform"] == platform]
+        if rows:
+            print(f"{platform}: {sum(r['ok'] for r in rows)}/{len(rows)} resolved, "
+                  f"{sum(r['ms'] for r in rows) / len(rows):.1f} ms avg, "
+                  f"{sum(r['cpu_ms'] for r in rows) / len(rows):.1f} ms cpu avg, "
+                  f"{sum(r['requests'] for r in rows)} requests")
+
+    if args.record:
+        os.makedirs(os.path.abspath(args.record), exist_ok=True)
+        with open(os.path.join(os.path.abspath(args.record), "index.json"), "w") as f:
+            json.dump({
+                "apps": sorted({r["app"] for r in results if r["ok"]}),
+                "platforms": [p for p in platforms if any(r["ok"] and r["platform"] == p for r in results)],
+            }, f, indent=2)
+            f.write("\n")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("importtime", help="startup import cost of the builder")
+    p.add_argument("--module", default="src.__main__")
+    p.add_argument("--max-ms", type=float, default=150.0)
+    p.set_defaults(func=importtime)
+
+    p = sub.add_parser("version", help="version ordering cost")
+    p.add_argument("--count", type=int, default=2000)
+    p.add_argument("--rounds", type=int, default=20)
+    p.set_defaults(func=version)
+
+    p = sub.add_parser("scrapers", help="per-platform version/link resolution over replayed HTTP")
+    p.add_argument("--fixtures", default=os.path.join(ROOT, "fixtures"))
+    p.add_argument("--record", metavar="DIR", help="hit the live sites and save fixtures to DIR instead")
+    p.add_argument("--apps", help="comma-separated app names (default: every app in patch-config.json)")
+    p.add_argument("--platforms", help=f"comma-separated platforms (default: {','.join(PLATFORMS)})")
+    p.add_argument("--latency", type=float, default=0.0, help="replay latency per request, in ms")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--json", help="write the raw results here")
+    p.set_defaults(func=scrapers)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+if __name__ == "__main__":
+    main()
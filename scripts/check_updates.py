@@ -6,6 +6,12 @@ import subprocess
 import re
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from src import catalog
+
+# Platforms whose configs get their version filled in
+APP_DIRS = ['apkmirror', 'apkpure', 'uptodown']
+
 # Always trigger build - we'll rely on schedule and manual triggers
 print("Triggering build...")
 
@@ -35,14 +41,11 @@ def get_apkmirror_version(package_name):
     
     return None
 
-def check_and_update_config(config_file):
+def check_and_update_config(config_file, config):
     """
     Check and update a single config file if version is empty
     """
     try:
-        with open(config_file, 'r') as f:
-            config = json.load(f)
-        
         # Only update if version is empty
         if config.get('version') == '':
             package = config.get('package', '')
@@ -85,20 +88,14 @@ def main():
     print(f"Current working directory: {os.getcwd()}")
     print(f"Files in current directory: {os.listdir('.')}")
     
-    # Read patch-config.json
-    try:
-        with open('patch-config.json', 'r') as f:
-            patch_config = json.load(f)
-        print("Successfully loaded patch-config.json")
-    except Exception as e:
-        print(f"Error loading patch-config.json: {e}")
-        return
+    # Every config is parsed once, up front
+    catalog.load()
     
     updated = False
     apps_checked = set()
     
     # Check each app in patch list
-    for app_config in patch_config['patch_list']:
+    for app_config in catalog.builds():
         app_name = app_config['app_name']
         
         # Skip if we already checked this app
@@ -108,14 +105,13 @@ def main():
         apps_checked.add(app_name)
         
         # Check all possible app config locations
-        app_dirs = ['apps/apkmirror', 'apps/apkpure', 'apps/uptodown']
-        
-        for app_dir in app_dirs:
-            config_file = f"{app_dir}/{app_name}.json"
+        for platform in APP_DIRS:
+            config = catalog.config(app_name, platform)
             
-            if os.path.exists(config_file):
+            if config is not None:
+                config_file = str(catalog.config_path(app_name, platform))
                 print(f"\nChecking {config_file}...")
-                if check_and_update_config(config_file):
+                if check_and_update_config(config_file, config):
                     updated = True
                     print(f"✓ Updated {config_file}")
                 else:
@@ -124,16 +120,16 @@ def main():
     
     # Also check if there are any configs not in patch-config.json
     # This ensures all configs are up to date
-    for app_dir in app_dirs:
-        if os.path.exists(app_dir):
-            for config_file in os.listdir(app_dir):
-                if config_file.endswith('.json'):
-                    full_path = os.path.join(app_dir, config_file)
-                    app_name = config_file.replace('.json', '')
-                    if app_name not in apps_checked:
-                        print(f"\nChecking additional config: {full_path}...")
-                        if check_and_update_config(full_path):
-                            updated = True
+    for app_name in catalog.apps():
+        if app_name in apps_checked:
+            continue
+        for platform in APP_DIRS:
+            config = catalog.config(app_name, platform)
+            if config is not None:
+                full_path = str(catalog.config_path(app_name, platform))
+                print(f"\nChecking additional config: {full_path}...")
+                if check_and_update_config(full_path, config):
+                    updated = True
     
     # Output for GitHub Actions
     if updated:
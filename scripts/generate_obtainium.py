@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""Regenerate obtainium.json from the app catalog and the latest build manifests.
+
+Entries keep their position and are only rewritten when their package id,
+source or APK filter changes; apps that are no longer built are dropped and
+new ones are appended in patch-config.json order. Every apkFilterRegEx is
+checked against the artifact names the builder produces
+("{app}-{arch}-{name}-v{version}.apk") and must not pick up another app's APKs.
+
+Usage:
+    python scripts/generate_obtainium.py [--manifests DIR] [--check]
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from src import catalog, manifest, repository
+from src.release import convert_title
+
+OBTAINIUM_PATH = "obtainium.json"
+
+DEFAULT_SETTINGS = {
+    "includePrereleases": False,
+    "fallbackToOlderReleases": True,
+    "filterReleaseTitlesByRegEx": "",
+    "filterReleaseNotesByRegEx": "",
+    "verifyLatestTag": False,
+    "sortMethodChoice": "date",
+    "useLatestAssetDateAsReleaseDate": True,
+    "releaseTitleAsVersion": False,
+    "trackOnly": False,
+    "versionExtractionRegEx": "",
+    "matchGroupToUse": "",
+    "versionDetection": True,
+    "releaseDateAsVersion": True,
+    "useVersionCodeAsOSVersion": False,
+    "apkFilterRegEx": "",
+    "invertAPKFilter": False,
+    "autoApkFilterByArch": True,
+    "appName": "",
+    "appAuthor": "",
+    "shizukuPretendToBeGooglePlay": False,
+    "allowInsecure": False,
+    "exemptFromBackgroundUpdates": False,
+    "skipUpdateNotifications": False,
+    "about": "",
+    "refreshBeforeDownload": False,
+    "includeZips": False,
+    "zippedApkFilterRegEx": "",
+}
+
+def _literal(text: str) -> str:
+    return re.sub(r'([^\w-])', r'\\\1', text)
+
+def _regex_app(regex: str) -> str | None:
+    """App name an existing filter was written for, e.g. "^youtube-music-.*\\.apk$" -> "youtube-music" """
+    match = re.match(r'^\^(.+?)-(?:\.\*|\(\?:)', regex)
+    return re.sub(r'\\(.)', r'\1', match.group(1)) if match else None
+
+def filter_regex(app_name: str, anchored: bool = False) -> str:
+    if anchored:
+        return f"^{_literal(app_name)}-(?:{'|'.join(catalog.ARCHES)})-.*\\.apk$"
+    return f"^{_literal(app_name)}-.*\\.apk$"
+
+def expected_artifacts(build: dict, manifests: dict) -> list[str]:
+    """Artifact names a build produces: from its manifest, else from the configs"""
+    found = manifests.get((build["app_name"], build["source"]))
+    if found:
+        return [artifact["file"] for artifact in found["artifacts"]]
+    try:
+        name = catalog.source_name(build["source"])
+    except FileNotFoundError:
+        name = build["source"]
+    arches = catalog.arches(build["app_name"], build["source"]) or ["universal"]
+    return [manifest.artifact_name(build["app_name"], arch, name, "1.0.0") for arch in arches]
+
+def check_filter(regex: str, own: list[str], others: list[str]) -> list[str]:
+    problems = []
+    try:
+        pattern = re.compile(regex)
+    except re.error as e:
+        return [f"invalid regex {regex!r}: {e}"]
+    problems += [f"{regex!r} does not match {name}" for name in own if not pattern.search(name)]
+    problems += [f"{regex!r} also matches {name}" for name in others if pattern.search(name)]
+    return problems
+
+def format_json(document: dict) -> str:
+    """Two-space JSON with short scalar lists kept on one line, as the file is written by hand"""
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    text = re.sub(
+        r'\[\n\s+((?:"[^"\n]*"|[\d.]+)(?:,\n\s+(?:"[^"\n]*"|[\d.]+))*)\n\s+\]',
+        lambda m: '[' + re.sub(r',\n\s+', ', ', m.group(1)) + ']',
+        text
+    )
+    return text + "\n"
+
+def generate(document: dict, manifests: dict) -> tuple[dict, list[str], list[str]]:
+    """New document, a list of changes and a list of filter problems"""
+    builds = []
+    for build in catalog.builds():
+        if build["app_name"] not in [b["app_name"] for b in builds]:
+            builds.append(build)
+    artifacts = {build["app_name"]: expected_artifacts(build, manifests) for build in builds}
+
+    def others(app_name):
+        return [name for other, names in artifacts.items() if other != app_name for name in names]
+
+    existing = {}
+    for entry in document.get("apps", []):
+        settings = json.loads(entry["additionalSettings"])
+        existing.setdefault(_regex_app(settings.get("apkFilterRegEx", "")), entry)
+
+    template = document["apps"][0] if document.get("apps") else {
+        "id": None,
+        "url": f"https://github.com/{repository}",
+        "author": (repository or "").split("/")[0],
+        "name": None,
+        "preferredApkIndex": 0,
+        "additionalSettings": None,
+        "categories": ["ReVanced"],
+        "allowIdChange": True,
+        "overrideSource": "GitHub",
+    }
+
+    entries, changes, problems = {}, [], []
+    for build in builds:
+        app_name, source = build["app_name"], build["source"]
+        entry = existing.get(app_name)
+        settings = json.loads(entry["additionalSettings"]) if entry else dict(DEFAULT_SETTINGS)
+
+        # Keep a working filter; anchor it on the arch only when it would
+        # also pick up another app's APKs (e.g. youtube vs youtube-music)
+        regex = settings.get("apkFilterRegEx") or filter_regex(app_name)
+        if check_filter(regex, artifacts[app_name], others(app_name)):
+            regex = filter_regex(app_name)
+            if check_filter(regex, artifacts[app_name], others(app_name)):
+                regex = filter_regex(app_name, anchored=True)
+        problems += [f"{app_name}: {p}" for p in check_filter(regex, artifacts[app_name], others(app_name))]
+
+        built = manifests.get((app_name, source), {})
+        configs = [catalog.config(app_name, platform) for platform in catalog.platforms(app_name)]
+        package = (
+            built.get("package")
+            or (entry and entry["id"])
+            or next((config["package"] for config in configs if config.get("package")), None)
+        )
+        about = f"Patches source: {source} (Auto-built)"
+
+        if entry and (entry["id"], settings.get("about"), settings.get("apkFilterRegEx")) == (package, about, regex):
+            entries[app_name] = entry
+            continue
+
+        settings.update(apkFilterRegEx=regex, about=about)
+        updated = {key: value for key, value in template.items() if key not in ("id", "name", "additionalSettings")}
+        updated.update(entry or {})
+        updated.update(
+            id=package,
+            name=entry["name"] if entry else convert_title(app_name),
+            additionalSettings=json.dumps(settings, separators=(',', ':')),
+        )
+        # Keep the key order of the existing entries
+        order = list(template)
+        entries[app_name] = dict(sorted(updated.items(), key=lambda item: order.index(item[0]) if item[0] in order else len(order)))
+        changes.append(f"{'Updated' if entry else 'Added'} {app_name}")
+
+    # Existing entries stay where they are, new ones go at the end;
+    # entries whose filter names no app are left alone
+    apps = []
+    for entry in document.get("apps", []):
+        app_name = _regex_app(json.loads(entry["additionalSettings"]).get("apkFilterRegEx", ""))
+        if app_name in entries:
+            apps.append(entries.pop(app_name))
+        elif app_name is None:
+            apps.append(entry)
+        else:
+            changes.append(f"Removed {app_name}")
+    apps += list(entries.values())
+
+    return {**document, "apps": apps}, changes, problems
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifests", default=str(manifest.manifest_dir), help="directory with build manifests")
+    parser.add_argument("--output", default=OBTAINIUM_PATH)
+    parser.add_argument("--check", action="store_true", help="only report, exit 1 if the file is out of date")
+    args = parser.parse_args()
+
+    with open(args.output) as f:
+        current = f.read()
+    document, changes, problems = generate(json.loads(current), manifest.load_all(Path(args.manifests)))
+
+    for change in changes:
+        print(f"  {change}")
+    for problem in problems:
+        print(f"❌ {problem}")
+
+    text = format_json(document)
+    if text == current:
+        print(f"✅ {args.output} is up to date")
+    elif args.check:
+        print(f"❌ {args.output} is out of date")
+        return 1
+    else:
+        with open(args.output + ".part", "w") as f:
+            f.write(text)
+        os.replace(args.output + ".part", args.output)
+        print(f"✅ Wrote {args.output} ({len(document['apps'])} apps)")
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
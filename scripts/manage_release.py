@@ -1,27 +1,23 @@
 #!/usr/bin/env python3
 import os
-import json
-import glob
+import sys
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from src import catalog
+
 def get_app_versions():
     """Read version information from app configs"""
     versions = {}
     
-    # Check apkmirror configs
-    for config_file in glob.glob('apps/apkmirror/*.json'):
-        try:
-            with open(config_file, 'r') as f:
-                config = json.load(f)
-                app_name = os.path.basename(config_file).replace('.json', '')
-                versions[app_name] = {
-                    'version': config.get('version', 'latest'),
-                    'source': 'apkmirror'
-                }
-        except:
-            pass
-    
-    # You can add apkpure and uptodown similarly
+    # First platform that has a config, in the order the builder tries them
+    for app_name in catalog.apps():
+        platform = catalog.platforms(app_name)[0]
+        config = catalog.config(app_name, platform)
+        versions[app_name] = {
+            'version': config.get('version') or 'latest',
+            'source': platform
+        }
     
     return versions
 
@@ -32,11 +28,8 @@ def create_release_notes():
     notes = "# ReVanced Patched APKs\n\n"
     notes += "## 📱 Available Apps\n\n"
     
-    # Read patch-config to know which apps were built
-    with open('patch-config.json', 'r') as f:
-        patch_config = json.load(f)
-    
-    for app_config in patch_config['patch_list']:
+    # patch-config.json lists which apps were built
+    for app_config in catalog.builds():
         app_name = app_config['app_name']
         source = app_config['source']
         
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""Local stand-in for the GitHub releases API, for testing without network.
+
+Covers what the builder and publisher use: repositories, release listing
+(with ETags), latest/by-tag lookups, creating and deleting releases, asset
+upload/listing/deletion and asset downloads. Repositories are created on
+first access and kept in memory.
+
+Usage:
+    python scripts/mock_github.py [--port 8765] [--seed releases.json]
+    GITHUB_API_URL=http://127.0.0.1:8765 GITHUB_TOKEN=dummy python -m src
+
+The seed file maps "owner/repo" to a list of releases, each with
+"tag_name" and optionally "prerelease" and "assets" ({"name": ..., "path": ...}).
+"""
+import re
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class State:
+    def __init__(self, base):
+        self.base = base
+        self.lock = threading.Lock()
+        self.repos = {}
+        self.next_id = 1
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def repo(self, full_name):
+        return self.repos.setdefault(full_name, {"releases": [], "blobs": {}})
+
+    def add_release(self, full_name, tag, name=None, body="", prerelease=False):
+        release_id = self.new_id()
+        url = f"{self.base}/repos/{full_name}/releases/{release_id}"
+        release = {
+            "id": release_id,
+            "tag_name": tag,
+            "name": name or tag,
+            "body": body,
+            "draft": False,
+            "prerelease": prerelease,
+            "created_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "published_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "url": url,
+            "assets_url": f"{url}/assets",
+            "upload_url": f"{self.base}/uploads/repos/{full_name}/releases/{release_id}/assets{{?name,label}}",
+            "html_url": f"{self.base}/{full_name}/releases/tag/{tag}",
+            "assets": [],
+        }
+        # Newest first, like the real API
+        self.repo(full_name)["releases"].insert(0, release)
+        return release
+
+    def add_asset(self, full_name, release, name, data, content_type="application/octet-stream", label=""):
+        asset_id = self.new_id()
+        self.repo(full_name)["blobs"][asset_id] = data
+        asset = {
+            "id": asset_id,
+            "name": name,
+            "label": label,
+            "size": len(data),
+            "state": "uploaded",
+            "content_type": content_type,
+            "url": f"{self.base}/repos/{full_name}/releases/assets/{asset_id}",
+            "browser_download_url": f"{self.base}/download/{full_name}/{asset_id}/{name}",
+            "created_at": release["created_at"],
+            "updated_at": release["created_at"],
+        }
+        release["assets"] = [a for a in release["assets"] if a["name"] != name] + [asset]
+        return asset
+
+class Handler(BaseHTTPRequestHandler):
+    state: State = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, data=None, content_type="application/json"):
+        if body is not None:
+            data = json.dumps(body).encode()
+        data = data or b""
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+        if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self):
+        url = urlparse(self.path)
+        return url.path.rstrip("/"), parse_qs(url.query)
+
+    def _find(self, full_name, release_id):
+        for release in self.state.repo(full_name)["releases"]:
+            if release["id"] == int(release_id):
+                return release
+        return None
+
+    def do_GET(self):
+        path, query = self._route()
+        state = self.state
+        with state.lock:
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)", path):
+                full_name = m.group(1)
+                state.repo(full_name)
+                owner, name = full_name.split("/")
+                return self._send(200, {
+                    "id": 1, "name": name, "full_name": full_name,
+                    "owner": {"login": owner}, "url": f"{state.base}/repos/{full_name}",
+                })
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases", path):
+                releases = state.repo(m.group(1))["releases"]
+                per_page = int(query.get("per_page", ["30"])[0])
+                page = int(query.get("page", ["1"])[0])
+                return self._send(200, releases[(page - 1) * per_page:page * per_page])
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases/latest", path):
+                releases = [r for r in state.repo(m.group(1))["releases"] if not r["prerelease"]]
+                return self._send(200, releases[0]) if releases else self._send(404, {"message": "Not Found"})
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases/tags/(.+)", path):
+                for release in state.repo(m.group(1))["releases"]:
+                    if release["tag_name"] == m.group(2):
+                        return self._send(200, release)
+                return self._send(404, {"message": "Not Found"})
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases/(\d+)(/assets)?", path):
+                release = self._find(m.group(1), m.group(2))
+                if not release:
+                    return self._send(404, {"message": "Not Found"})
+                return self._send(200, release["assets"] if m.group(3) else release)
+            if m := re.fullmatch(r"/download/([^/]+/[^/]+)/(\d+)/[^/]+", path):
+                data = state.repo(m.group(1))["blobs"].get(int(m.group(2)))
+                if data is None:
+                    return self._send(404, {"message": "Not Found"})
+                return self._send(200, data=data, content_type="application/octet-stream")
+        self._send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        path, query = self._route()
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+        state = self.state
+        with state.lock:
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases", path):
+                body = json.loads(data or b"{}")
+                release = state.add_release(
+                    m.group(1), body["tag_name"], body.get("name"),
+                    body.get("body", ""), body.get("prerelease", False)
+                )
+                return self._send(201, release)
+            if m := re.fullmatch(r"/uploads/repos/([^/]+/[^/]+)/releases/(\d+)/assets", path):
+                release = self._find(m.group(1), m.group(2))
+                if not release:
+                    return self._send(404, {"message": "Not Found"})
+                asset = state.add_asset(
+                    m.group(1), release, query["name"][0], data,
+                    self.headers.get("Content-Type", "application/octet-stream"),
+                    query.get("label", [""])[0]
+                )
+                return self._send(201, asset)
+        self._send(404, {"message": "Not Found"})
+
+    def do_DELETE(self):
+        path, _ = self._route()
+        state = self.state
+        with state.lock:
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases/assets/(\d+)", path):
+                for release in state.repo(m.group(1))["releases"]:
+                    release["assets"] = [a for a in release["assets"] if a["id"] != int(m.group(2))]
+                state.repo(m.group(1))["blobs"].pop(int(m.group(2)), None)
+                return self._send(204)
+            if m := re.fullmatch(r"/repos/([^/]+/[^/]+)/releases/(\d+)", path):
+                repo = state.repo(m.group(1))
+                repo["releases"] = [r for r in repo["releases"] if r["id"] != int(m.group(2))]
+                return self._send(204)
+        self._send(404, {"message": "Not Found"})
+
+def serve(port: int = 0, seed: dict = None) -> ThreadingHTTPServer:
+    """Start the stand-in on a background thread; returns the server"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    state = State(f"http://127.0.0.1:{server.server_address[1]}")
+    for full_name, releases in (seed or {}).items():
+        for entry in releases:
+            release = state.add_release(full_name, entry["tag_name"], prerelease=entry.get("prerelease", False))
+            for asset in entry.get("assets", []):
+                with open(asset["path"], "rb") as f:
+                    state.add_asset(full_name, release, asset["name"], f.read())
+    Handler.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", help="JSON file with releases to preload")
+    args = parser.parse_args()
+
+    seed = None
+    if args.seed:
+        with open(args.seed) as f:
+            seed = json.load(f)
+
+    server = serve(args.port, seed)
+    print(f"Mock GitHub API on {Handler.state.base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
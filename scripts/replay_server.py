@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Local stand-in that replays recorded HTTP fixtures.
+
+Record fixtures from the real sites first, then point the builder (or
+`benchmark.py scrapers`) at this server to run with no network:
+
+    HTTP_RECORD_DIR=fixtures python -m src
+    python scripts/replay_server.py --fixtures fixtures --latency 80 --error-rate 0.05
+    HTTP_REPLAY_URL=http://127.0.0.1:8766 python -m src
+
+Requests arrive as /{scheme}/{host}/{path}?{query} with an X-Fixture-Key
+header naming the recorded request. Latency (with jitter) and 503 errors
+can be injected to exercise retries and timeouts; GET /_stats reports the
+requests served, misses and injected errors.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from src import fixtures
+
+class State:
+    def __init__(self, directory, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.directory = Path(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+class Handler(BaseHTTPRequestHandler):
+    state: State = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, data=b"", headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            if key.lower() not in ("content-length", "transfer-encoding", "content-encoding"):
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _original_url(self):
+        scheme, _, rest = self.path.lstrip("/").partition("/")
+        return f"{scheme}://{rest}"
+
+    def _replay(self):
+        state = self.state
+        if self.path == "/_stats":
+            with state.lock:
+                return self._send(200, json.dumps(state.stats).encode(), {"Content-Type": "application/json"})
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        url = self._original_url()
+
+        with state.lock:
+            delay = max(0.0, state.latency + state.random.uniform(-state.jitter, state.jitter))
+            fail = state.random.random() < state.error_rate
+        time.sleep(delay / 1000)
+
+        if fail:
+            with state.lock:
+                state.stats["errors"] += 1
+            return self._send(503, b"injected error", {"X-Original-URL": url})
+
+        key = self.headers.get("X-Fixture-Key") or fixtures.fixture_key(self.command, url, body)
+        host = url.split("/")[2] if url.count("/") >= 2 else "local"
+        path = state.directory / host / f"{key[:20]}.json"
+        if not path.exists():
+            with state.lock:
+                state.stats["misses"] += 1
+            return self._send(404, f"no fixture for {self.command} {url}".encode(),
+                              {"X-Original-URL": url, "X-Fixture-Miss": "1"})
+
+        fixture = fixtures.load(path)
+        headers = {**fixture["headers"], "X-Original-URL": fixture["final_url"]}
+        with state.lock:
+            state.stats["served"] += 1
+            state.stats[host] += 1
+        etag = fixture["headers"].get("etag") or fixture["headers"].get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers=headers)
+        self._send(fixture["status"], fixture["body"], headers)
+
+    do_GET = do_POST = do_HEAD = _replay
+
+def serve(directory, port: int = 0, **options) -> ThreadingHTTPServer:
+    """Start the replay server on a background thread; returns the server"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    Handler.state = State(directory, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default="fixtures", help="directory written by HTTP_RECORD_DIR")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="added delay per request, in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random +/- ms around the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, help="seed for jitter and errors")
+    args = parser.parse_args()
+
+    server = serve(
+        args.fixtures, args.port,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, seed=args.seed
+    )
+    print(f"Replaying {args.fixtures} on http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,41 @@
 import os
 import logging
-from curl_cffi import requests
-from curl_cffi.requests.impersonate import DEFAULT_CHROME
-from github import Github
+import threading
+from pathlib import Path
 
-session = requests.Session(impersonate=DEFAULT_CHROME)
+class _Lazy:
+    """Stand-in that builds the real client on first attribute access,
+    so importing src (and its heavy dependencies) stays cheap"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._obj = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+        return getattr(self._obj, name)
+
+def _make_session():
+    from curl_cffi import requests
+    from curl_cffi.requests.impersonate import DEFAULT_CHROME
+    session = requests.Session(impersonate=DEFAULT_CHROME)
+
+    # Capture responses as fixtures, or serve them from scripts/replay_server.py
+    record_dir, replay_url = os.getenv('HTTP_RECORD_DIR'), os.getenv('HTTP_REPLAY_URL')
+    if record_dir or replay_url:
+        from src.fixtures import FixtureSession
+        return FixtureSession(session, record_dir, replay_url)
+    return session
+
+def _make_github():
+    from github import Github
+    return Github(github_token, base_url=api_url) if github_token else Github(base_url=api_url)
+
+session = _Lazy(_make_session)
 
 # Logging
 logging.basicConfig(
@@ -16,11 +47,36 @@ logging.basicConfig(
 # Env Vars
 github_token = os.getenv('GITHUB_TOKEN')
 repository = os.getenv('GITHUB_REPOSITORY')
+# Point at a local stand-in (scripts/mock_github.py) to run offline
+api_url = os.getenv('GITHUB_API_URL', 'https://api.github.com')
 endpoint_url = os.getenv('ENDPOINT_URL')
 access_key_id = os.getenv('AWS_ACCESS_KEY_ID')
 secret_access_key = os.getenv('AWS_SECRET_ACCESS_KEY')
 bucket_name = os.getenv('BUCKET_NAME')
 
+# Persistent cache for probe results and other per-host state
+cache_dir = Path(os.getenv('CACHE_DIR', '.cache'))
+
+# Per-build scratch root (e.g. /dev/shm for tmpfs) and final artifact directory
+work_root = os.getenv('WORK_DIR') or None
+output_dir = Path(os.getenv('OUTPUT_DIR', '.'))
+
+# Resolve tools, APKs and GitHub lookups from the caches only (--offline)
+offline = os.getenv('OFFLINE', '').lower() in ('1', 'true', 'yes')
+
+class OfflineError(RuntimeError):
+    """Something needed the network while running offline"""
+
+# Profile each build stage (--profile): "1" picks pyinstrument when
+# installed, else cProfile; "cprofile" forces cProfile
+profile = os.getenv('PROFILE', '')
+
+# Publish a zstd delta against the previous build next to each APK (src/delta.py)
+build_deltas = os.getenv('DELTA', '').lower() in ('1', 'true', 'yes')
+
+# Concurrent release lookups / asset downloads
+download_workers = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+
 # APKmirror base url
 base_url = "https://www.apkmirror.com"
-gh = Github(github_token) if github_token else Github()
+gh = _Lazy(_make_github)
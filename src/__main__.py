@@ -1,19 +1,41 @@
-import json
 import logging
 from sys import exit
+import argparse
+import threading
 from pathlib import Path
 from os import getenv
 import subprocess
+import src
 from src import (
-    r2,
     utils,
-    release,
+    catalog,
+    delta,
+    history,
+    patcher,
+    manifest,
+    pipeline,
+    profiling,
+    signing,
+    trace,
+    workspace,
     downloader
 )
 
 def run_build(app_name: str, source: str, arch: str = "universal") -> str:
-    """Build APK for specific architecture"""
+    """Build the unsigned APK for a specific architecture"""
+    with trace.span("build", app=app_name, source=source, arch=arch):
+        with workspace.build_dir(f"{app_name}-{arch}") as workdir, \
+                utils.process_log(workspace.log_dir / f"{app_name}-{arch}.log"):
+            with workspace.track_usage(workdir), profiling.profile(f"{app_name}-{arch}-build"):
+                unsigned_apk = build_in(workdir, app_name, source, arch)
+            if not unsigned_apk:
+                return None
+            return str(workspace.publish(unsigned_apk))
+
+def prepare_tools(workdir: Path, source: str) -> tuple[Path, Path, str, bool] | None:
+    """Fetch the patcher tools for a source and pick the CLI and patches"""
     download_files, name = downloader.download_required(source)
+    download_files = [workspace.link(file, workdir) for file in download_files]
 
     # Log downloaded files for debugging
     logging.info(f"📦 Downloaded {len(download_files)} files for {source}:")
@@ -84,19 +106,61 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
     logging.info(f"✅ Using CLI: {cli.name}")
     logging.info(f"✅ Using patches: {patches.name}")
 
-    download_methods = [
-        downloader.download_apkmirror,
-        downloader.download_apkpure,
-        downloader.download_uptodown,
-        downloader.download_aptoide
-    ]
-
-    input_apk = None
-    version = None
-    for method in download_methods:
-        input_apk, version = method(app_name, str(cli), str(patches))
+    return cli, patches, name, is_morphe
+
+def fetch_apk(workdir: Path, app_name: str, need) -> tuple[Path | None, str | None]:
+    """Download the input APK, waiting for the tools only if a version must be resolved"""
+    for platform in history.order(app_name, catalog.platforms(app_name)):
+        config = downloader.load_config(app_name, platform)
+        if config is None:
+            continue
+
+        cli = patches = None
+        if not config.get("version"):
+            tools = need("tools")
+            if not tools:
+                return None, None
+            cli, patches = str(tools[0]), str(tools[1])
+
+        input_apk, version = downloader.download_platform(app_name, platform, cli, patches, directory=workdir)
         if input_apk:
-            break
+            return input_apk, version
+
+    return None, None
+
+def fetch_apkeditor(workdir: Path) -> Path | None:
+    """Fetch APKEditor up front, it is only used if the APK turns out to be a bundle"""
+    try:
+        return workspace.link(downloader.download_apkeditor(), workdir)
+    except Exception as e:
+        logging.warning(f"Could not fetch APKEditor: {e}")
+        return None
+
+def compile_selection(app_name: str, source: str, need) -> list[str]:
+    """Check the patches/*.txt selection against the bundle as soon as the tools are in"""
+    tools = need("tools")
+    if not tools:
+        return []
+    configs = [catalog.config(app_name, platform) or {} for platform in catalog.platforms(app_name)]
+    package = next((config["package"] for config in configs if config.get("package")), None)
+    return patcher.compile_selection(str(tools[0]), str(tools[1]), package, catalog.selection(app_name, source))
+
+def build_in(workdir: Path, app_name: str, source: str, arch: str) -> Path | None:
+    """Run every build step inside a private work directory"""
+    # Tools, APKEditor and the APK download overlap; the APK only waits for
+    # the tools when the app config does not pin a version, and the patch
+    # selection is checked against the bundle while the APK downloads
+    stages = pipeline.run({
+        "tools": lambda need: prepare_tools(workdir, source),
+        "apkeditor": lambda need: fetch_apkeditor(workdir),
+        "apk": lambda need: fetch_apk(workdir, app_name, need),
+        "selection": lambda need: compile_selection(app_name, source, need),
+    }, label=f"{app_name}-{arch}")
+
+    if not stages["tools"]:
+        return None
+    cli, patches, name, is_morphe = stages["tools"]
+    input_apk, version = stages["apk"]
             
     if input_apk is None:
         logging.error(f"❌ Failed to download APK for {app_name}")
@@ -105,152 +169,176 @@ def run_build(app_name: str, source: str, arch: str = "universal") -> str:
 
     if input_apk.suffix != ".apk":
         logging.warning("Input file is not .apk, using APKEditor to merge")
-        apk_editor = downloader.download_apkeditor()
+        apk_editor = stages["apkeditor"]
+        if not apk_editor:
+            logging.error("APKEditor is required to merge this bundle")
+            return None
 
         merged_apk = input_apk.with_suffix(".apk")
 
-        utils.run_process([
-            "java", "-jar", apk_editor, "m",
-            "-i", str(input_apk),
-            "-o", str(merged_apk)
-        ], silent=True)
+        with trace.span("merge"):
+            utils.run_process([
+                "java", "-jar", str(apk_editor), "m",
+                "-i", str(input_apk),
+                "-o", str(merged_apk)
+            ], silent=True)
 
         input_apk.unlink(missing_ok=True)
 
         if not merged_apk.exists():
-            logging.error("Merged APK file not found")
-            exit(1)
+            raise RuntimeError("Merged APK file not found")
 
         input_apk = merged_apk
         logging.info(f"Merged APK file generated: {input_apk}")
 
+    # FIX: Repair corrupted APK from Uptodown. Only broken archives get the
+    # full rewrite; a healthy APK is checked in place without a second copy
+    logging.info("Checking APK for corruption...")
+    with trace.span("repair"):
+        if utils.is_broken_zip(input_apk):
+            try:
+                fixed_apk = workdir / f"{app_name}-fixed-v{version}.apk"
+                subprocess.run([
+                    "zip", "-FF", str(input_apk), "--out", str(fixed_apk)
+                ], check=False, capture_output=True)
+            
+                if fixed_apk.exists() and fixed_apk.stat().st_size > 0:
+                    fixed_apk.replace(input_apk)
+                    logging.info("APK fixed successfully")
+            except Exception as e:
+                logging.warning(f"Could not fix APK: {e}")
+
     # ARCHITECTURE-SPECIFIC PROCESSING
-    if arch != "universal":
+    # Remove unwanted architectures based on selected arch
+    if arch == "arm64-v8a":
         logging.info(f"Processing APK for {arch} architecture...")
-        
-        # Remove unwanted architectures based on selected arch
-        if arch == "arm64-v8a":
-            # Remove x86, x86_64, and armeabi-v7a
+        unwanted = ["lib/x86/*", "lib/x86_64/*", "lib/armeabi-v7a/*"]
+    elif arch == "armeabi-v7a":
+        logging.info(f"Processing APK for {arch} architecture...")
+        unwanted = ["lib/x86/*", "lib/x86_64/*", "lib/arm64-v8a/*"]
+    else:
+        # Universal: only remove x86 architectures
+        unwanted = ["lib/x86/*", "lib/x86_64/*"]
+
+    with trace.span("strip", arch=arch):
+        if workspace.is_shared(input_apk):
+            # Hardlinked from the APK cache: write a new file instead of editing it
+            stripped_apk = workdir / f"{app_name}-{arch}-stripped-v{version}.apk"
             utils.run_process([
-                "zip", "--delete", str(input_apk), 
-                "lib/x86/*", "lib/x86_64/*", "lib/armeabi-v7a/*"
+                "zip", "--delete", str(input_apk), *unwanted, "--out", str(stripped_apk)
             ], silent=True, check=False)
-        elif arch == "armeabi-v7a":
-            # Remove x86, x86_64, and arm64-v8a
+            if stripped_apk.exists():
+                stripped_apk.replace(input_apk)
+        else:
             utils.run_process([
-                "zip", "--delete", str(input_apk),
-                "lib/x86/*", "lib/x86_64/*", "lib/arm64-v8a/*"
+                "zip", "--delete", str(input_apk), *unwanted
             ], silent=True, check=False)
-    else:
-        # Universal: only remove x86 architectures
-        utils.run_process([
-            "zip", "--delete", str(input_apk), 
-            "lib/x86/*", "lib/x86_64/*"
-        ], silent=True, check=False)
-
-    exclude_patches = []
-    include_patches = []
-
-    patches_path = Path("patches") / f"{app_name}-{source}.txt"
-    if patches_path.exists():
-        with patches_path.open('r') as patches_file:
-            for line in patches_file:
-                line = line.strip()
-                if line.startswith('-'):
-                    exclude_patches.extend(["-d", line[1:].strip()])
-                elif line.startswith('+'):
-                    include_patches.extend(["-e", line[1:].strip()])
-
-    # FIX: Repair corrupted APK from Uptodown
-    logging.info("Checking APK for corruption...")
-    try:
-        fixed_apk = Path(f"{app_name}-fixed-v{version}.apk")
-        subprocess.run([
-            "zip", "-FF", str(input_apk), "--out", str(fixed_apk)
-        ], check=False, capture_output=True)
-        
-        if fixed_apk.exists() and fixed_apk.stat().st_size > 0:
-            input_apk.unlink(missing_ok=True)
-            fixed_apk.rename(input_apk)
-            logging.info("APK fixed successfully")
-    except Exception as e:
-        logging.warning(f"Could not fix APK: {e}")
 
     # Include architecture in output filename
-    output_apk = Path(f"{app_name}-{arch}-patch-v{version}.apk")
+    output_apk = workdir / f"{app_name}-{arch}-patch-v{version}.apk"
 
-    # USE DIFFERENT COMMANDS BASED ON SOURCE TYPE
-    if is_morphe:
-        logging.info("🔧 Using Morphe patching system...")
-        # Morphe CLI might have different arguments - we need to test this
-        # Try common patterns
-        try:
-            # Try ReVanced-style arguments first (most likely)
-            morphe_cmd = [
-                "java", "-jar", str(cli),
-                "patch", "--patches", str(patches),
-                "--out", str(output_apk), str(input_apk),
-                *exclude_patches, *include_patches
-            ]
-            utils.run_process(morphe_cmd, stream=True)
-        except subprocess.CalledProcessError:
-            # Try alternative Morphe arguments
-            logging.info("Trying alternative Morphe command format...")
-            morphe_cmd = [
-                "java", "-jar", str(cli),
-                "--patches", str(patches),
-                "--input", str(input_apk),
-                "--output", str(output_apk)
-            ]
-            utils.run_process(morphe_cmd, stream=True)
-    else:
-        logging.info("🔧 Using ReVanced patching system...")
-        # Standard ReVanced command
-        utils.run_process([
-            "java", "-jar", str(cli),
-            "patch", "--patches", str(patches),
-            "--out", str(output_apk), str(input_apk),
-            *exclude_patches, *include_patches
-        ], stream=True)
+    # Probe the CLI once (cached per jar digest) so exactly one patch run happens
+    logging.info(f"🔧 Using {'Morphe' if is_morphe else 'ReVanced'} patching system...")
+    with trace.span("patch"):
+        utils.run_process(patcher.patch_command(
+            str(cli), str(patches), str(input_apk), str(output_apk),
+            stages["selection"]
+        ), stream=True)
 
     input_apk.unlink(missing_ok=True)
 
-    # Include architecture in final signed APK name
-    signed_apk = Path(f"{app_name}-{arch}-{name}-v{version}.apk")
-
-    apksigner = utils.find_apksigner()
-    if not apksigner:
-        exit(1)
-
-    try:
-        utils.run_process([
-            str(apksigner), "sign", "--verbose",
-            "--ks", "keystore/public.jks",
-            "--ks-pass", "pass:public",
-            "--key-pass", "pass:public",
-            "--ks-key-alias", "public",
-            "--in", str(output_apk), "--out", str(signed_apk)
-        ], stream=True)
-    except Exception as e:
-        logging.warning(f"Standard signing failed: {e}")
-        logging.info("Trying alternative signing method...")
-        
-        utils.run_process([
-            str(apksigner), "sign", "--verbose",
-            "--min-sdk-version", "21",
-            "--ks", "keystore/public.jks",
-            "--ks-pass", "pass:public",
-            "--key-pass", "pass:public",
-            "--ks-key-alias", "public",
-            "--in", str(output_apk), "--out", str(signed_apk)
-        ], stream=True)
-
-    output_apk.unlink(missing_ok=True)
-    print(f"✅ APK built: {signed_apk.name}")
+    # Include architecture in the final APK name; main signs every arch at once
+    unsigned_apk = workdir / f"{app_name}-{arch}-{name}-v{version}.apk{signing.UNSIGNED_SUFFIX}"
+    output_apk.replace(unsigned_apk)
+    print(f"✅ APK patched: {unsigned_apk.name}")
     
-    return str(signed_apk)
+    return unsigned_apk
+
+def build(app_name: str, source: str, arches: list[str] = None) -> tuple[list[tuple[str, Path]], list[str]]:
+    """Build every arch of an app; returns the built APKs and the arches that failed"""
+    if not arches:
+        arches = catalog.arches(app_name, source)
+    if arches is None:
+        logging.info(f"{app_name} ({source}) not in arch-config.json, building universal only")
+        arches = ["universal"]
+
+    # Build for each architecture; one failing arch does not stop the others
+    unsigned_apks = []
+    failed = []
+    for arch in arches:
+        logging.info(f"🔨 Building {app_name} for {arch} architecture...")
+        try:
+            apk_path = run_build(app_name, source, arch)
+        except Exception as e:
+            logging.error(f"❌ {arch} build failed: {e}")
+            failed.append(arch)
+            continue
+        if apk_path:
+            unsigned_apks.append((arch, Path(apk_path)))
+
+    # Sign and verify every arch concurrently with one signing session
+    built_apks = []
+    if unsigned_apks:
+        try:
+            signed = signing.SigningSession().sign_all(unsigned_apks)
+        except Exception as e:
+            logging.error(f"❌ Signing failed: {e}")
+            for _, apk in unsigned_apks:
+                apk.unlink(missing_ok=True)
+            signed = [None] * len(unsigned_apks)
+        for (arch, _), apk in zip(unsigned_apks, signed):
+            if apk is None:
+                failed.append(arch)
+                continue
+            built_apks.append((arch, apk))
+            print(f"✅ Built {arch} version: {apk.name}")
+
+    # Summary
+    print(f"\n🎯 Built {len(built_apks)} APK(s) for {app_name}:")
+    for _, apk in built_apks:
+        print(f"  📱 {apk.name}")
+
+    # Patches may rename the package, so read it from the result
+    if built_apks:
+        manifest.write(app_name, source, utils.apk_package(built_apks[0][1]), built_apks)
+
+    if src.build_deltas:
+        for arch, apk in built_apks:
+            try:
+                delta.create(app_name, source, arch, apk)
+            except Exception as e:
+                logging.warning(f"Could not build a delta for {apk.name}: {e}")
+
+    return built_apks, failed
 
 def main():
+    parser = argparse.ArgumentParser(description="Patch and sign APP_NAME with the SOURCE patches")
+    parser.add_argument("command", nargs="?", choices=["build", "serve"], default="build",
+                        help="build once from the environment (default), or serve build jobs over HTTP")
+    parser.add_argument("--offline", action="store_true",
+                        help="use only cached tools, APKs and GitHub responses (also OFFLINE=1)")
+    parser.add_argument("--profile", nargs="?", const="1", metavar="MODE",
+                        help="profile each stage into OUTPUT_DIR/profiles; MODE cprofile forces cProfile (also PROFILE=)")
+    parser.add_argument("--port", type=int, default=8767, help="serve: localhost port for the job API")
+    parser.add_argument("--workers", type=int, default=1, help="serve: builds run at the same time")
+    args = parser.parse_args()
+    if args.offline:
+        src.offline = True
+    if args.profile:
+        src.profile = args.profile
+    if src.offline:
+        logging.info("📴 Offline: resolving everything from the caches")
+
+    if args.command == "serve":
+        from src import server
+        daemon = server.serve(build, args.port, args.workers)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            daemon.shutdown()
+            trace.export("serve")
+        return
+
     app_name = getenv("APP_NAME")
     source = getenv("SOURCE")
 
@@ -258,39 +346,13 @@ def main():
         logging.error("APP_NAME and SOURCE environment variables must be set")
         exit(1)
 
-    # Read arch-config.json
-    arch_config_path = Path("arch-config.json")
-    if arch_config_path.exists():
-        with open(arch_config_path) as f:
-            arch_config = json.load(f)
-        
-        # Find arches for this app
-        arches = ["universal"]  # default
-        for config in arch_config:
-            if config["app_name"] == app_name and config["source"] == source:
-                arches = config["arches"]
-                break
-        
-        # Build for each architecture
-        built_apks = []
-        for arch in arches:
-            logging.info(f"🔨 Building {app_name} for {arch} architecture...")
-            apk_path = run_build(app_name, source, arch)
-            if apk_path:
-                built_apks.append(apk_path)
-                print(f"✅ Built {arch} version: {Path(apk_path).name}")
-        
-        # Summary
-        print(f"\n🎯 Built {len(built_apks)} APK(s) for {app_name}:")
-        for apk in built_apks:
-            print(f"  📱 {Path(apk).name}")
-        
-    else:
-        # Fallback to single universal build
-        logging.warning("arch-config.json not found, building universal only")
-        apk_path = run_build(app_name, source, "universal")
-        if apk_path:
-            print(f"🎯 Final APK path: {apk_path}")
+    built_apks, failed = build(app_name, source)
+
+    trace.export(f"{app_name}-{source}", app=app_name, source=source)
+
+    if failed:
+        logging.error(f"Failed architectures: {', '.join(failed)} (logs in {workspace.log_dir})")
+        exit(1)
 
 if __name__ == "__main__":
     main()
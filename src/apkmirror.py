@@ -3,13 +3,22 @@ import json
 import logging
 from bs4 import BeautifulSoup
 from src import session
+from src.version import highest, is_prerelease, sort, version_key
 
 base_url = "https://www.apkmirror.com"
 
+# Upload pages read at most when looking for an older version
+INDEX_PAGES = 5
+
+# Variant filters for configs that leave out "type" or "dpi"; an empty
+# string in the config matches any variant
+DEFAULT_TYPE = "APK"
+DEFAULT_DPI = "nodpi"
+
 def get_download_link(version: str, app_name: str, config: dict, arch: str = None) -> str: 
     target_arch = arch if arch else config.get('arch', 'universal')
     
-    criteria = [config['type'], target_arch, config['dpi']]
+    criteria = [config.get('type', DEFAULT_TYPE), target_arch, config.get('dpi', DEFAULT_DPI)]
     
     # --- UNIVERSAL URL FINDER WITH VALIDATION ---
     version_parts = version.split('.')
@@ -131,15 +140,16 @@ def get_download_link(version: str, app_name: str, config: dict, arch: str = Non
         return None
     
     # --- VARIANT FINDER (works with both exact pages and fallback pages) ---
+    exact_page = correct_version_page and i == len(version_parts)
     rows = found_soup.find_all('div', class_='table-row headerFont')
     download_page_url = None
     
-    # Try to find exact version match first
     for row in rows:
         row_text = row.get_text()
         
-        # Check if row contains our exact version
-        if version in row_text or version.replace('.', '-') in row_text:
+        # Every variant on the full-version release page is our version;
+        # elsewhere the row must name it (not 19.16.3 for 19.16.39)
+        if exact_page or re.search(rf'(?<![\d.]){re.escape(version)}(?![\d.])', row_text):
             # Check criteria
             if all(criterion in row_text for criterion in criteria):
                 sub_url = row.find('a', class_='accent_color')
@@ -147,23 +157,6 @@ def get_download_link(version: str, app_name: str, config: dict, arch: str = Non
                     download_page_url = base_url + sub_url['href']
                     break
     
-    # If exact version not found, try to find any variant matching criteria
-    if not download_page_url:
-        for row in rows:
-            row_text = row.get_text()
-            if all(criterion in row_text for criterion in criteria):
-                # Check if this looks like a variant row (has version numbers)
-                if re.search(r'\d+(\.\d+)+', row_text):
-                    sub_url = row.find('a', class_='accent_color')
-                    if sub_url:
-                        download_page_url = base_url + sub_url['href']
-                        # Extract version for logging
-                        match = re.search(r'(\d+(\.\d+)+(\.\w+)*)', row_text)
-                        if match:
-                            actual_version = match.group(1)
-                            logging.warning(f"Using variant {actual_version} (criteria match)")
-                        break
-    
     if not download_page_url:
         logging.error(f"No variant found for {app_name} {version} with criteria {criteria}")
         # Debug: log what rows we found
@@ -245,9 +238,13 @@ def get_latest_version(app_name: str, config: dict) -> str:
     except:
         pass  # If fails, continue to original method
     
-    # Original method (keep exactly as you had it)
-    url = f"{base_url}/uploads/?appcategory={config['name']}"
-    
+    # Uploads are not strictly ordered; pick the highest stable version listed
+    return highest(_upload_versions(config, 1))
+
+def _upload_versions(config: dict, page: int) -> list[str]:
+    """Stable versions on one page of the app's uploads listing"""
+    url = f"{base_url}/uploads/{f'page/{page}/' if page > 1 else ''}?appcategory={config['name']}"
+
     response = session.get(url)
     response.raise_for_status()
     content_size = len(response.content)
@@ -257,20 +254,23 @@ def get_latest_version(app_name: str, config: dict) -> str:
     app_rows = soup.find_all("div", class_="appRow")
     version_pattern = re.compile(r'\d+(\.\d+)*(-[a-zA-Z0-9]+(\.\d+)*)*')
 
+    versions = []
     for row in app_rows:
-        version_text = row.find("h5", class_="appRowTitle").a.text.strip()
-        if "alpha" not in version_text.lower() and "beta" not in version_text.lower():
-            match = version_pattern.search(version_text)
-            if match:
-                version = match.group()
-                version_parts = version.split('.')
-                base_version_parts = []
-                for part in version_parts:
-                    if part.isdigit():
-                        base_version_parts.append(part)
-                    else:
-                        break
-                if base_version_parts:
-                    return '.'.join(base_version_parts)
+        title = row.find("h5", class_="appRowTitle")
+        if not title or not title.a:
+            continue
+        version_text = title.a.text.strip()
+        match = version_pattern.search(version_text)
+        if match and not is_prerelease(version_text) and not is_prerelease(match.group()):
+            versions.append(re.match(r'\d+(\.\d+)*', match.group()).group())
+    return versions
 
-    return None
+def get_versions(app_name: str, config: dict, oldest: str = None) -> list[str]:
+    """Stable versions APKMirror hosts, paging back until `oldest` is reached"""
+    versions = []
+    for page in range(1, INDEX_PAGES + 1):
+        listed = _upload_versions(config, page)
+        versions += listed
+        if not listed or not oldest or min(version_key(v) for v in listed) <= version_key(oldest):
+            break
+    return sort(set(versions), reverse=True)
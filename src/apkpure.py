@@ -2,6 +2,7 @@ import json
 import logging 
 
 from src import session 
+from src.version import sort
 from bs4 import BeautifulSoup
 
 # Define a standard browser User-Agent to avoid 403 Forbidden errors
@@ -33,6 +34,16 @@ def get_latest_version(app_name: str, config: str) -> str:
         
     return None
 
+def get_versions(app_name: str, config: dict, oldest: str = None) -> list[str]:
+    """Versions listed on the APKPure versions page, newest first"""
+    url = f"https://apkpure.net/{config['name']}/{config['package']}/versions"
+    response = session.get(url, headers=HEADERS)
+    response.raise_for_status()
+
+    soup = BeautifulSoup(response.content, "html.parser")
+    versions = [tag['data-dt-version'] for tag in soup.find_all(attrs={'data-dt-version': True})]
+    return sort(set(versions), reverse=True)
+
 def get_download_link(version: str, app_name: str, config: str) -> str:
     # APKPure often uses a specific structure for download pages
     url = f"https://apkpure.net/{config['name']}/{config['package']}/download/{version}"
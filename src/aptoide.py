@@ -1,44 +1,187 @@
+import json
+import time
 import base64
-from typing import Dict
-from src import session
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from itertools import islice
+from typing import Dict, Iterator
+from src import session, cache_dir
+from src.version import sort, highest, version_key, is_prerelease
 
 BASE_URL = "https://ws75.aptoide.com/api/7/"
 
+# listAppVersions page size; fetched pages stay fresh for LIST_TTL seconds,
+# getAppMeta answers (fixed per version code) for META_TTL
+PAGE_SIZE = 50
+LIST_TTL = 6 * 3600
+META_TTL = 7 * 24 * 3600
+
+index_dir = cache_dir / "aptoide"
+
+# The listing is newest first but not strictly ordered; a scan stops after
+# this many versions in a row older than the one it looks for
+OUT_OF_ORDER = 10
+
+_indexes: dict[tuple[str, str], "VersionIndex"] = {}
+_indexes_lock = threading.Lock()
+
+def _file(app: dict) -> dict:
+    file = app["file"]
+    return {
+        "vername": file["vername"],
+        "vercode": file["vercode"],
+        "path": file.get("path") or file.get("path_alt"),
+        "md5": file.get("md5sum"),
+        "size": file.get("filesize"),
+    }
+
+class VersionIndex:
+    """The listAppVersions pages of one package and CPU.
+
+    Pages are fetched only as far as a lookup needs and kept on disk, so
+    the latest version, the version list and download links all come from
+    one listing instead of a request each.
+    """
+
+    def __init__(self, package: str, arch: str):
+        self.package = package
+        self.arch = arch
+        self.path = index_dir / f"{package}-{arch}.json"
+        self.lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        now = time.time()
+        meta = {code: entry for code, entry in data.get("meta", {}).items() if now - entry["fetched"] < META_TTL}
+        if not data or now - data["fetched"] > LIST_TTL:
+            return {"fetched": now, "files": [], "complete": False, "meta": meta}
+        return {**data, "meta": meta}
+
+    def expired(self) -> bool:
+        return time.time() - self.data["fetched"] > LIST_TTL
+
+    def _save(self) -> None:
+        index_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=index_dir, suffix=".part", delete=False) as f:
+            json.dump(self.data, f)
+        Path(f.name).replace(self.path)
+
+    def _fetch_page(self) -> bool:
+        """Append the next page of the listing; False once it is exhausted"""
+        if self.data["complete"]:
+            return False
+        offset = len(self.data["files"])
+        url = (f"{BASE_URL}listAppVersions?package_name={self.package}"
+               f"&limit={PAGE_SIZE}&offset={offset}{_get_q_param(self.arch)}")
+        res = session.get(url)
+        res.raise_for_status()
+        datalist = res.json()["datalist"]
+        files = [_file(app) for app in datalist["list"]]
+        logging.info(f"URL:{url} -> {len(files)} versions of {self.package} (offset {offset})")
+
+        self.data["files"] += files
+        total = datalist.get("total")
+        self.data["complete"] = len(files) < PAGE_SIZE or (total is not None and len(self.data["files"]) >= total)
+        self._save()
+        return bool(files)
+
+    def files(self) -> Iterator[dict]:
+        """Listed files, newest first, paging further in only as the caller iterates"""
+        position = 0
+        while True:
+            with self.lock:
+                if position >= len(self.data["files"]) and not self._fetch_page():
+                    return
+                batch = self.data["files"][position:]
+            yield from batch
+            position += len(batch)
+
+    def scan(self, oldest: str = None) -> Iterator[dict]:
+        """Files until the listing is clearly past `oldest`"""
+        below = 0
+        for file in self.files():
+            yield file
+            if oldest:
+                below = below + 1 if version_key(file["vername"]) < version_key(oldest) else 0
+                if below >= OUT_OF_ORDER:
+                    return
+
+    def find(self, version: str) -> dict | None:
+        key = version_key(version)
+        return next((file for file in self.scan(version) if version_key(file["vername"]) == key), None)
+
+    def meta(self, vercode: int) -> dict:
+        """getAppMeta file entry of one version code, cached"""
+        with self.lock:
+            cached = self.data["meta"].get(str(vercode))
+        if cached:
+            return cached["file"]
+
+        url = f"{BASE_URL}getAppMeta?package_name={self.package}&vercode={vercode}{_get_q_param(self.arch)}"
+        res = session.get(url)
+        res.raise_for_status()
+        file = _file(res.json()["data"])
+        with self.lock:
+            self.data["meta"][str(vercode)] = {"fetched": time.time(), "file": file}
+            self._save()
+        return file
+
+def index(config: Dict) -> VersionIndex:
+    """The shared version index of a config's package and CPU, reloaded after LIST_TTL"""
+    key = (config['package'], config.get('arch', 'universal'))
+    with _indexes_lock:
+        if key not in _indexes or _indexes[key].expired():
+            _indexes[key] = VersionIndex(*key)
+        return _indexes[key]
+
 def get_latest_version(app_name: str, config: Dict) -> str:
-    package = config['package']
-    arch = config.get('arch', 'universal')
-    q = _get_q_param(arch)
-    url = f"{BASE_URL}apps/search?query={package}&limit=1&trusted=true{q}"
-    res = session.get(url).json()
-    if res['datalist']['list']:
-        return res['datalist']['list'][0]['file']['vername']
-    raise ValueError(f"No version found for {package}")
+    # The newest page is enough; pick the highest stable version on it
+    versions = [file["vername"] for file in islice(index(config).files(), PAGE_SIZE)]
+    latest = highest(v for v in versions if not is_prerelease(v))
+    if latest:
+        return latest
+    raise ValueError(f"No version found for {config['package']}")
+
+def get_versions(app_name: str, config: Dict, oldest: str = None) -> list[str]:
+    """Versions Aptoide hosts for this package and CPU, newest first"""
+    return sort({file["vername"] for file in index(config).scan(oldest)}, reverse=True)
+
+def get_file(version: str, app_name: str, config: Dict) -> dict:
+    """Download path, md5 and size of a version, from the listing when it has them"""
+    versions = index(config)
+    file = next(versions.files(), None) if version.lower() == "latest" else versions.find(version)
+    if not file:
+        raise ValueError(f"Version {version} not found for {config['package']}")
+    if not (file["path"] and file["md5"] and file["size"]):
+        file = versions.meta(file["vercode"])
+    return file
 
 def get_download_link(version: str, app_name: str, config: Dict) -> str:
-    package = config['package']
-    arch = config.get('arch', 'universal')
-    q = _get_q_param(arch)
-
-    if version.lower() == "latest":
-        url = f"{BASE_URL}apps/search?query={package}&limit=1&trusted=true{q}"
-        res = session.get(url).json()
-        return res['datalist']['list'][0]['file']['path']
-
-    # Find vercode for specific version
-    url_versions = f"{BASE_URL}listAppVersions?package_name={package}&limit=50{q}"
-    res_v = session.get(url_versions).json()
-    vercode = None
-    for app in res_v['datalist']['list']:
-        if app['file']['vername'] == version:
-            vercode = app['file']['vercode']
-            break
-    if not vercode:
-        raise ValueError(f"Version {version} not found for {package}")
-
-    # Get meta with download path
-    url_meta = f"{BASE_URL}getAppMeta?package_name={package}&vercode={vercode}{q}"
-    res_meta = session.get(url_meta).json()
-    return res_meta['data']['file']['path']
+    return get_file(version, app_name, config)["path"]
+
+def verify_download(path: Path, version: str, app_name: str, config: Dict) -> bool:
+    """Check a downloaded APK against the size and md5 Aptoide lists"""
+    expected = get_file(version, app_name, config)
+    if expected["size"] and Path(path).stat().st_size != int(expected["size"]):
+        logging.error(f"Size mismatch for {Path(path).name}: {Path(path).stat().st_size} != {expected['size']}")
+        return False
+    if expected["md5"]:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                md5.update(block)
+        if md5.hexdigest() != expected["md5"]:
+            logging.error(f"MD5 mismatch for {Path(path).name}")
+            return False
+    return True
 
 def _get_q_param(arch: str) -> str:
     if arch == 'universal':
@@ -0,0 +1,221 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+from sys import exit
+from pathlib import Path
+from src import cache_dir
+
+PLATFORMS = ("apkmirror", "apkpure", "uptodown", "aptoide")
+ARCHES = ("universal", "arm64-v8a", "armeabi-v7a", "x86", "x86_64")
+
+# Keys every platform config needs before a scraper can use it
+REQUIRED_KEYS = {
+    "apkmirror": ("org", "name", "package"),
+    "apkpure": ("name", "package"),
+    "uptodown": ("name", "package"),
+    "aptoide": ("name", "package"),
+}
+
+SNAPSHOT = cache_dir / "catalog.json"
+
+_catalog: dict | None = None
+_loaded_stamp: dict[str, int] | None = None
+_lock = threading.Lock()
+
+def _files(root: Path) -> list[Path]:
+    files = [root / "patch-config.json", root / "arch-config.json"]
+    for platform in PLATFORMS:
+        files.extend(sorted((root / "apps" / platform).glob("*.json")))
+    files.extend(sorted((root / "sources").glob("*.json")))
+    files.extend(sorted((root / "patches").glob("*.txt")))
+    return [f for f in files if f.exists()]
+
+def _stamp(files: list[Path]) -> dict[str, int]:
+    return {str(f): f.stat().st_mtime_ns for f in files}
+
+def _read_json(path: Path, problems: list[str]):
+    try:
+        with path.open() as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        problems.append(f"{path}: {e}")
+        return None
+
+def _parse_selection(path: Path) -> dict[str, list[str]]:
+    """"+Name" lines enable a patch, "-Name" lines disable it"""
+    selection = {"include": [], "exclude": []}
+    with path.open() as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('-'):
+                selection["exclude"].append(line[1:].strip())
+            elif line.startswith('+'):
+                selection["include"].append(line[1:].strip())
+    return selection
+
+def build(root: Path = Path(".")) -> dict:
+    """Parse and validate every config under root into one index"""
+    problems = []
+    catalog = {
+        "apps": {},
+        "packages": {},
+        "sources": {},
+        "patches": {},
+        "builds": [],
+        "arches": {},
+        "problems": problems,
+    }
+
+    for platform in PLATFORMS:
+        for path in sorted((root / "apps" / platform).glob("*.json")):
+            config = _read_json(path, problems)
+            if not isinstance(config, dict):
+                if config is not None:
+                    problems.append(f"{path}: expected an object")
+                continue
+            missing = [key for key in REQUIRED_KEYS[platform] if not config.get(key)]
+            if missing:
+                problems.append(f"{path}: missing {', '.join(missing)}")
+            catalog["apps"].setdefault(path.stem, {})[platform] = config
+            if config.get("package"):
+                apps = catalog["packages"].setdefault(config["package"], [])
+                if path.stem not in apps:
+                    apps.append(path.stem)
+
+    for path in sorted((root / "sources").glob("*.json")):
+        definition = _read_json(path, problems)
+        if isinstance(definition, dict):
+            if "bundle_url" not in definition:
+                problems.append(f"{path}: bundle source without bundle_url")
+        elif isinstance(definition, list) and definition and "name" in definition[0]:
+            for repo in definition[1:]:
+                if not all(key in repo for key in ("user", "repo", "tag")):
+                    problems.append(f"{path}: repository entry needs user, repo and tag")
+        elif definition is not None:
+            problems.append(f"{path}: expected a bundle object or a [{{name}}, repos...] list")
+            continue
+        if definition is not None:
+            catalog["sources"][path.stem] = definition
+
+    for path in sorted((root / "patches").glob("*.txt")):
+        catalog["patches"][path.stem] = _parse_selection(path)
+
+    patch_config = _read_json(root / "patch-config.json", problems) if (root / "patch-config.json").exists() else None
+    for entry in (patch_config or {}).get("patch_list", []):
+        app_name, source = entry.get("app_name"), entry.get("source")
+        if app_name not in catalog["apps"]:
+            problems.append(f"patch-config.json: no app config for {app_name}")
+        if source not in catalog["sources"]:
+            problems.append(f"patch-config.json: unknown source {source} for {app_name}")
+        catalog["builds"].append({"app_name": app_name, "source": source})
+
+    arch_config = _read_json(root / "arch-config.json", problems) if (root / "arch-config.json").exists() else None
+    for entry in arch_config or []:
+        app_name, source, arches = entry.get("app_name"), entry.get("source"), entry.get("arches", [])
+        unknown = [arch for arch in arches if arch not in ARCHES]
+        if unknown:
+            problems.append(f"arch-config.json: unknown arches {unknown} for {app_name}")
+        # First entry wins, as with the old linear scan
+        catalog["arches"].setdefault(app_name, {}).setdefault(source, arches)
+
+    return catalog
+
+def _load_snapshot(stamp: dict[str, int]) -> dict | None:
+    try:
+        with SNAPSHOT.open() as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return snapshot["catalog"] if snapshot.get("files") == stamp else None
+
+def _save_snapshot(stamp: dict[str, int], catalog: dict) -> None:
+    try:
+        SNAPSHOT.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=SNAPSHOT.parent, suffix=".part", delete=False) as f:
+            json.dump({"files": stamp, "catalog": catalog}, f)
+        Path(f.name).replace(SNAPSHOT)
+    except OSError as e:
+        logging.debug(f"Could not write catalog snapshot: {e}")
+
+def load(root: Path = Path("."), refresh: bool = False) -> dict:
+    """The catalog for this process, built once.
+
+    With CATALOG_SNAPSHOT set, the compiled index is kept in the cache and
+    reused while no config file has changed (by mtime).
+    """
+    global _catalog
+    if _catalog is not None and not refresh:
+        return _catalog
+
+    with _lock:
+        if _catalog is not None and not refresh:
+            return _catalog
+
+        global _loaded_stamp
+        use_snapshot = bool(os.getenv("CATALOG_SNAPSHOT"))
+        stamp = _loaded_stamp = _stamp(_files(root))
+        catalog = _load_snapshot(stamp) if use_snapshot else None
+        if catalog is None:
+            catalog = build(root)
+            if use_snapshot:
+                _save_snapshot(stamp, catalog)
+
+        for problem in catalog["problems"]:
+            logging.warning(f"⚠️ Config: {problem}")
+        _catalog = catalog
+        return _catalog
+
+def refresh(root: Path = Path(".")) -> dict:
+    """The catalog, rebuilt first if a config file changed since it was loaded"""
+    return load(root, refresh=_stamp(_files(root)) != _loaded_stamp)
+
+def config_path(app_name: str, platform: str) -> Path:
+    return Path("apps") / platform / f"{app_name}.json"
+
+def config(app_name: str, platform: str) -> dict | None:
+    """A copy of an app's platform config, safe for callers to modify"""
+    found = load()["apps"].get(app_name, {}).get(platform)
+    return dict(found) if found is not None else None
+
+def platforms(app_name: str) -> list[str]:
+    return [platform for platform in PLATFORMS if platform in load()["apps"].get(app_name, {})]
+
+def apps() -> list[str]:
+    return sorted(load()["apps"])
+
+def by_package(package: str) -> list[str]:
+    return list(load()["packages"].get(package, []))
+
+def source(name: str):
+    definition = load()["sources"].get(name)
+    if definition is None:
+        raise FileNotFoundError(f"Source not found: {Path('sources') / f'{name}.json'}")
+    return definition
+
+def source_name(name: str) -> str:
+    """The name a source's artifacts carry, as download_required reports it"""
+    definition = source(name)
+    if isinstance(definition, dict):
+        return definition.get("name", "bundle-patches")
+    return definition[0]["name"]
+
+def sources() -> dict:
+    return load()["sources"]
+
+def selection(app_name: str, source_name: str) -> dict[str, list[str]]:
+    return load()["patches"].get(f"{app_name}-{source_name}", {"include": [], "exclude": []})
+
+def builds() -> list[dict]:
+    return load()["builds"]
+
+def arches(app_name: str, source_name: str) -> list[str] | None:
+    """Arches to build, or None if arch-config.json does not list the pair"""
+    return load()["arches"].get(app_name, {}).get(source_name)
+
+if __name__ == "__main__":
+    catalog = load(refresh=True)
+    print(f"{len(catalog['apps'])} apps, {len(catalog['sources'])} sources, "
+          f"{len(catalog['patches'])} patch selections, {len(catalog['builds'])} builds")
+    exit(1 if catalog["problems"] else 0)
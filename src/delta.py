@@ -0,0 +1,183 @@
+"""Binary deltas between consecutive builds of the same app, source and arch.
+
+With DELTA=1 every finished APK gets a zstd --patch-from delta against the
+artifact published before it, plus a JSON manifest with the sizes and
+SHA-256 of base, target and delta. A new APK only becomes the next base
+once release.publish() has uploaded it, so a build that never reaches the
+release does not break the chain. Consumers that still have the old APK
+rebuild the new one with:
+
+    python -m src.delta apply OLD.apk NEW.apk.delta.zst [-o NEW.apk]
+    python -m src.delta verify NEW.apk [--manifest NEW.apk.delta.json]
+
+`zstd -d --long=31 --patch-from=OLD.apk NEW.apk.delta.zst -o NEW.apk`
+does the same without this repo; apply also checks both checksums.
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+from src import utils, trace, workspace, cache_dir
+
+# The last artifact published per app, source and arch; builds wait in
+# PENDING under it until their upload succeeds
+published_dir = cache_dir / "published"
+PENDING = "pending"
+
+DELTA_SUFFIX = ".delta.zst"
+MANIFEST_SUFFIX = ".delta.json"
+FORMAT = "zstd-patch-from"
+
+# --patch-from needs a window that covers the whole base file: 2 GiB
+LEVEL = 19
+WINDOW_LOG = 31
+
+def base_dir(app_name: str, source: str, arch: str) -> Path:
+    return published_dir / f"{app_name}-{source}-{arch}"
+
+def previous(app_name: str, source: str, arch: str) -> Path | None:
+    directory = base_dir(app_name, source, arch)
+    if directory.is_dir():
+        return next((f for f in directory.iterdir() if f.is_file() and not f.name.endswith(".part")), None)
+    return None
+
+def sidecars(apk: Path) -> list[Path]:
+    """The delta and manifest published next to an APK, if any"""
+    files = [apk.with_name(apk.name + DELTA_SUFFIX), apk.with_name(apk.name + MANIFEST_SUFFIX)]
+    return files if all(f.exists() for f in files) else []
+
+def describe(path: Path) -> dict:
+    return {"name": path.name, "size": path.stat().st_size, "sha256": utils.file_digest(path)}
+
+def stage(app_name: str, source: str, arch: str, apk: Path) -> Path:
+    """Hold `apk` back as the next base until promote() is called for it"""
+    directory = base_dir(app_name, source, arch) / PENDING
+    directory.mkdir(parents=True, exist_ok=True)
+    for old in directory.iterdir():
+        old.unlink()
+    return workspace.hardlink(apk, directory / apk.name)
+
+def promote(apk: Path) -> bool:
+    """Make a staged APK the base of the next delta, once it is published"""
+    for staged in published_dir.glob(f"*/{PENDING}/{apk.name}"):
+        directory = staged.parent.parent
+        for old in directory.iterdir():
+            if old.is_file():
+                old.unlink()
+        os.replace(staged, directory / apk.name)
+        return True
+    return False
+
+def create(app_name: str, source: str, arch: str, apk: Path) -> Path | None:
+    """Write APK.delta.zst and APK.delta.json against the previous artifact.
+
+    Returns the delta, or None when there is no usable base or the delta
+    would not be smaller than the APK. The APK is staged as the next base.
+    """
+    base = previous(app_name, source, arch)
+    delta = apk.with_name(apk.name + DELTA_SUFFIX)
+    manifest = apk.with_name(apk.name + MANIFEST_SUFFIX)
+    delta.unlink(missing_ok=True)
+    manifest.unlink(missing_ok=True)
+
+    if base is None:
+        logging.info(f"No previous {app_name} {arch} artifact, no delta this time")
+    elif utils.file_digest(base) == utils.file_digest(apk):
+        logging.info(f"{apk.name} is unchanged since the last build, no delta")
+        base = None
+    else:
+        with trace.span("delta", arch=arch) as span:
+            result = utils.run_command([
+                "zstd", "-q", "-f", f"-{LEVEL}", f"--long={WINDOW_LOG}", "-T0",
+                f"--patch-from={base}", str(apk), "-o", str(delta)
+            ], silent=True)
+            if result.ok:
+                span["bytes"] = delta.stat().st_size
+
+        if not result.ok:
+            logging.warning(f"zstd delta failed ({result.returncode}): {result.tail[-200:]}")
+            delta.unlink(missing_ok=True)
+            base = None
+        elif delta.stat().st_size >= apk.stat().st_size:
+            logging.info(f"Delta for {apk.name} is no smaller than the APK, dropped")
+            delta.unlink()
+            base = None
+
+    if base is not None:
+        document = {
+            "format": FORMAT,
+            "window_log": WINDOW_LOG,
+            "app": app_name,
+            "source": source,
+            "arch": arch,
+            "base": describe(base),
+            "target": describe(apk),
+            "delta": describe(delta),
+        }
+        manifest.write_text(json.dumps(document, indent=2) + "\n")
+        ratio = document["delta"]["size"] / document["target"]["size"]
+        logging.info(f"🧩 Delta {base.name} → {apk.name}: {document['delta']['size']} bytes ({ratio:.1%})")
+
+    stage(app_name, source, arch, apk)
+    return delta if base is not None else None
+
+def _manifest_for(delta: Path) -> Path:
+    return delta.with_name(delta.name.removesuffix(DELTA_SUFFIX) + MANIFEST_SUFFIX)
+
+def verify(target: Path, manifest: dict) -> bool:
+    expected = manifest["target"]
+    return target.stat().st_size == expected["size"] and utils.file_digest(target) == expected["sha256"]
+
+def apply(base: Path, delta: Path, output: Path = None, manifest_path: Path = None) -> Path:
+    """Rebuild the target APK from its base and delta, checking both ends"""
+    manifest = json.loads((manifest_path or _manifest_for(delta)).read_text())
+    if manifest.get("format") != FORMAT:
+        raise ValueError(f"Unsupported delta format {manifest.get('format')!r}")
+    if utils.file_digest(base) != manifest["base"]["sha256"]:
+        raise ValueError(f"{base.name} is not the base of this delta (expected {manifest['base']['name']})")
+
+    output = output or base.with_name(manifest["target"]["name"])
+    result = utils.run_command([
+        "zstd", "-q", "-d", "-f", f"--long={manifest.get('window_log', WINDOW_LOG)}",
+        f"--patch-from={base}", str(delta), "-o", str(output)
+    ], silent=True)
+    if not result.ok:
+        raise RuntimeError(f"zstd failed ({result.returncode}): {result.tail[-200:]}")
+    if not verify(output, manifest):
+        output.unlink(missing_ok=True)
+        raise ValueError(f"Rebuilt {output.name} does not match the manifest checksum")
+    return output
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    apply_parser = commands.add_parser("apply", help="rebuild an APK from the previous one and a delta")
+    apply_parser.add_argument("base", type=Path)
+    apply_parser.add_argument("delta", type=Path)
+    apply_parser.add_argument("-o", "--output", type=Path)
+    apply_parser.add_argument("--manifest", type=Path)
+    verify_parser = commands.add_parser("verify", help="check an APK against its delta manifest")
+    verify_parser.add_argument("apk", type=Path)
+    verify_parser.add_argument("--manifest", type=Path)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "apply":
+            output = apply(args.base, args.delta, args.output, args.manifest)
+            print(f"✅ Rebuilt {output}")
+            return 0
+        manifest = json.loads((args.manifest or args.apk.with_name(args.apk.name + MANIFEST_SUFFIX)).read_text())
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    if verify(args.apk, manifest):
+        print(f"✅ {args.apk.name} matches {manifest['target']['sha256'][:12]}")
+        return 0
+    print(f"❌ {args.apk.name} does not match the manifest")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
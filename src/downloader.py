@@ -1,32 +1,67 @@
-import json
+import time
+import hashlib
 import logging
+import tempfile
+import threading
+import contextvars
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+import src
+from src.version import version_key
 from src import (
     utils,
-    apkpure,
+    trace,
+    catalog,
+    history,
+    patcher,
+    workspace,
+    github_api,
     session,
-    uptodown,
-    aptoide,
-    apkmirror
+    download_workers,
+    OfflineError
 )
 
-def download_resource(url: str, name: str = None) -> Path:
-    res = session.get(url, stream=True)
-    res.raise_for_status()
-    final_url = res.url
+TOOL_SUFFIXES = (".jar", ".rvp", ".mpp")
 
-    if not name:
-        name = utils.extract_filename(res, fallback_url=final_url)
+# Versions each platform hosts, per (platform, package, arch), read once per run
+_indexes: dict[tuple[str, str, str], list[str] | None] = {}
+_indexes_lock = threading.Lock()
 
-    filepath = Path(name)
-    total_size = int(res.headers.get('content-length', 0))
-    downloaded_size = 0
+def reset() -> None:
+    """Forget the version listings, so the next build reads them again"""
+    with _indexes_lock:
+        _indexes.clear()
 
-    with filepath.open("wb") as file:
-        for chunk in res.iter_content(chunk_size=8192):
-            if chunk:
-                file.write(chunk)
-                downloaded_size += len(chunk)
+def _in_context(pool: ThreadPoolExecutor, func, *args):
+    """Submit in a copy of the caller's context, so spans nest under its build or job"""
+    return pool.submit(contextvars.copy_context().run, func, *args)
+
+def _map(pool: ThreadPoolExecutor, func, items) -> list:
+    return [future.result() for future in [_in_context(pool, func, item) for item in items]]
+
+def download_resource(url: str, name: str = None, directory: Path = None) -> Path:
+    with trace.span("download", url=url):
+        res = session.get(url, stream=True)
+        res.raise_for_status()
+        final_url = res.url
+
+        if not name:
+            name = utils.extract_filename(res, fallback_url=final_url)
+
+        filepath = (directory or Path()) / name
+        total_size = int(res.headers.get('content-length', 0))
+        downloaded_size = 0
+
+        # Unique partial file, so concurrent downloads of the same name never clash
+        with tempfile.NamedTemporaryFile(dir=filepath.parent, prefix=f".{name}.", suffix=".part", delete=False) as file:
+            for chunk in res.iter_content(chunk_size=8192):
+                if chunk:
+                    file.write(chunk)
+                    downloaded_size += len(chunk)
+
+        Path(file.name).replace(filepath)
+        trace.add("bytes", downloaded_size)
 
     logging.info(
         f"URL: {final_url} [{downloaded_size}/{total_size}] -> \"{filepath}\" [1]"
@@ -34,10 +69,31 @@ def download_resource(url: str, name: str = None) -> Path:
 
     return filepath
 
+def download_tool(url: str, key: str = None, name: str = None) -> Path:
+    """Download into the shared tool cache, reusing a previous download of the same key.
+
+    The key defaults to the URL's, which REST and GraphQL release data share.
+    """
+    directory = workspace.tools_dir / (key or _url_key(url))
+    if directory.is_dir():
+        cached = [f for f in directory.iterdir() if not f.name.endswith(".part")]
+        if cached:
+            logging.info(f"Using cached tool: {cached[0].name}")
+            return cached[0]
+    if src.offline:
+        raise OfflineError(f"Tool not cached: {name or url}")
+
+    directory.mkdir(parents=True, exist_ok=True)
+    return workspace.seal(download_resource(url, name, directory))
+
+def _url_key(url: str) -> str:
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
 def download_required(source: str) -> tuple[list[Path], str]:
-    source_path = Path("sources") / f"{source}.json"
-    with source_path.open() as json_file:
-        repos_info = json.load(json_file)
+    repos_info = catalog.source(source)
+
+    # One batched lookup for every repo this source needs
+    github_api.prefetch(github_api.source_refs(repos_info))
 
     # Handle bundle format
     if isinstance(repos_info, dict) and "bundle_url" in repos_info:
@@ -45,34 +101,50 @@ def download_required(source: str) -> tuple[list[Path], str]:
     
     # Handle old list format
     name = repos_info[0]["name"]
-    downloaded_files = []
+    repos_info = repos_info[1:]
 
-    for repo_info in repos_info[1:]:
-        user = repo_info['user']
-        repo = repo_info['repo']
-        tag = repo_info['tag']
-
-        release = utils.detect_github_release(user, repo, tag)
-        
-        # Special handling for Morphe files
-        if repo == "morphe-patches" or repo == "morphe-cli":
-            for asset in release["assets"]:
-                if asset["name"].endswith(".asc"):
-                    continue
-                # Download .mpp patches or morphe-cli.jar
-                if asset["name"].endswith(".mpp") or ("morphe-cli" in asset["name"] and asset["name"].endswith(".jar")):
-                    filepath = download_resource(asset["browser_download_url"])
-                    downloaded_files.append(filepath)
-        else:
-            # Original logic for ReVanced files
-            for asset in release["assets"]:
-                if asset["name"].endswith(".asc"):
-                    continue
-                filepath = download_resource(asset["browser_download_url"])
-                downloaded_files.append(filepath)
+    with ThreadPoolExecutor(max_workers=download_workers) as pool:
+        releases = _map(
+            pool,
+            lambda info: utils.detect_github_release(info['user'], info['repo'], info['tag']),
+            repos_info
+        )
+        assets = [
+            asset
+            for repo_info, release in zip(repos_info, releases)
+            for asset in select_assets(repo_info['repo'], release["assets"])
+        ]
+        downloaded_files = _map(
+            pool,
+            lambda asset: download_tool(asset["browser_download_url"], name=asset["name"]),
+            assets
+        )
 
     return downloaded_files, name
 
+def select_assets(repo: str, assets: list[dict]) -> list[dict]:
+    """Pick the release assets a build uses from metadata, before downloading anything"""
+    # Signatures, checksums, JSON lists and integrations APKs are never used
+    wanted = [asset for asset in assets if asset["name"].endswith(TOOL_SUFFIXES)]
+
+    # Special handling for Morphe files: .mpp patches or morphe-cli.jar
+    if repo == "morphe-patches" or repo == "morphe-cli":
+        wanted = [
+            asset for asset in wanted
+            if asset["name"].endswith(".mpp") or ("morphe-cli" in asset["name"] and asset["name"].endswith(".jar"))
+        ]
+
+    # Keep a single CLI per release, preferring non-dev "-all" jars
+    clis = [asset for asset in wanted if asset["name"].endswith(".jar") and "cli" in asset["name"].lower()]
+    if len(clis) > 1:
+        keep = min(clis, key=lambda asset: ("dev" in asset["name"].lower(), "all" not in asset["name"].lower()))
+        wanted = [asset for asset in wanted if asset not in clis or asset is keep]
+
+    skipped = [asset["name"] for asset in assets if asset not in wanted]
+    if skipped:
+        logging.info(f"Skipping unused assets from {repo}: {', '.join(skipped)}")
+    return wanted
+
 def download_from_bundle(bundle_info: dict) -> tuple[list[Path], str]:
     """Download resources from a bundle URL"""
     bundle_url = bundle_info["bundle_url"]
@@ -80,92 +152,173 @@ def download_from_bundle(bundle_info: dict) -> tuple[list[Path], str]:
     
     logging.info(f"Downloading bundle from {bundle_url}")
     
-    # Download the bundle JSON
-    with session.get(bundle_url) as res:
-        res.raise_for_status()
-        bundle_data = res.json()
-    
-    downloaded_files = []
+    # Download the bundle JSON (ETag-cached, so it also works offline)
+    bundle_data = github_api.get_json(bundle_url, headers={})
     
-    # Check API version and structure
-    if "patches" in bundle_data:
-        # API v4 format
-        patches = bundle_data.get("patches", [])
-        integrations = bundle_data.get("integrations", [])
-        
-        # Download patches (JAR files)
-        for patch in patches:
-            if "url" in patch:
-                filepath = download_resource(patch["url"])
-                downloaded_files.append(filepath)
-                logging.info(f"Downloaded patch: {patch.get('name', 'unknown')}")
-        
-        # Download integrations (APK files)
-        for integration in integrations:
-            if "url" in integration:
-                filepath = download_resource(integration["url"])
-                downloaded_files.append(filepath)
-                logging.info(f"Downloaded integration: {integration.get('name', 'unknown')}")
-    
-    # Also download CLI (still needed) - try ReVanced CLI first
-    try:
-        cli_release = utils.detect_github_release("revanced", "revanced-cli", "latest")
-        for asset in cli_release["assets"]:
-            if asset["name"].endswith(".asc"):
-                continue
-            if asset["name"].endswith(".jar") and "cli" in asset["name"].lower():
-                filepath = download_resource(asset["browser_download_url"])
-                downloaded_files.append(filepath)
-                logging.info("Downloaded ReVanced CLI")
-                break
-    except Exception as e:
-        logging.warning(f"Could not download ReVanced CLI: {e}")
+    patches = [patch for patch in bundle_data.get("patches", []) if "url" in patch]
+
+    def download_patch(patch: dict) -> Path:
+        filepath = download_tool(patch["url"])
+        logging.info(f"Downloaded patch: {patch.get('name', 'unknown')}")
+        return filepath
+
+    def download_cli() -> Path | None:
+        # Also download CLI (still needed) - try ReVanced CLI first
+        try:
+            cli_release = utils.detect_github_release("revanced", "revanced-cli", "latest")
+            for asset in select_assets("revanced-cli", cli_release["assets"]):
+                if asset["name"].endswith(".jar") and "cli" in asset["name"].lower():
+                    filepath = download_tool(asset["browser_download_url"], name=asset["name"])
+                    logging.info("Downloaded ReVanced CLI")
+                    return filepath
+        except Exception as e:
+            logging.warning(f"Could not download ReVanced CLI: {e}")
+        return None
+
+    # API v4 bundles also list integrations; the build never merges them,
+    # so only the patches and the CLI are fetched, side by side
+    with ThreadPoolExecutor(max_workers=download_workers) as pool:
+        cli = _in_context(pool, download_cli)
+        downloaded_files = _map(pool, download_patch, patches)
+        if cli.result():
+            downloaded_files.append(cli.result())
     
     return downloaded_files, name
 
-def download_platform(app_name: str, platform: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    try:
-        config_path = Path("apps") / platform / f"{app_name}.json"
-        if not config_path.exists():
-            raise FileNotFoundError(f"Config file not found: {config_path}")
+def load_config(app_name: str, platform: str) -> dict | None:
+    return catalog.config(app_name, platform)
 
-        with config_path.open() as json_file:
-            config = json.load(json_file)
+def download_platform(app_name: str, platform: str, cli: str, patches: str, arch: str = None, directory: Path = None) -> tuple[Path | None, str | None]:
+    try:
+        config = load_config(app_name, platform)
+        if config is None:
+            raise FileNotFoundError(f"Config file not found: {catalog.config_path(app_name, platform)}")
         
         # Override arch if specified
         if arch:
             config['arch'] = arch
 
-        version = config.get("version") or utils.get_supported_version(config['package'], cli, patches)
-        platform_module = globals()[platform]
-        version = version or platform_module.get_latest_version(app_name, config)
+        package, apk_arch = config['package'], config.get('arch', 'universal')
+        pinned = config.get("version")
+        supported = [pinned] if pinned else patcher.compatible_versions(package, cli, patches)
+        if src.offline:
+            version = resolve_version(supported, workspace.cached_versions(package, apk_arch)[::-1])
+            if not version:
+                raise OfflineError(f"No cached APK of {package} is a supported version")
+            return from_apk_cache(package, version, apk_arch, directory)
+
+        # The best supported version is already cached, no need to ask the store
+        if supported and workspace.cached_apk(package, supported[0], apk_arch):
+            return from_apk_cache(package, supported[0], apk_arch, directory)
+
+        # Scraper modules (and BeautifulSoup) load only when a platform is tried
+        platform_module = import_module(f"src.{platform}")
+        if pinned:
+            # A version pinned in the config is fetched as is; the index may not reach it
+            version = pinned
+        else:
+            available = available_versions(platform, app_name, config, oldest=supported[-1] if supported else None)
+            version = resolve_version(supported, available)
+        if version is None and supported is None:
+            version = platform_module.get_latest_version(app_name, config)
+        if version is None:
+            newest = f" (newest {supported[0]})" if supported else ""
+            logging.warning(f"{platform} hosts none of the supported {app_name} versions{newest}")
+            return None, None
+
+        if workspace.cached_apk(package, version, apk_arch):
+            return from_apk_cache(package, version, apk_arch, directory)
         
-        download_link = platform_module.get_download_link(version, app_name, config)
-        filepath = download_resource(download_link)
+        # Only real store downloads teach history.order; cache hits and
+        # unsupported versions say nothing about how the store behaves
+        started = time.monotonic()
+        try:
+            download_link = platform_module.get_download_link(version, app_name, config)
+            filepath = download_resource(download_link, directory=directory)
+            # Stores that list checksums check the file before it is cached
+            verify = getattr(platform_module, "verify_download", None)
+            if verify and not verify(filepath, version, app_name, config):
+                filepath.unlink(missing_ok=True)
+                raise ValueError(f"{platform} download of {app_name} {version} does not match its listing")
+        except Exception:
+            history.record(app_name, platform, False, time.monotonic() - started)
+            raise
+        history.record(app_name, platform, True, time.monotonic() - started)
+        workspace.cache_apk(filepath, package, version, apk_arch)
         return filepath, version 
 
+    except OfflineError as e:
+        logging.error(f"❌ Offline: {e}")
+        return None, None
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return None, None
 
+def available_versions(platform: str, app_name: str, config: dict, oldest: str = None) -> list[str] | None:
+    """Versions a platform hosts, newest first; None if its index could not be read"""
+    key = (platform, config['package'], config.get('arch', 'universal'))
+    with _indexes_lock:
+        if key in _indexes:
+            return _indexes[key]
+    try:
+        versions = import_module(f"src.{platform}").get_versions(app_name, config, oldest)
+        logging.info(f"📇 {platform} hosts {len(versions)} versions of {app_name}")
+    except Exception as e:
+        logging.warning(f"Could not list {platform} versions of {app_name}: {e}")
+        versions = None
+    with _indexes_lock:
+        _indexes[key] = versions
+    return versions
+
+def resolve_version(supported: list[str] | None, available: list[str] | None) -> str | None:
+    """Highest version that the patches support and the store hosts.
+
+    supported None means any version, so the newest hosted one wins;
+    available None means the store could not be asked, so the newest
+    supported version is tried as before. Indexes read only a few pages, so
+    a supported version older than everything listed is tried too.
+    """
+    if supported is None:
+        return available[0] if available else None
+    if available is None:
+        return supported[0]
+    hosted = {version_key(v): v for v in available}
+    oldest_listed = min(hosted, default=None)
+    for v in supported:
+        key = version_key(v)
+        if key in hosted:
+            return hosted[key]
+        if oldest_listed is None or key < oldest_listed:
+            return v
+    return None
+
+def from_apk_cache(package: str, version: str | None, arch: str, directory: Path = None) -> tuple[Path, str]:
+    """Link a cached APK into the build; without a version, the newest cached one"""
+    version = version or next(reversed(workspace.cached_versions(package, arch)), None)
+    cached = workspace.cached_apk(package, version, arch) if version else None
+    if not cached:
+        raise OfflineError(f"No cached APK for {package} {version or '(any version)'}")
+    logging.info(f"Using cached APK: {cached.name} ({version})")
+    return workspace.hardlink(cached, (directory or Path()) / cached.name), version
+
 # Update the specific download functions
-def download_apkmirror(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "apkmirror", cli, patches, arch)
+def download_apkmirror(app_name: str, cli: str, patches: str, arch: str = None, directory: Path = None) -> tuple[Path | None, str | None]:
+    return download_platform(app_name, "apkmirror", cli, patches, arch, directory)
 
-def download_apkpure(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "apkpure", cli, patches, arch)
+def download_apkpure(app_name: str, cli: str, patches: str, arch: str = None, directory: Path = None) -> tuple[Path | None, str | None]:
+    return download_platform(app_name, "apkpure", cli, patches, arch, directory)
 
-def download_aptoide(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "aptoide", cli, patches, arch)
+def download_aptoide(app_name: str, cli: str, patches: str, arch: str = None, directory: Path = None) -> tuple[Path | None, str | None]:
+    return download_platform(app_name, "aptoide", cli, patches, arch, directory)
 
-def download_uptodown(app_name: str, cli: str, patches: str, arch: str = None) -> tuple[Path | None, str | None]:
-    return download_platform(app_name, "uptodown", cli, patches, arch)
+def download_uptodown(app_name: str, cli: str, patches: str, arch: str = None, directory: Path = None) -> tuple[Path | None, str | None]:
+    return download_platform(app_name, "uptodown", cli, patches, arch, directory)
 
 def download_apkeditor() -> Path:
     release = utils.detect_github_release("REAndroid", "APKEditor", "latest")
 
     for asset in release["assets"]:
         if asset["name"].startswith("APKEditor") and asset["name"].endswith(".jar"):
-            return download_resource(asset["browser_download_url"])
+            return download_tool(asset["browser_download_url"], name=asset["name"])
 
     raise RuntimeError("APKEditor .jar file not found in the latest release")
@@ -0,0 +1,109 @@
+import json
+import base64
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Response headers worth keeping in a fixture
+KEPT_HEADERS = ("content-type", "etag", "location", "content-disposition")
+
+# Requests per host made through the shared session
+stats: Counter = Counter()
+_stats_lock = threading.Lock()
+
+def _count(url: str) -> None:
+    with _stats_lock:
+        stats[urlsplit(url).netloc] += 1
+
+def request_body(kwargs: dict) -> bytes:
+    if kwargs.get("json") is not None:
+        return json.dumps(kwargs["json"], sort_keys=True).encode()
+    data = kwargs.get("data")
+    return data.encode() if isinstance(data, str) else data or b""
+
+def fixture_key(method: str, url: str, body: bytes = b"") -> str:
+    """Stable name for a request: method, full URL and body"""
+    return hashlib.sha1(b"\n".join([method.upper().encode(), url.encode(), body])).hexdigest()
+
+def fixture_path(directory: Path, method: str, url: str, body: bytes = b"") -> Path:
+    return Path(directory) / (urlsplit(url).netloc or "local") / f"{fixture_key(method, url, body)[:20]}.json"
+
+def save(directory: Path, method: str, url: str, body: bytes, res) -> Path:
+    """Write one response as a JSON fixture (text bodies stay readable)"""
+    content = res.content
+    try:
+        payload = {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        payload = {"base64": base64.b64encode(content).decode()}
+
+    fixture = {
+        "method": method.upper(),
+        "url": url,
+        "final_url": str(res.url),
+        "status": res.status_code,
+        "headers": {k: v for k, v in res.headers.items() if k.lower() in KEPT_HEADERS},
+        **payload,
+    }
+    path = fixture_path(directory, method, url, body)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".part", delete=False) as f:
+        json.dump(fixture, f, indent=2)
+    Path(f.name).replace(path)
+    return path
+
+def load(path: Path) -> dict:
+    with Path(path).open() as f:
+        fixture = json.load(f)
+    fixture["body"] = base64.b64decode(fixture["base64"]) if "base64" in fixture else fixture.get("text", "").encode()
+    return fixture
+
+class FixtureSession:
+    """Wraps the shared session to record responses or replay them.
+
+    Recording (HTTP_RECORD_DIR) saves every non-streamed response to a
+    fixture. Replaying (HTTP_REPLAY_URL) sends each request to a local
+    stand-in such as scripts/replay_server.py instead of the real host;
+    the original URL is restored on the response, so callers see no
+    difference.
+    """
+
+    def __init__(self, session, record_dir: str = None, replay_url: str = None):
+        self._session = session
+        self._record_dir = Path(record_dir) if record_dir else None
+        self._replay_url = replay_url.rstrip("/") if replay_url else None
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def request(self, method: str, url: str, **kwargs):
+        _count(url)
+        body = request_body(kwargs)
+        if self._replay_url:
+            parts = urlsplit(url)
+            target = f"{self._replay_url}/{parts.scheme}/{parts.netloc}{parts.path or '/'}"
+            if parts.query:
+                target += f"?{parts.query}"
+            headers = dict(kwargs.pop("headers", None) or {})
+            headers["X-Fixture-Key"] = fixture_key(method, url, body)
+            res = self._session.request(method, target, headers=headers, **kwargs)
+            res.url = res.headers.get("X-Original-URL", url)
+            return res
+
+        res = self._session.request(method, url, **kwargs)
+        if self._record_dir and not kwargs.get("stream"):
+            path = save(self._record_dir, method, url, body, res)
+            logging.debug(f"Recorded {method} {url} -> {path}")
+        return res
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self.request("HEAD", url, **kwargs)
@@ -0,0 +1,211 @@
+import json
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+import src
+from src import session, github_token, cache_dir, api_url, OfflineError
+
+PER_PAGE = 30
+
+# Resolved releases for this process, keyed by (user, repo, tag)
+_resolved: dict[tuple[str, str, str], dict] = {}
+
+def _headers() -> dict:
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "X-GitHub-Api-Version": "2022-11-28",
+    }
+    if github_token:
+        headers["Authorization"] = f"Bearer {github_token}"
+    return headers
+
+def reset() -> None:
+    """Forget resolved releases, so "latest" and friends are looked up again"""
+    _resolved.clear()
+
+def _cache_path(url: str) -> Path:
+    return cache_dir / "github" / f"{hashlib.sha1(url.encode()).hexdigest()}.json"
+
+def _store(url: str, body, etag: str | None) -> None:
+    cache_path = _cache_path(url)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=cache_path.parent, suffix=".part", delete=False) as f:
+        json.dump({"url": url, "etag": etag, "body": body}, f)
+    Path(f.name).replace(cache_path)
+
+def get_json(url: str, headers: dict = None):
+    """GET a JSON endpoint, revalidating with the cached ETag.
+
+    A 304 answer is served from the cache and does not count against the
+    rate limit. Offline, the cached body is used as is. Headers default to
+    the GitHub API ones. Entries stored by prefetch() have no ETag and are
+    only read offline.
+    """
+    cache_path = _cache_path(url)
+    cached = None
+    headers = dict(_headers() if headers is None else headers)
+    if cache_path.exists():
+        with cache_path.open() as f:
+            cached = json.load(f)
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+
+    if src.offline:
+        if cached is None:
+            raise OfflineError(f"Not cached: {url}")
+        return cached["body"]
+
+    res = session.get(url, headers=headers)
+    if res.status_code == 304 and cached:
+        logging.debug(f"GitHub cache hit: {url}")
+        return cached["body"]
+    res.raise_for_status()
+
+    body = res.json()
+    etag = res.headers.get("etag")
+    if etag:
+        _store(url, body, etag)
+    return body
+
+def _pick(releases: list[dict], tag: str) -> dict | None:
+    if tag == "dev":
+        releases = [r for r in releases if 'dev' in r["tag_name"].lower()]
+    elif tag == "prerelease":
+        releases = [r for r in releases if r["prerelease"]]
+    return max(releases, key=lambda r: r["created_at"]) if releases else None
+
+def _releases_url(user: str, repo: str) -> str:
+    return f"{api_url}/repos/{user}/{repo}/releases"
+
+def _page_url(user: str, repo: str, page: int) -> str:
+    return f"{_releases_url(user, repo)}?per_page={PER_PAGE}&page={page}"
+
+def resolve_release(user: str, repo: str, tag: str) -> dict:
+    """Release data in REST shape for a source entry's tag.
+
+    "latest" and explicit tags are single requests. "", "dev" and
+    "prerelease" walk the newest-first release list only until a page
+    contains a match, instead of listing the whole history.
+    """
+    key = (user, repo, tag)
+    if key in _resolved:
+        return _resolved[key]
+
+    base = _releases_url(user, repo)
+    if tag == "latest":
+        release = get_json(f"{base}/latest")
+    elif tag in ["", "dev", "prerelease"]:
+        release = None
+        page = 1
+        while release is None:
+            releases = get_json(_page_url(user, repo, page))
+            if not releases and page == 1:
+                raise ValueError(f"No releases found for {user}/{repo}")
+            release = _pick(releases, tag)
+            if release is None and len(releases) < PER_PAGE:
+                label = "dev release" if tag == "dev" else tag or "release"
+                raise ValueError(f"No {label} found for {user}/{repo}")
+            page += 1
+    else:
+        release = get_json(f"{base}/tags/{tag}")
+
+    _resolved[key] = release
+    return release
+
+_GRAPHQL_RELEASE = """
+    tagName
+    isPrerelease
+    createdAt
+    releaseAssets(first: 100) { nodes { id name downloadUrl size } }
+"""
+
+def _from_graphql(node: dict) -> dict:
+    # ReleaseAsset has no databaseId in the GraphQL schema, so "id" is the
+    # node ID here; tools are cached by download URL, which both shapes share
+    return {
+        "tag_name": node["tagName"],
+        "prerelease": node["isPrerelease"],
+        "created_at": node["createdAt"],
+        "assets": [
+            {
+                "id": asset["id"],
+                "name": asset["name"],
+                "browser_download_url": asset["downloadUrl"],
+                "size": asset["size"],
+            }
+            for asset in node["releaseAssets"]["nodes"]
+        ],
+    }
+
+def prefetch(refs: list[tuple[str, str, str]]) -> None:
+    """Resolve many (user, repo, tag) references with a single GraphQL query.
+
+    Only the newest releases of each repository are fetched; anything that
+    cannot be answered from them is left to resolve_release. GraphQL needs
+    a token, so this is a no-op without one. Answers are also written to the
+    REST cache, so a later offline run resolves the same releases.
+    """
+    pending = [ref for ref in dict.fromkeys(refs) if ref not in _resolved]
+    if not github_token or not pending or src.offline:
+        return
+
+    repos = list(dict.fromkeys((user, repo) for user, repo, _ in pending))
+    fields = "\n".join(
+        f'''r{i}: repository(owner: {json.dumps(user)}, name: {json.dumps(repo)}) {{
+            latestRelease {{ {_GRAPHQL_RELEASE} }}
+            releases(first: {PER_PAGE}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{ nodes {{ {_GRAPHQL_RELEASE} }} }}
+        }}'''
+        for i, (user, repo) in enumerate(repos)
+    )
+
+    try:
+        res = session.post(f"{api_url}/graphql", json={"query": f"query {{ {fields} }}"}, headers=_headers())
+        res.raise_for_status()
+        body = res.json()
+    except Exception as e:
+        logging.warning(f"Batched release lookup failed, falling back to REST: {e}")
+        return
+
+    # A partial answer carries data for the repos that worked and an error
+    # (e.g. NOT_FOUND for a renamed repo) for each one that did not
+    data = body.get("data") or {}
+    for error in body.get("errors") or []:
+        path = ".".join(str(p) for p in error.get("path") or [])
+        logging.warning(f"Batched release lookup: {path or 'query'}: {error.get('message')}")
+
+    for i, (user, repo) in enumerate(repos):
+        found = data.get(f"r{i}")
+        if not found:
+            continue
+        releases = [_from_graphql(node) for node in found["releases"]["nodes"]]
+        base = _releases_url(user, repo)
+        _store(_page_url(user, repo, 1), releases, None)
+        if found["latestRelease"]:
+            _store(f"{base}/latest", _from_graphql(found["latestRelease"]), None)
+        for ref_user, ref_repo, tag in pending:
+            if (ref_user, ref_repo) != (user, repo):
+                continue
+            if tag == "latest":
+                release = _from_graphql(found["latestRelease"]) if found["latestRelease"] else None
+            elif tag in ["", "dev", "prerelease"]:
+                release = _pick(releases, tag)
+            else:
+                release = next((r for r in releases if r["tag_name"] == tag), None)
+            if release:
+                _resolved[(user, repo, tag)] = release
+                if tag not in ["latest", "", "dev", "prerelease"]:
+                    _store(f"{base}/tags/{tag}", release, None)
+
+    logging.info(f"Resolved {sum(ref in _resolved for ref in pending)}/{len(pending)} releases in one batched query")
+
+def source_refs(repos_info) -> list[tuple[str, str, str]]:
+    """Repositories a parsed sources/*.json definition pulls releases from"""
+    if isinstance(repos_info, dict):
+        return [("revanced", "revanced-cli", "latest")] if "bundle_url" in repos_info else []
+    return [(info["user"], info["repo"], info["tag"]) for info in repos_info[1:]]
+
+def prefetch_sources() -> None:
+    """Resolve every repository referenced under sources/*.json in one pass"""
+    from src import catalog
+    prefetch([ref for definition in catalog.sources().values() for ref in source_refs(definition)])
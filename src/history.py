@@ -0,0 +1,82 @@
+import json
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from src import cache_dir
+
+# Outcome and latency of every APK download attempt, per app and platform
+history_path = cache_dir / "platform-history.json"
+
+# Observations lose half their weight after this long, so a store that
+# recovers (or starts failing) moves within a couple of weeks
+HALF_LIFE = 14 * 24 * 3600
+# Weight of the newest latency in the moving average
+LATENCY_WEIGHT = 0.3
+
+_lock = threading.Lock()
+_history: dict | None = None
+
+def _load() -> dict:
+    global _history
+    if _history is None:
+        try:
+            with history_path.open() as f:
+                _history = json.load(f)
+        except (OSError, ValueError):
+            _history = {}
+    return _history
+
+def _save(history: dict) -> None:
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile("w", dir=history_path.parent, suffix=".part", delete=False) as f:
+        json.dump(history, f, indent=2, sort_keys=True)
+    Path(f.name).replace(history_path)
+
+def _decayed(entry: dict, now: float) -> tuple[float, float]:
+    factor = 0.5 ** ((now - entry["updated"]) / HALF_LIFE)
+    return entry["successes"] * factor, entry["attempts"] * factor
+
+def record(app_name: str, platform: str, ok: bool, seconds: float) -> None:
+    """Add one attempt's outcome and duration"""
+    now = time.time()
+    with _lock:
+        history = _load()
+        entry = history.setdefault(app_name, {}).get(platform)
+        if entry is None:
+            entry = {"successes": 0.0, "attempts": 0.0, "latency": seconds, "updated": now}
+        successes, attempts = _decayed(entry, now)
+        history[app_name][platform] = {
+            "successes": successes + ok,
+            "attempts": attempts + 1,
+            "latency": entry["latency"] + LATENCY_WEIGHT * (seconds - entry["latency"]),
+            "updated": now,
+        }
+        _save(history)
+
+def success_rate(app_name: str, platform: str) -> float:
+    """Decayed success rate, pulled towards 1/2 while there is little history"""
+    with _lock:
+        entry = _load().get(app_name, {}).get(platform)
+    if entry is None:
+        return 0.5
+    successes, attempts = _decayed(entry, time.time())
+    return (successes + 1) / (attempts + 2)
+
+def order(app_name: str, platforms: list[str]) -> list[str]:
+    """Platforms by how often they worked for this app, then by latency.
+
+    Platforms without history keep their place relative to each other.
+    """
+    with _lock:
+        entries = _load().get(app_name, {})
+
+    def key(platform: str) -> tuple[float, float]:
+        entry = entries.get(platform)
+        return (-success_rate(app_name, platform), entry["latency"] if entry else 0.0)
+
+    ordered = sorted(platforms, key=key)
+    if ordered != list(platforms):
+        logging.info(f"📊 Trying {app_name} sources by history: {', '.join(ordered)}")
+    return ordered
@@ -0,0 +1,64 @@
+import re
+import json
+import logging
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from src import output_dir
+
+# Signed artifacts are named "{app}-{arch}-{name}-v{version}.apk"
+ARTIFACT_NAME = "{app}-{arch}-{name}-v{version}.apk"
+
+manifest_dir = output_dir / "manifests"
+
+def artifact_name(app_name: str, arch: str, name: str, version: str) -> str:
+    return ARTIFACT_NAME.format(app=app_name, arch=arch, name=name, version=version)
+
+def parse_artifact(app_name: str, arch: str, file_name: str) -> tuple[str, str] | None:
+    """(name, version) back out of an artifact file name"""
+    match = re.fullmatch(rf'{re.escape(app_name)}-{re.escape(arch)}-(.+)-v(.+)\.apk', file_name)
+    return (match.group(1), match.group(2)) if match else None
+
+def write(app_name: str, source: str, package: str | None, artifacts: list[tuple[str, Path]]) -> Path:
+    """Record what one builder run produced, for the release tooling to pick up"""
+    entries = []
+    for arch, path in artifacts:
+        name, version = parse_artifact(app_name, arch, path.name) or (None, None)
+        entries.append({
+            "arch": arch,
+            "file": path.name,
+            "name": name,
+            "version": version,
+            "size": path.stat().st_size,
+        })
+
+    manifest = {
+        "app_name": app_name,
+        "source": source,
+        "package": package,
+        "built_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "artifacts": entries,
+    }
+
+    manifest_dir.mkdir(parents=True, exist_ok=True)
+    path = manifest_dir / f"{app_name}-{source}.json"
+    with tempfile.NamedTemporaryFile("w", dir=manifest_dir, suffix=".part", delete=False) as f:
+        json.dump(manifest, f, indent=2)
+    Path(f.name).replace(path)
+    logging.info(f"📝 Build manifest: {path}")
+    return path
+
+def load_all(directory: Path = None) -> dict[tuple[str, str], dict]:
+    """Latest manifest per (app, source), newest build winning"""
+    manifests = {}
+    for path in sorted((directory or manifest_dir).glob("**/*.json")):
+        try:
+            with path.open() as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Skipping unreadable manifest {path}: {e}")
+            continue
+        key = (manifest["app_name"], manifest["source"])
+        if key not in manifests or manifest["built_at"] > manifests[key]["built_at"]:
+            manifests[key] = manifest
+    return manifests
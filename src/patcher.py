@@ -0,0 +1,258 @@
+import re
+import json
+import difflib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from src import utils, version, cache_dir
+
+# CLI dialects, keyed by jar digest
+_dialects: dict[str, dict] = {}
+_dialects_lock = threading.Lock()
+
+# Patch metadata from list-patches, keyed by patches bundle digest
+metadata_dir = cache_dir / "patches"
+_metadata: dict[str, dict] = {}
+_metadata_lock = threading.Lock()
+
+def reset() -> None:
+    """Drop the in-memory patch metadata and guessed CLI dialects; the copies on disk stay"""
+    with _metadata_lock:
+        _metadata.clear()
+    with _dialects_lock:
+        for digest in [digest for digest, dialect in _dialects.items() if dialect.get("guessed")]:
+            del _dialects[digest]
+
+def _java(cli: str, *args: str) -> str:
+    return utils.run_process(
+        ["java", "-jar", cli, *args],
+        capture=True, silent=True, check=False
+    ) or ""
+
+def probe_cli(cli: str) -> dict:
+    """Work out which command syntax a patcher CLI jar speaks.
+
+    The result is cached per jar digest, in memory and under the cache dir,
+    so each CLI build is only probed once per host. A guessed dialect is
+    only kept in memory until reset(), so the jar is probed again later.
+    """
+    digest = utils.file_digest(cli)
+    with _dialects_lock:
+        if digest in _dialects:
+            return _dialects[digest]
+
+    cache_path = cache_dir / "cli" / f"{digest}.json"
+    if cache_path.exists():
+        with cache_path.open() as f:
+            dialect = json.load(f)
+        with _dialects_lock:
+            _dialects[digest] = dialect
+        return dialect
+
+    help_text = _java(cli, "--help")
+    version_text = _java(cli, "--version")
+    match = re.search(r'v?(\d+\.\d+(?:\.\d+)?(?:-[\w.]+)?)', version_text)
+
+    if re.search(r'^\s+patch\b', help_text, re.MULTILINE):
+        patch_help = _java(cli, "patch", "--help")
+        dialect = {
+            "style": "subcommand",
+            "patches_flag": "--patch-bundle"
+                if "--patch-bundle" in patch_help and "--patches" not in patch_help
+                else "--patches",
+            "purge": "--purge" in patch_help,
+        }
+    elif "--input" in help_text:
+        dialect = {"style": "flags"}
+    else:
+        logging.warning(f"Could not recognise CLI syntax of {Path(cli).name}, assuming 'patch' subcommand")
+        dialect = {"style": "subcommand", "patches_flag": "--patches", "purge": False, "guessed": True}
+
+    dialect["version"] = match.group(1) if match else None
+    logging.info(f"🔎 {Path(cli).name} v{dialect['version']} uses {dialect['style']} syntax")
+
+    if not dialect.get("guessed"):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with cache_path.open('w') as f:
+            json.dump(dialect, f, indent=2)
+
+    with _dialects_lock:
+        _dialects[digest] = dialect
+    return dialect
+
+def patch_command(cli: str, patches: str, input_apk: str, output_apk: str, selection: list[str] = None) -> list[str]:
+    """Build the single patch invocation for this CLI"""
+    dialect = probe_cli(cli)
+    selection = selection or []
+
+    if dialect["style"] == "flags":
+        if selection:
+            logging.warning("CLI does not accept patch selection flags, ignoring include/exclude list")
+        return [
+            "java", "-jar", cli,
+            "--patches", patches,
+            "--input", input_apk,
+            "--output", output_apk
+        ]
+
+    # --purge drops the patcher's decoded resources as soon as it is done
+    return [
+        "java", "-jar", cli,
+        "patch", dialect["patches_flag"], patches,
+        "--out", output_apk, input_apk,
+        *(["--purge"] if dialect["purge"] else []),
+        *selection
+    ]
+
+def parse_patch_list(text: str) -> list[dict]:
+    """Patches from `list-patches --with-packages --with-versions --with-options` output.
+
+    Each patch is {"name", "description", "enabled", "packages", "options"};
+    "packages" maps a package to its versions (None for any version) and is
+    None for universal patches.
+    """
+    patches = []
+    patch = option = versions = package = None
+    section = None
+    for raw in text.splitlines():
+        # Older CLIs print through java.util.logging
+        raw = re.sub(r'^(?:INFO|WARNING|SEVERE): ', '', raw.rstrip())
+        line = raw.strip()
+        if not line:
+            continue
+        key, sep, value = line.partition(":")
+        value = value.strip()
+
+        if raw == line:
+            # Top-level fields; log lines ("INFO: ...") are not among them
+            if key == "Index" or (key == "Name" and (patch is None or patch["name"])):
+                patch = {"name": None, "description": "", "enabled": True, "packages": None, "options": []}
+                patches.append(patch)
+                section = option = versions = package = None
+            if patch is None:
+                continue
+            if key == "Name":
+                patch["name"] = value
+            elif key == "Description":
+                patch["description"] = value
+            elif key == "Enabled":
+                patch["enabled"] = value.lower() == "true"
+            section = key if key in ("Compatible packages", "Options") else None
+            if section == "Compatible packages":
+                patch["packages"] = {}
+            continue
+
+        if patch is None:
+            continue
+        if section == "Compatible packages":
+            if key == "Package name":
+                versions = None
+                patch["packages"][value] = None
+                package = value
+            elif key == "Compatible versions" and package:
+                versions = patch["packages"][package] = []
+            elif not sep and versions is not None and "Any" not in line:
+                versions.append(line)
+        elif section == "Options":
+            if key == "Title":
+                option = {"title": value}
+                patch["options"].append(option)
+            elif option is not None and sep and key in ("Key", "Default", "Required", "Type", "Description"):
+                option[key.lower()] = value
+
+    return [p for p in patches if p["name"]]
+
+def patch_metadata(cli: str, patches: str) -> dict:
+    """Structured patch list of a bundle, extracted once per bundle digest.
+
+    Kept in memory and under the cache dir. An empty "patches" list means
+    the CLI could not list them; callers then skip validation.
+    """
+    digest = utils.file_digest(patches)
+    with _metadata_lock:
+        if digest in _metadata:
+            return _metadata[digest]
+
+        cache_path = metadata_dir / f"{digest}.json"
+        if cache_path.exists():
+            with cache_path.open() as f:
+                _metadata[digest] = json.load(f)
+            return _metadata[digest]
+
+        dialect = probe_cli(cli)
+        listed = []
+        if dialect["style"] == "subcommand":
+            listed = parse_patch_list(_java(
+                cli, "list-patches", "--with-packages", "--with-versions", "--with-options", patches
+            ))
+        metadata = {"bundle": Path(patches).name, "cli": dialect.get("version"), "patches": listed}
+        _metadata[digest] = metadata
+        if not listed:
+            logging.warning(f"Could not list the patches in {Path(patches).name}, selections are not validated")
+            return metadata
+
+        logging.info(f"🗂️ Cached metadata of {len(listed)} patches from {Path(patches).name}")
+        metadata_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=metadata_dir, suffix=".part", delete=False) as f:
+            json.dump(metadata, f, indent=2)
+        Path(f.name).replace(cache_path)
+        return metadata
+
+def supported_versions(metadata: dict, package: str) -> list[str] | None:
+    """Versions of a package the default patches support, highest first.
+
+    Like list-versions, only patches enabled by default count, and patches
+    that take any version do not lift the pins of the others. None when no
+    patch pins a version; an empty list when the bundle has no patches for
+    the package.
+    """
+    pinned = set()
+    unpinned = False
+    for patch in metadata["patches"]:
+        if not patch["enabled"] or not patch["packages"] or package not in patch["packages"]:
+            continue
+        versions = patch["packages"][package]
+        if versions:
+            pinned.update(versions)
+        else:
+            unpinned = True
+    if pinned:
+        return version.sort(pinned, reverse=True)
+    return None if unpinned else []
+
+def compatible_versions(package: str, cli: str, patches: str) -> list[str] | None:
+    """Versions of a package the bundle supports, highest first; None for any version"""
+    metadata = patch_metadata(cli, patches)
+    if not metadata["patches"]:
+        supported = utils.get_supported_version(package, cli, patches)
+        return [supported] if supported else None
+    versions = supported_versions(metadata, package)
+    if versions == []:
+        logging.warning(f"No patches for {package} in {metadata['bundle']}")
+    return versions or None
+
+def compile_selection(cli: str, patches: str, package: str, selection: dict[str, list[str]]) -> list[str]:
+    """Check a patches/*.txt selection against the bundle and turn it into -d/-e flags.
+
+    Names are matched case-insensitively and rewritten to the bundle's
+    spelling; unknown names raise ValueError with the closest matches.
+    """
+    metadata = patch_metadata(cli, patches)
+    known = {patch["name"].lower(): patch for patch in metadata["patches"]}
+
+    def resolve(name: str) -> str:
+        if not known:
+            return name
+        patch = known.get(name.lower())
+        if patch is None:
+            close = difflib.get_close_matches(name.lower(), known, n=3, cutoff=0.6)
+            hint = f", did you mean {' or '.join(repr(known[c]['name']) for c in close)}?" if close else ""
+            raise ValueError(f"Unknown patch {name!r} in {metadata['bundle']}{hint}")
+        if patch["packages"] is not None and package not in patch["packages"]:
+            logging.warning(f"Patch {patch['name']!r} is not compatible with {package}")
+        return patch["name"]
+
+    flags = [flag for name in selection["exclude"] for flag in ("-d", resolve(name))]
+    flags += [flag for name in selection["include"] for flag in ("-e", resolve(name))]
+    return flags
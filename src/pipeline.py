@@ -0,0 +1,76 @@
+import time
+import logging
+import threading
+import contextvars
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from src import trace, profiling
+
+def run(stages: dict[str, Callable], label: str = "build") -> dict[str, Any]:
+    """Run named stages concurrently and return their results.
+
+    Each stage is called with a `need(name)` function that blocks until
+    another stage has finished and returns its result, so dependencies are
+    only waited on when a stage actually reaches them. The critical path
+    through those waits is logged once everything has finished.
+    """
+    timings: dict[str, dict] = {}
+    lock = threading.Lock()
+
+    with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix=label) as pool:
+        futures = {}
+
+        def make_need(current: str):
+            def need(name: str) -> Any:
+                with lock:
+                    timings[current]["waits"].append(name)
+                return futures[name].result()
+            return need
+
+        def execute(name: str, func: Callable) -> Any:
+            with lock:
+                timings[name] = {"start": time.monotonic(), "waits": []}
+            try:
+                with trace.span(f"stage:{name}"), profiling.profile(f"{label}-{name}"):
+                    return func(make_need(name))
+            finally:
+                with lock:
+                    timings[name]["end"] = time.monotonic()
+
+        origin = time.monotonic()
+        for name, func in stages.items():
+            # Each stage runs in a copy of the caller's context, so its
+            # spans nest under the build that started it
+            futures[name] = pool.submit(contextvars.copy_context().run, execute, name, func)
+
+        results = {}
+        errors = []
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                errors.append(e)
+
+    for name, timing in timings.items():
+        logging.info(f"⏱️ Stage {name}: {timing['end'] - timing['start']:.1f}s")
+    path = critical_path(timings)
+    if path:
+        total = timings[path[-1]]["end"] - origin
+        logging.info(f"🧭 Critical path: {' → '.join(path)} ({total:.1f}s)")
+
+    if errors:
+        raise errors[0]
+    return results
+
+def critical_path(timings: dict[str, dict]) -> list[str]:
+    """Walk back from the last stage to finish through the waits that held it up"""
+    if not timings:
+        return []
+    current = max(timings, key=lambda name: timings[name]["end"])
+    path = [current]
+    while timings[current]["waits"]:
+        current = max(timings[current]["waits"], key=lambda name: timings[name]["end"])
+        if current in path:
+            break
+        path.append(current)
+    return path[::-1]
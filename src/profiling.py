@@ -0,0 +1,71 @@
+import re
+import logging
+import importlib.util
+from pathlib import Path
+from contextlib import contextmanager
+import src
+from src import output_dir
+
+profile_dir = output_dir / "profiles"
+
+def _mode() -> str | None:
+    """Profiler from PROFILE / --profile: "cprofile", "pyinstrument" or None"""
+    mode = (src.profile or "").lower()
+    if mode in ("", "0", "false", "no"):
+        return None
+    if mode in ("cprofile", "pstats"):
+        return "cprofile"
+    # Anything else asks for the sampling profiler when it is installed
+    if importlib.util.find_spec("pyinstrument"):
+        return "pyinstrument"
+    if mode in ("pyinstrument", "sample"):
+        logging.warning("pyinstrument is not installed, falling back to cProfile")
+    return "cprofile"
+
+def _path(label: str, suffix: str) -> Path:
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    name = re.sub(r'[^\w.-]+', '_', label)
+    return profile_dir / f"{name}{suffix}"
+
+@contextmanager
+def profile(label: str):
+    """Profile the current thread while the block runs, if profiling is on.
+
+    cProfile writes {label}.pstats (snakeviz, gprof2dot, flameprof);
+    pyinstrument writes {label}.speedscope.json for https://speedscope.app.
+    """
+    mode = _mode()
+    if mode is None:
+        yield
+        return
+
+    if mode == "pyinstrument":
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+        profiler = Profiler(async_mode="disabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = _path(label, ".speedscope.json")
+            path.write_text(profiler.output(SpeedscopeRenderer()))
+            logging.info(f"🔬 Profile: {path}")
+        return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Python 3.12+ allows only one cProfile at a time across threads
+        logging.warning(f"Not profiling {label}: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = _path(label, ".pstats")
+        profiler.dump_stats(path)
+        logging.info(f"🔬 Profile: {path}")
@@ -1,41 +1,174 @@
 import os
-import boto3
+import hashlib
 import logging
-from botocore.client import Config
+from pathlib import Path
+from functools import cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import (
     datetime, 
     timezone, 
     timedelta
 )
 from src import (
+    utils,
     bucket_name, 
     endpoint_url, 
     access_key_id, 
     secret_access_key
 )
 
-def delete_old_files(s3, bucket_name, prefix, threshold_minutes=60):
-    objects = s3.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
+# Transfer tuning: files above the threshold go up as parallel multipart chunks
+multipart_threshold = int(os.getenv('R2_MULTIPART_THRESHOLD', 64 * 1024 * 1024))
+multipart_chunksize = int(os.getenv('R2_MULTIPART_CHUNKSIZE', 16 * 1024 * 1024))
+transfer_concurrency = int(os.getenv('R2_TRANSFER_CONCURRENCY', '8'))
+upload_workers = int(os.getenv('R2_UPLOAD_WORKERS', '4'))
 
-    if 'Contents' in objects:
-        for obj in objects['Contents']:
-            last_modified = obj['LastModified']
-            age = datetime.now(timezone.utc) - last_modified
+# delete_objects accepts at most 1000 keys per call
+DELETE_BATCH = 1000
 
-            if age > timedelta(minutes=threshold_minutes):
-                s3.delete_object(Bucket=bucket_name, Key=obj['Key'])
-                logging.info(f"Deleted old file: {obj['Key']}")
+def delete_old_files(s3, bucket_name, prefix, threshold_minutes=60, keep=(), dry_run=False) -> tuple[int, int]:
+    """Delete objects under prefix older than the threshold.
 
-def upload(file_path, key):
-    s3 = boto3.client('s3',
-                      endpoint_url=endpoint_url,
-                      aws_access_key_id=access_key_id,
-                      aws_secret_access_key=secret_access_key,
-                      config=Config(signature_version='s3v4'))
+    Walks every page of the listing and removes keys in delete_objects
+    batches of up to 1000. Returns (objects, bytes) deleted, or that would
+    be deleted when dry_run is set.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=threshold_minutes)
+    stale = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['LastModified'] < cutoff and obj['Key'] not in keep:
+                stale.append(obj)
 
-    delete_old_files(s3, bucket_name, key.rsplit('/', 1)[0])
+    freed = sum(obj['Size'] for obj in stale)
+    if dry_run:
+        for obj in stale:
+            logging.info(f"Would delete: {obj['Key']} ({obj['Size']} bytes)")
+        return len(stale), freed
 
-    with open(file_path, 'rb') as file:
-        s3.upload_fileobj(file, bucket_name, key)
+    for i in range(0, len(stale), DELETE_BATCH):
+        batch = stale[i:i + DELETE_BATCH]
+        response = s3.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': obj['Key']} for obj in batch], 'Quiet': True}
+        )
+        for error in response.get('Errors', []):
+            logging.warning(f"Could not delete {error['Key']}: {error.get('Message')}")
+        logging.info(f"Deleted {len(batch) - len(response.get('Errors', []))} old file(s) under {prefix}")
+
+    return len(stale), freed
+
+def cleanup(prefixes, threshold_minutes=60, keep=(), dry_run=False) -> tuple[int, int]:
+    """Run the stale-object sweep once for all prefixes of a run"""
+    s3 = client()
+    total_count = total_bytes = 0
+    for prefix in dict.fromkeys(prefixes):
+        count, freed = delete_old_files(s3, bucket_name, prefix, threshold_minutes, keep, dry_run)
+        total_count += count
+        total_bytes += freed
+
+    action = "Would free" if dry_run else "Freed"
+    logging.info(f"🧹 {action} {total_bytes / (1 << 20):.1f} MiB in {total_count} object(s)")
+    return total_count, total_bytes
+
+@cache
+def client():
+    """Shared S3 client; boto3 is only imported when something is uploaded.
+
+    ENDPOINT_URL can point at any S3 stand-in (MinIO, moto server) for
+    local testing.
+    """
+    import boto3
+    from botocore.client import Config
+
+    return boto3.client('s3',
+                        endpoint_url=endpoint_url,
+                        aws_access_key_id=access_key_id,
+                        aws_secret_access_key=secret_access_key,
+                        config=Config(signature_version='s3v4',
+                                      max_pool_connections=max(10, upload_workers * transfer_concurrency)))
+
+@cache
+def transfer_config():
+    from boto3.s3.transfer import TransferConfig
+
+    return TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=transfer_concurrency,
+        use_threads=True
+    )
+
+def _md5(file_path) -> str:
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+def is_unchanged(s3, file_path, key, digest) -> bool:
+    """HEAD the object and compare its stored checksum with the local file"""
+    from botocore.exceptions import ClientError
+
+    try:
+        head = s3.head_object(Bucket=bucket_name, Key=key)
+    except ClientError:
+        return False
+
+    if head.get('Metadata', {}).get('sha256'):
+        return head['Metadata']['sha256'] == digest
+
+    # Objects uploaded without metadata: single-part ETags are the MD5
+    etag = head.get('ETag', '').strip('"')
+    return head.get('ContentLength') == Path(file_path).stat().st_size and '-' not in etag and etag == _md5(file_path)
+
+def upload(file_path, key, sweep: bool = True) -> bool:
+    """Upload one file; returns False if the identical object was already there.
+
+    Stale objects next to the key are deleted first, as before; upload_many
+    sweeps once for all its keys and turns this off.
+    """
+    s3 = client()
+    if sweep:
+        delete_old_files(s3, bucket_name, key.rsplit('/', 1)[0], keep={key})
+
+    digest = utils.file_digest(file_path)
+    if is_unchanged(s3, file_path, key, digest):
+        logging.info(f"Unchanged, skipping upload: {key}")
+        return False
+
+    s3.upload_file(
+        str(file_path), bucket_name, key,
+        ExtraArgs={
+            'Metadata': {'sha256': digest},
+            'ContentType': 'application/vnd.android.package-archive'
+        },
+        Config=transfer_config()
+    )
 
     logging.info(f"Upload success: {key}")
+    return True
+
+def upload_many(items: list[tuple[str, str]], dry_run_cleanup: bool = False) -> dict[str, bool]:
+    """Upload (file_path, key) pairs concurrently, e.g. every arch of a run.
+
+    Stale objects next to the new keys are swept once beforehand; the keys
+    being uploaded are kept so unchanged files can still be skipped.
+    """
+    keys = [key for _, key in items]
+    cleanup([key.rsplit('/', 1)[0] for key in keys], keep=set(keys), dry_run=dry_run_cleanup)
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+        futures = {key: pool.submit(upload, file_path, key, sweep=False) for file_path, key in items}
+    return {key: future.result() for key, future in futures.items()}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Delete stale objects from the R2 bucket")
+    parser.add_argument("prefixes", nargs="+")
+    parser.add_argument("--threshold-minutes", type=int, default=60)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    args = parser.parse_args()
+
+    cleanup(args.prefixes, args.threshold_minutes, dry_run=args.dry_run)
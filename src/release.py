@@ -1,8 +1,20 @@
 import re
-import json
+import time
+import logging
 from sys import exit
 from pathlib import Path
-from src import repository, gh
+from concurrent.futures import ThreadPoolExecutor
+from src import repository, gh, delta
+from src.version import version_key
+
+UPLOAD_ATTEMPTS = 3
+UPLOAD_WORKERS = 4
+
+CONTENT_TYPES = {
+    ".apk": 'application/vnd.android.package-archive',
+    ".zst": 'application/zstd',
+    ".json": 'application/json',
+}
 
 def convert_title(text):
     if not text or not isinstance(text, str):
@@ -22,51 +34,8 @@ def extract_version(file_path):
     match = re.search(r'(\d+\.\d+\.\d+(-[a-z]+\.\d+)?(-release\d*)?)', base_name)
     return match.group(1) if match else 'unknown'
 
-def create_github_release(name, patches_name, cli_name, apk_file_path):
-    patchver = extract_version(patches_name)
-    cliver = extract_version(cli_name)
-    tag_name = f"{name}-v{patchver}"
-
-    apk_path = Path(apk_file_path)
-    if not apk_path.exists():
-        exit(1)
-
-    repo = gh.get_repo(repository)
-
-    # Step 1: Check for existing release with the exact tag name
-    try:
-        existing_release = repo.get_release(tag_name)
-    except:
-        existing_release = None
-
-    # Step 2: Delete existing assets if same APK already uploaded
-    if existing_release:
-        for asset in existing_release.get_assets():
-            if asset.name == apk_path.name:
-                asset.delete_asset()
-
-    # Step 3: Delete old releases with the same base name and matching version suffix
-    releases = list(repo.get_releases())
-
-    suffix_match = re.search(r'(-[a-z]+\.\d+)$', patchver)
-    current_suffix = suffix_match.group(1) if suffix_match else ''
-
-    for release in releases:
-        release_tag = release.tag_name
-        if release_tag.startswith(f"{name}-v") and release_tag != tag_name:
-            old_version = release_tag[len(name) + 2:]
-            old_suffix_match = re.search(r'(-[a-z]+\.\d+)$', old_version)
-            old_suffix = old_suffix_match.group(1) if old_suffix_match else ''
-
-            if old_suffix == current_suffix:
-                old_numeric = re.sub(r'(-[a-z]+\.\d+)?(-release\d*)?$', '', old_version)
-                current_numeric = re.sub(r'(-[a-z]+\.\d+)?(-release\d*)?$', '', patchver)
-                if old_numeric < current_numeric:
-                    release.delete_release()
-
-    # Step 4: Create new release if it doesn't exist
-    if not existing_release:
-        release_body = f"""\
+def release_body(patchver, cliver):
+    return f"""\
 # Release Notes
 
 ## Build Tools:
@@ -74,21 +43,132 @@ def create_github_release(name, patches_name, cli_name, apk_file_path):
 - **ReVanced CLI:** v{cliver}
 
 ## Note:
-**ReVanced GmsCore** is **necessary** to work. 
+**ReVanced GmsCore** is **necessary** to work.
 - Please **download** it from [HERE](https://github.com/revanced/gmscore/releases/latest).
 """
-        release_name = f"{convert_title(name)} v{patchver}"
-        existing_release = repo.create_git_release(
+
+def index_releases(releases) -> dict[str, list]:
+    """Group releases by tag prefix: "{name}-v{version}" -> name"""
+    index = {}
+    for release in releases:
+        match = re.match(r'^(.*)-v(\d.*)$', release.tag_name)
+        if match:
+            index.setdefault(match.group(1), []).append(release)
+    return index
+
+def _is_outdated(old_version, current_version):
+    suffix_match = re.search(r'(-[a-z]+\.\d+)$', current_version)
+    current_suffix = suffix_match.group(1) if suffix_match else ''
+    old_suffix_match = re.search(r'(-[a-z]+\.\d+)$', old_version)
+    old_suffix = old_suffix_match.group(1) if old_suffix_match else ''
+
+    if old_suffix != current_suffix:
+        return False
+    old_numeric = re.sub(r'(-[a-z]+\.\d+)?(-release\d*)?$', '', old_version)
+    current_numeric = re.sub(r'(-[a-z]+\.\d+)?(-release\d*)?$', '', current_version)
+    return version_key(old_numeric) < version_key(current_numeric)
+
+def plan_publish(index: dict[str, list], artifacts: list[dict]) -> dict:
+    """Work out every deletion, creation and upload from one release listing.
+
+    Each artifact is a dict with name, patches_name, cli_name and
+    apk_file_path, as create_github_release takes them.
+    """
+    plan = {"delete_releases": [], "delete_assets": [], "create": {}, "upload": []}
+    existing = {release.tag_name: release for releases in index.values() for release in releases}
+
+    for artifact in artifacts:
+        name = artifact["name"]
+        patchver = extract_version(artifact["patches_name"])
+        tag_name = f"{name}-v{patchver}"
+        apk_path = Path(artifact["apk_file_path"])
+
+        # A delta against the previous build travels with its APK
+        files = [apk_path, *delta.sidecars(apk_path)]
+        names = {path.name for path in files}
+
+        # Replace assets of the same name in the existing release
+        release = existing.get(tag_name)
+        if release:
+            plan["delete_assets"].extend(a for a in release.assets if a.name in names)
+        elif tag_name not in plan["create"]:
+            plan["create"][tag_name] = {
+                "name": f"{convert_title(name)} v{patchver}",
+                "message": release_body(patchver, extract_version(artifact["cli_name"])),
+            }
+
+        # Drop older releases with the same base name and version suffix
+        for old in index.get(name, []):
+            if old.tag_name != tag_name and _is_outdated(old.tag_name[len(name) + 2:], patchver):
+                if old not in plan["delete_releases"]:
+                    plan["delete_releases"].append(old)
+
+        plan["upload"].extend((tag_name, path) for path in files)
+
+    return plan
+
+def _upload(release, apk_path: Path):
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            release.upload_asset(
+                path=str(apk_path),
+                label=apk_path.name,
+                content_type=CONTENT_TYPES.get(apk_path.suffix, 'application/octet-stream')
+            )
+            logging.info(f"Uploaded {apk_path.name} to {release.tag_name}")
+            return
+        except Exception as e:
+            if attempt == UPLOAD_ATTEMPTS:
+                raise
+            logging.warning(f"Upload of {apk_path.name} failed ({e}), retrying...")
+            # A failed upload can leave a half-created asset behind
+            for asset in release.get_assets():
+                if asset.name == apk_path.name:
+                    asset.delete_asset()
+            time.sleep(2 ** attempt)
+
+def publish(artifacts: list[dict], repo=None) -> dict:
+    """List releases once, apply the plan, then upload all APKs concurrently"""
+    for artifact in artifacts:
+        if not Path(artifact["apk_file_path"]).exists():
+            logging.error(f"APK not found: {artifact['apk_file_path']}")
+            exit(1)
+
+    repo = repo or gh.get_repo(repository)
+    index = index_releases(repo.get_releases())
+    plan = plan_publish(index, artifacts)
+
+    for release in plan["delete_releases"]:
+        logging.info(f"Deleting outdated release {release.tag_name}")
+        release.delete_release()
+    for asset in plan["delete_assets"]:
+        asset.delete_asset()
+
+    releases = {release.tag_name: release for group in index.values() for release in group}
+    for tag_name, fields in plan["create"].items():
+        releases[tag_name] = repo.create_git_release(
             tag=tag_name,
-            name=release_name,
-            message=release_body,
+            name=fields["name"],
+            message=fields["message"],
             draft=False,
             prerelease=False
         )
 
-    # Step 5: Upload APK
-    existing_release.upload_asset(
-        path=str(apk_path),
-        label=apk_path.name,
-        content_type='application/vnd.android.package-archive'
-    )
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        futures = [pool.submit(_upload, releases[tag_name], apk_path) for tag_name, apk_path in plan["upload"]]
+    for future in futures:
+        future.result()
+
+    # Only what actually reached the release is a valid base for the next delta
+    for artifact in artifacts:
+        delta.promote(Path(artifact["apk_file_path"]))
+
+    return plan
+
+def create_github_release(name, patches_name, cli_name, apk_file_path):
+    publish([{
+        "name": name,
+        "patches_name": patches_name,
+        "cli_name": cli_name,
+        "apk_file_path": apk_file_path,
+    }])
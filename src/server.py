@@ -0,0 +1,171 @@
+import json
+import time
+import logging
+import itertools
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src import catalog, trace, github_api, downloader, patcher
+
+STATES = ("queued", "running", "done", "failed")
+
+# Finished jobs kept for /jobs; older ones are dropped
+KEEP_JOBS = 100
+
+class Jobs:
+    """Build jobs run on a worker pool inside one long-lived process.
+
+    The HTTP session, tool and APK caches, catalog and probe results stay
+    warm between jobs; the catalog is reloaded only when a config changes.
+    Release lookups and version listings are read again for every job.
+    Each job's spans go to its own trace export and into the running totals
+    of /metrics, so neither they nor the job history grow without bound.
+    """
+
+    def __init__(self, build: Callable, workers: int = 1):
+        self.build = build
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.jobs: dict[str, dict] = {}
+        self.ids = itertools.count(1)
+        self.span_totals: dict[str, dict[str, float]] = {}
+        self.job_seconds = 0.0
+
+    def submit(self, app_name: str, source: str, arches: list[str] = None) -> dict:
+        catalog.refresh()
+        try:
+            catalog.source(source)
+        except FileNotFoundError:
+            raise ValueError(f"Unknown source {source!r}")
+        if app_name not in catalog.apps():
+            raise ValueError(f"Unknown app {app_name!r}")
+        unknown = [arch for arch in arches or [] if arch not in catalog.ARCHES]
+        if unknown:
+            raise ValueError(f"Unknown arch {', '.join(unknown)}")
+
+        with self.lock:
+            job = {
+                "id": str(next(self.ids)),
+                "app": app_name,
+                "source": source,
+                "arches": arches,
+                "state": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "built": [],
+                "failed": [],
+                "error": None,
+            }
+            self.jobs[job["id"]] = job
+            self._prune()
+        self.pool.submit(self._run, job)
+        logging.info(f"📥 Job {job['id']}: {app_name} ({source})")
+        return dict(job)
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs beyond KEEP_JOBS; call with the lock held"""
+        excess = len(self.jobs) - KEEP_JOBS
+        if excess > 0:
+            finished = [job_id for job_id, job in self.jobs.items() if job["finished"]]
+            for job_id in finished[:excess]:
+                del self.jobs[job_id]
+
+    def _run(self, job: dict) -> None:
+        with self.lock:
+            job.update(state="running", started=time.time())
+        github_api.reset()
+        downloader.reset()
+        patcher.reset()
+        with trace.collect() as records:
+            try:
+                built, failed = self.build(job["app"], job["source"], job["arches"])
+                result = {"built": [str(apk) for _, apk in built], "failed": failed}
+                state = "failed" if failed or not built else "done"
+            except Exception as e:
+                logging.error(f"❌ Job {job['id']} failed: {e}")
+                result, state = {"error": str(e)}, "failed"
+        try:
+            trace.export(f"{job['app']}-{job['source']}", records, app=job["app"], source=job["source"], job=job["id"])
+        except OSError as e:
+            logging.warning(f"Could not write the trace of job {job['id']}: {e}")
+        with self.lock:
+            trace.summarize(records, self.span_totals)
+            job.update(result, state=state, finished=time.time())
+            self.job_seconds += job["finished"] - job["started"]
+            self._prune()
+        logging.info(f"📤 Job {job['id']}: {state}")
+
+    def get(self, job_id: str) -> dict | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def all(self) -> list[dict]:
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def metrics(self) -> str:
+        """Job counts and durations, followed by the span totals of every build"""
+        jobs = self.all()
+        with self.lock:
+            seconds = self.job_seconds
+            totals = {name: dict(total) for name, total in self.span_totals.items()}
+        lines = [
+            "# HELP autobuild_jobs Build jobs by state",
+            "# TYPE autobuild_jobs gauge",
+            *(f'autobuild_jobs{{state="{state}"}} {sum(job["state"] == state for job in jobs)}' for state in STATES),
+            "# HELP autobuild_job_seconds_total Wall time of finished jobs",
+            "# TYPE autobuild_job_seconds_total counter",
+            f"autobuild_job_seconds_total {seconds:g}",
+        ]
+        return "\n".join(lines) + "\n" + trace.prometheus([], {}, totals)
+
+class Handler(BaseHTTPRequestHandler):
+    jobs: Jobs = None
+
+    def log_message(self, format, *args):
+        logging.debug(f"serve: {format % args}")
+
+    def _send(self, status: int, body, content_type: str = "application/json"):
+        data = body.encode() if isinstance(body, str) else json.dumps(body, indent=2).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/metrics":
+            return self._send(200, self.jobs.metrics(), "text/plain; version=0.0.4")
+        if path == "/jobs":
+            return self._send(200, self.jobs.all())
+        if path.startswith("/jobs/"):
+            job = self.jobs.get(path.removeprefix("/jobs/"))
+            return self._send(200, job) if job else self._send(404, {"error": "no such job"})
+        if path in ("", "/health"):
+            return self._send(200, {"ok": True})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            arches = request.get("arches")
+            if isinstance(arches, str):
+                arches = arches.split(",")
+            job = self.jobs.submit(request["app"], request["source"], arches)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._send(400, {"error": f"bad job: {e}"})
+        self._send(202, job)
+
+def serve(build: Callable, port: int = 8767, workers: int = 1) -> ThreadingHTTPServer:
+    """Start the job server on localhost in a background thread; returns the server"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    Handler.jobs = Jobs(build, workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"🛰️ Accepting build jobs on http://127.0.0.1:{server.server_address[1]} ({workers} workers)")
+    return server
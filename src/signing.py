@@ -0,0 +1,93 @@
+import os
+import re
+import logging
+import contextvars
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from src import utils, trace
+
+KEYSTORE = Path("keystore/public.jks")
+KEY_ALIAS = "public"
+KEY_PASSWORD = "public"
+
+# Patched APKs wait under this suffix until the signing stage picks them up
+UNSIGNED_SUFFIX = ".unsigned"
+
+# Used when the manifest has no numeric minSdkVersion
+DEFAULT_MIN_SDK = "21"
+
+class SigningSession:
+    """Signs and verifies every APK of a run with one keystore.
+
+    apksigner, aapt2 and the key arguments are resolved once; each APK gets
+    its min SDK from its own manifest up front, so signing never has to be
+    retried, and is verified right after it is signed.
+    """
+
+    def __init__(self, keystore: Path = KEYSTORE, alias: str = KEY_ALIAS, password: str = KEY_PASSWORD, workers: int = None):
+        self.apksigner = utils.find_apksigner()
+        if not self.apksigner:
+            raise RuntimeError("apksigner not found")
+        if not Path(keystore).is_file():
+            raise FileNotFoundError(f"Keystore not found: {keystore}")
+        self.aapt2 = utils.find_build_tool("aapt2")
+        self.key_args = [
+            "--ks", str(keystore),
+            "--ks-pass", f"pass:{password}",
+            "--key-pass", f"pass:{password}",
+            "--ks-key-alias", alias,
+        ]
+        self.workers = workers or os.cpu_count() or 1
+
+    def min_sdk(self, apk: Path) -> str:
+        """minSdkVersion from the APK's manifest, via aapt2 dump badging"""
+        if self.aapt2:
+            output = utils.run_process([self.aapt2, "dump", "badging", str(apk)], capture=True, silent=True, check=False)
+            match = re.search(r"^sdkVersion:'(\d+)'", output or "", re.MULTILINE)
+            if match:
+                return match.group(1)
+        logging.warning(f"No minSdkVersion found in {apk.name}, signing for API {DEFAULT_MIN_SDK}")
+        return DEFAULT_MIN_SDK
+
+    def sign(self, unsigned: Path, label: str = None) -> Path:
+        """Sign and verify one APK; "x.apk.unsigned" becomes "x.apk" """
+        signed = unsigned.with_name(unsigned.name.removesuffix(UNSIGNED_SUFFIX))
+        staging = signed.with_name(f".{signed.name}.part")
+        with trace.span(f"sign:{label or signed.name}", artifact=signed.name) as span:
+            min_sdk = self.min_sdk(unsigned)
+            span["min_sdk"] = int(min_sdk)
+            try:
+                utils.run_process([
+                    self.apksigner, "sign",
+                    "--min-sdk-version", min_sdk,
+                    *self.key_args,
+                    "--in", str(unsigned), "--out", str(staging)
+                ], silent=True)
+                utils.run_process([
+                    self.apksigner, "verify", "--min-sdk-version", min_sdk, str(staging)
+                ], silent=True)
+                os.replace(staging, signed)
+            finally:
+                staging.unlink(missing_ok=True)
+                staging.with_name(staging.name + ".idsig").unlink(missing_ok=True)
+            unsigned.unlink()
+            span["bytes"] = signed.stat().st_size
+        logging.info(f"🔏 Signed {signed.name} (min SDK {min_sdk})")
+        return signed
+
+    def sign_all(self, apks: list[tuple[str, Path]]) -> list[Path | None]:
+        """Sign (label, APK) pairs concurrently; None for each one that failed"""
+        if not apks:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(apks), self.workers), thread_name_prefix="sign") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, self.sign, apk, label) for label, apk in apks]
+
+        results = []
+        for (label, apk), future in zip(apks, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logging.error(f"❌ Signing {apk.name} failed: {e}")
+                apk.unlink(missing_ok=True)
+                results.append(None)
+        return results
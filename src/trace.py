@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from contextvars import ContextVar
+from src import output_dir
+
+# Where the Chrome trace and the Prometheus textfile of each run go
+trace_dir = output_dir / "traces"
+
+_origin = time.perf_counter()
+_spans: list[dict] = []
+_lock = threading.Lock()
+_current: ContextVar[dict | None] = ContextVar("span", default=None)
+# Where finished spans go instead of _spans, inside collect()
+_sink: ContextVar[list | None] = ContextVar("sink", default=None)
+
+@contextmanager
+def span(name: str, **args):
+    """Time a block; nested spans (also across pipeline threads) record their parent.
+
+    The yielded dict holds the span's attributes, so callers can add
+    counters such as bytes while it runs.
+    """
+    parent = _current.get()
+    record = {
+        "name": name,
+        "parent": parent["name"] if parent else None,
+        "tid": threading.get_ident(),
+        "thread": threading.current_thread().name,
+        "start": time.perf_counter(),
+        "args": args,
+    }
+    token = _current.set(record)
+    try:
+        yield record["args"]
+    except BaseException as e:
+        record["args"]["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        record["end"] = time.perf_counter()
+        sink = _sink.get()
+        with _lock:
+            (_spans if sink is None else sink).append(record)
+
+@contextmanager
+def collect():
+    """Keep the spans of a block (and the threads it hands its context to) apart.
+
+    Yields the list they are recorded in; they never reach spans().
+    """
+    records = []
+    token = _sink.set(records)
+    try:
+        yield records
+    finally:
+        _sink.reset(token)
+
+def add(key: str, value: float) -> None:
+    """Add to a counter on the innermost open span, if any"""
+    current = _current.get()
+    if current is not None:
+        current["args"][key] = current["args"].get(key, 0) + value
+
+def record_rusage(rusage) -> None:
+    """Child CPU time and peak RSS (as returned by os.wait4) on the current span"""
+    add("cpu_user_s", rusage.ru_utime)
+    add("cpu_system_s", rusage.ru_stime)
+    current = _current.get()
+    if current is not None:
+        # ru_maxrss is in KiB on Linux
+        current["args"]["max_rss_bytes"] = max(current["args"].get("max_rss_bytes", 0), rusage.ru_maxrss * 1024)
+
+def spans() -> list[dict]:
+    with _lock:
+        return list(_spans)
+
+def chrome_trace(records: list[dict]) -> dict:
+    """Spans as complete ("X") events for chrome://tracing or Perfetto"""
+    pid = os.getpid()
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}}
+        for tid, thread in {r["tid"]: r["thread"] for r in records}.items()
+    ]
+    for r in sorted(records, key=lambda r: r["start"]):
+        events.append({
+            "name": r["name"],
+            "ph": "X",
+            "pid": pid,
+            "tid": r["tid"],
+            "ts": round((r["start"] - _origin) * 1e6),
+            "dur": round((r["end"] - r["start"]) * 1e6),
+            "args": {**r["args"], "parent": r["parent"]},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def summarize(records: list[dict], totals: dict[str, dict[str, float]] = None) -> dict[str, dict[str, float]]:
+    """Per-span-name totals of some spans, added to `totals` if given"""
+    totals = {} if totals is None else totals
+    for r in records:
+        total = totals.setdefault(r["name"], {"count": 0, "seconds": 0.0, "bytes": 0, "cpu": 0.0, "rss": 0, "errors": 0})
+        total["count"] += 1
+        total["seconds"] += r["end"] - r["start"]
+        total["bytes"] += r["args"].get("bytes", 0)
+        total["cpu"] += r["args"].get("cpu_user_s", 0) + r["args"].get("cpu_system_s", 0)
+        total["rss"] = max(total["rss"], r["args"].get("max_rss_bytes", 0))
+        total["errors"] += "error" in r["args"]
+    return totals
+
+def prometheus(records: list[dict], labels: dict[str, str], totals: dict[str, dict[str, float]] = None) -> str:
+    """Per-span-name totals in the node_exporter textfile format.
+
+    Sums `records`, or renders `totals` from summarize() when given.
+    """
+    totals = summarize(records) if totals is None else totals
+    metrics = [
+        ("autobuild_span_count", "counter", "Spans recorded", "count"),
+        ("autobuild_span_seconds_total", "counter", "Wall time spent in spans", "seconds"),
+        ("autobuild_span_bytes_total", "counter", "Bytes transferred inside spans", "bytes"),
+        ("autobuild_span_cpu_seconds_total", "counter", "Child process CPU time inside spans", "cpu"),
+        ("autobuild_span_max_rss_bytes", "gauge", "Peak child process RSS inside spans", "rss"),
+        ("autobuild_span_errors_total", "counter", "Spans that raised", "errors"),
+    ]
+    common = ",".join(f'{key}="{_label(value)}"' for key, value in labels.items())
+    lines = []
+    for metric, kind, help_text, field in metrics:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, total in sorted(totals.items()):
+            lines.append(f'{metric}{{{common}{"," if common else ""}span="{_label(name)}"}} {total[field]:g}')
+    return "\n".join(lines) + "\n"
+
+def _write(path: Path, text: str) -> None:
+    with tempfile.NamedTemporaryFile("w", dir=path.parent, suffix=".part", delete=False) as f:
+        f.write(text)
+    Path(f.name).replace(path)
+
+def export(label: str, records: list[dict] = None, **labels) -> tuple[Path, Path]:
+    """Write trace-{label}.json and metrics-{label}.prom for this run (or these spans)"""
+    records = spans() if records is None else records
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    trace_path = trace_dir / f"trace-{label}.json"
+    metrics_path = trace_dir / f"metrics-{label}.prom"
+    _write(trace_path, json.dumps(chrome_trace(records)))
+    _write(metrics_path, prometheus(records, {"run": label, **labels}))
+    logging.info(f"📈 Trace: {trace_path} ({len(records)} spans), metrics: {metrics_path}")
+    return trace_path, metrics_path
@@ -1,7 +1,11 @@
 import logging 
 from src import session 
+from src.version import version_key, highest, sort
 from bs4 import BeautifulSoup
 
+# Version pages read at most when looking for an older version
+INDEX_PAGES = 5
+
 def get_latest_version(app_name: str, config: dict) -> str:
     # Generate all possible Uptodown names
     possible_names = generate_possible_uptodown_names(config)
@@ -20,7 +24,7 @@ def get_latest_version(app_name: str, config: dict) -> str:
                 versions = [span.text for span in version_spans]
                 
                 if versions:
-                    highest_version = max(versions)
+                    highest_version = highest(versions)
                     logging.info(f"Found version {highest_version} for {app_name}")
                     return highest_version
             elif response.status_code == 404:
@@ -34,6 +38,32 @@ def get_latest_version(app_name: str, config: dict) -> str:
     
     raise Exception(f"Could not find Uptodown page for {app_name}")
 
+def get_versions(app_name: str, config: dict, oldest: str = None) -> list[str]:
+    """Versions on the first Uptodown page that matches, paging back until `oldest`"""
+    for uptodown_name in generate_possible_uptodown_names(config):
+        base_url = f"https://{uptodown_name}.en.uptodown.com/android"
+        try:
+            response = session.get(f"{base_url}/versions")
+            if response.status_code != 200:
+                continue
+            soup = BeautifulSoup(response.content, "html.parser")
+            data_code = soup.find('h1', id='detail-app-name')['data-code']
+        except Exception as e:
+            logging.debug(f"Pattern {uptodown_name} failed: {str(e)[:50]}...")
+            continue
+
+        versions = set()
+        for page in range(1, INDEX_PAGES + 1):
+            response = session.get(f"{base_url}/apps/{data_code}/versions/{page}")
+            response.raise_for_status()
+            version_data = response.json().get('data', [])
+            versions.update(entry["version"] for entry in version_data)
+            if not version_data or not oldest or min(version_key(entry["version"]) for entry in version_data) <= version_key(oldest):
+                break
+        return sort(versions, reverse=True)
+
+    raise Exception(f"Could not find Uptodown page for {app_name}")
+
 def get_download_link(version: str, app_name: str, config: dict) -> str:
     # Generate all possible Uptodown names
     possible_names = generate_possible_uptodown_names(config)
@@ -83,7 +113,7 @@ def get_download_link(version: str, app_name: str, config: dict) -> str:
                             download_url = button['data-url']
                             return f"https://dw.uptodown.com/dwn/{download_url}"
                 
-                if all(entry["version"] < version for entry in version_data):
+                if all(version_key(entry["version"]) < version_key(version) for entry in version_data):
                     break
                 page += 1
         except Exception as e:
@@ -1,8 +1,19 @@
-import re
+import os
+import sys
+import time
+import codecs
+import hashlib
 import logging
+import zipfile
+import threading
 from typing import List, Optional
-from src import gh
-from sys import exit
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler
+from src import github_api, trace
+from src.version import version_key, highest
 import subprocess
 from pathlib import Path
 from urllib.parse import urlparse, unquote, parse_qs
@@ -82,7 +93,8 @@ def find_file(files: list[Path], prefix: str = None, suffix: str = None, contain
     
     return None
 
-def find_apksigner() -> str | None:
+def find_build_tool(name: str) -> str | None:
+    """Newest Android SDK build-tools binary with this name"""
     sdk_root = Path("/usr/local/lib/android/sdk")
     build_tools_dir = sdk_root / "build-tools"
 
@@ -90,15 +102,203 @@ def find_apksigner() -> str | None:
         logging.error(f"No build-tools found at: {build_tools_dir}")
         return None
 
-    versions = sorted(build_tools_dir.iterdir(), reverse=True)
+    versions = sorted(build_tools_dir.iterdir(), key=lambda d: version_key(d.name), reverse=True)
     for version_dir in versions:
-        apksigner_path = version_dir / "apksigner"
-        if apksigner_path.exists() and apksigner_path.is_file():
-            return str(apksigner_path)
+        tool_path = version_dir / name
+        if tool_path.exists() and tool_path.is_file():
+            return str(tool_path)
 
-    logging.error("No apksigner found in build-tools")
+    logging.error(f"No {name} found in build-tools")
     return None
 
+def find_apksigner() -> str | None:
+    return find_build_tool("apksigner")
+
+def apk_package(apk: Path | str) -> str | None:
+    """Package name of a built APK (patches may rename it), via aapt2"""
+    aapt2 = find_build_tool("aapt2")
+    if not aapt2:
+        return None
+    try:
+        output = run_process([aapt2, "dump", "packagename", str(apk)], capture=True, silent=True)
+    except subprocess.CalledProcessError as e:
+        logging.warning(f"Could not read package name of {Path(apk).name}: {e}")
+        return None
+    return output.splitlines()[-1].strip() if output else None
+
+@dataclass
+class ProcessResult:
+    """Outcome of run_command: exit code, output tail and child resource usage"""
+    command: list[str] | str
+    returncode: int
+    output: str | None = None
+    tail: list[str] = field(default_factory=list)
+    duration: float = 0.0
+    cpu_user: float = 0.0
+    cpu_system: float = 0.0
+    max_rss: int = 0
+    log: Path | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+# Output handling for child processes
+READ_BLOCK = 1 << 16
+TAIL_LINES = 200
+LOG_MAX_BYTES = int(os.getenv("PROCESS_LOG_MAX_BYTES", str(20 << 20)))
+LOG_BACKUPS = 3
+# Console echo limit in lines per second (0 = echo everything)
+ECHO_RATE = float(os.getenv("ECHO_LINES_PER_SEC", "0"))
+
+_process_log: ContextVar[Path | None] = ContextVar("process_log", default=None)
+_log_handlers: dict[Path, RotatingFileHandler] = {}
+_log_lock = threading.Lock()
+
+@contextmanager
+def process_log(path: Path):
+    """Copy the output of every command run inside the block to a rotating log"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    token = _process_log.set(path)
+    try:
+        yield path
+    finally:
+        _process_log.reset(token)
+        with _log_lock:
+            handler = _log_handlers.pop(path, None)
+        if handler:
+            handler.close()
+
+def _log_handler(path: Path) -> RotatingFileHandler:
+    with _log_lock:
+        if path not in _log_handlers:
+            handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+            handler.terminator = ""
+            _log_handlers[path] = handler
+        return _log_handlers[path]
+
+class _Echo:
+    """Print output lines, at most ECHO_RATE per second when a limit is set.
+
+    A token bucket refilled at the (possibly fractional) rate and holding
+    at most one second's worth, or one line, decides what is printed.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.suppressed = 0
+
+    def write(self, lines: list[str]) -> None:
+        if not self.rate:
+            sys.stdout.write("".join(f"{line}\n" for line in lines))
+            sys.stdout.flush()
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + self.rate * (now - self.last))
+        self.last = now
+        allowed = min(len(lines), int(self.tokens))
+        if allowed:
+            self.close()
+            sys.stdout.write("".join(f"{line}\n" for line in lines[:allowed]))
+            sys.stdout.flush()
+        self.tokens -= allowed
+        self.suppressed += len(lines) - allowed
+
+    def close(self) -> None:
+        if self.suppressed:
+            print(f"  … {self.suppressed} lines not shown (see the build log)", flush=True)
+            self.suppressed = 0
+
+def _program(command: List[str] | str) -> str:
+    return Path(command.split()[0] if isinstance(command, str) else str(command[0])).name
+
+def run_command(
+    command: List[str] | str,
+    cwd: Optional[Path] = None,
+    capture: bool = False,
+    silent: bool = False,
+    shell: bool = False
+) -> ProcessResult:
+    """Run a command without ever exiting the interpreter.
+
+    Output is read in large binary blocks on a reader thread, decoded once,
+    copied to the current process_log and echoed unless silent. Only the
+    last TAIL_LINES lines are kept in memory unless capture is set.
+    """
+    program = _program(command)
+    log_path = _process_log.get()
+    with trace.span(f"exec:{program}", argv=" ".join(map(str, command[:3])) if not shell else command[:80]):
+        started = time.monotonic()
+        try:
+            process = subprocess.Popen(
+                command,
+                cwd=str(cwd) if cwd else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                shell=shell
+            )
+        except OSError as e:
+            print(f"Command not found: {program}", flush=True)
+            return ProcessResult(command, 127, tail=[str(e)], log=log_path)
+
+        tail = deque(maxlen=TAIL_LINES)
+        captured = []
+        handler = _log_handler(log_path) if log_path else None
+        echo = None if silent else _Echo(ECHO_RATE)
+
+        def read():
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            pending = ""
+            while True:
+                block = process.stdout.read1(READ_BLOCK)
+                text = decoder.decode(block, final=not block)
+                if text:
+                    if capture:
+                        captured.append(text)
+                    if handler:
+                        handler.handle(logging.makeLogRecord({"msg": text}))
+                    lines = (pending + text).split("\n")
+                    pending = lines.pop()
+                    tail.extend(lines)
+                    if echo:
+                        echo.write(lines)
+                if not block:
+                    break
+            if pending:
+                tail.append(pending)
+                if echo:
+                    echo.write([pending])
+            if echo:
+                echo.close()
+
+        reader = threading.Thread(target=read, name="process-output", daemon=True)
+        reader.start()
+
+        # wait4 also reports the child's CPU time and peak RSS; the reader
+        # keeps draining the pipe meanwhile so the child never blocks on it
+        _, status, rusage = os.wait4(process.pid, 0)
+        reader.join()
+        process.stdout.close()
+        returncode = process.returncode = os.waitstatus_to_exitcode(status)
+        trace.record_rusage(rusage)
+        trace.add("exit_code", returncode)
+
+    return ProcessResult(
+        command,
+        returncode,
+        output="".join(captured).strip() if capture else None,
+        tail=list(tail),
+        duration=time.monotonic() - started,
+        cpu_user=rusage.ru_utime,
+        cpu_system=rusage.ru_stime,
+        # ru_maxrss is in KiB on Linux
+        max_rss=rusage.ru_maxrss * 1024,
+        log=log_path,
+    )
+
 def run_process(
     command: List[str],
     cwd: Optional[Path] = None,
@@ -108,58 +308,41 @@ def run_process(
     check: bool = True,
     shell: bool = False
 ) -> Optional[str]:
-    process = subprocess.Popen(
-        command,
-        cwd=str(cwd) if cwd else None,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        shell=shell
-    )
-
-    output_lines = []
-
-    try:
-        for line in iter(process.stdout.readline, ''):
-            if line:
-                if not silent:
-                    print(line.rstrip(), flush=True)
-                if capture:
-                    output_lines.append(line)
-        process.stdout.close()
-        return_code = process.wait()
+    result = run_command(command, cwd=cwd, capture=capture, silent=silent, shell=shell)
 
-        if check and return_code != 0:
-            raise subprocess.CalledProcessError(return_code, command)
+    if check and not result.ok:
+        if silent and result.tail:
+            logging.error(f"❌ {_program(command)} exited with {result.returncode}, last lines:")
+            for line in result.tail[-40:]:
+                logging.error(f"  {line}")
+        raise subprocess.CalledProcessError(result.returncode, command, output="\n".join(result.tail))
 
-        return ''.join(output_lines).strip() if capture else None
+    return result.output
 
-    except FileNotFoundError:
-        print(f"Command not found: {command[0]}", flush=True)
-        exit(1)
-    except Exception as e:
-        print(f"Error while running command: {e}", flush=True)
-        exit(1)
-
-def normalize_version(version: str) -> list[int]:
-    parts = version.split('.')
-    normalized = []
-    for part in parts:
-        match = re.match(r'(\d+)', part)
-        if match:
-            normalized.append(int(match.group(1)))
-        else:
-            normalized.append(0)
-    return normalized
+def is_broken_zip(path: Path) -> bool:
+    """Read-only integrity check (central directory and CRCs)"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return archive.testzip() is not None
+    except (zipfile.BadZipFile, OSError, EOFError):
+        return True
+
+_digests: dict[tuple, str] = {}
+
+def file_digest(path: Path | str) -> str:
+    """SHA-256 of a file, memoized on path, size and mtime"""
+    stat = Path(path).stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        _digests[key] = sha.hexdigest()
+    return _digests[key]
 
 def get_highest_version(versions: list[str]) -> str | None:
-    if not versions:
-        return None
-    highest_version = versions[0]
-    for v in versions[1:]:
-        if normalize_version(v) > normalize_version(highest_version):
-            highest_version = v
-    return highest_version
+    return highest(versions)
 
 def get_supported_version(package_name: str, cli: str, patches: str) -> Optional[str]:
     output = run_process([
@@ -212,42 +395,15 @@ def extract_filename(response, fallback_url=None) -> str:
     return unquote(Path(path).name)
 
 def detect_github_release(user: str, repo: str, tag: str) -> dict:
-    repo_obj = gh.get_repo(f"{user}/{repo}")
-
-    if tag == "latest":
-        release = repo_obj.get_latest_release()
-        logging.info(f"Fetched latest release: {release.tag_name}")
-        return release.raw_data
-
-    if tag in ["", "dev", "prerelease"]:
-        releases = list(repo_obj.get_releases())
-        if not releases:
-            raise ValueError(f"No releases found for {user}/{repo}")
-
-        if tag == "":
-            release = max(releases, key=lambda x: x.created_at)
-        elif tag == "dev":
-            devs = [r for r in releases if 'dev' in r.tag_name.lower()]
-            if not devs:
-                raise ValueError(f"No dev release found for {user}/{repo}")
-            release = max(devs, key=lambda x: x.created_at)
-        else:
-            pres = [r for r in releases if r.prerelease]
-            if not pres:
-                raise ValueError(f"No prerelease found for {user}/{repo}")
-            release = max(pres, key=lambda x: x.created_at)
-
-        logging.info(f"Fetched release: {release.tag_name}")
-        return release.raw_data
-
     try:
-        release = repo_obj.get_release(tag)
-        logging.info(f"Fetched release: {release.tag_name}")
-        return release.raw_data
+        release = github_api.resolve_release(user, repo, tag)
     except Exception as e:
         logging.error(f"Error fetching release {tag} for {user}/{repo}: {e}")
         raise
 
+    logging.info(f"Fetched {'latest ' if tag == 'latest' else ''}release: {release['tag_name']}")
+    return release
+
 def detect_source_type(cli_file: Path, patches_file: Path) -> str:
     """Detect if we're using Morphe or ReVanced based on downloaded files"""
     if cli_file and "morphe" in cli_file.name.lower() and patches_file and patches_file.suffix == ".mpp":
@@ -0,0 +1,44 @@
+import re
+from functools import lru_cache
+
+# Pre-release stages sort before the final release; "release" suffixes
+# (e.g. 1.2.0-release2) are final builds with a rebuild counter
+STAGES = {"dev": 0, "alpha": 1, "beta": 2, "pre": 3, "preview": 3, "rc": 4, "release": 5}
+FINAL = 5
+
+_VERSION = re.compile(r'^\s*[vV]?(\d+(?:\.\d+)*)(.*)$')
+_STAGE = re.compile(r'(?<![a-z])(dev|alpha|beta|preview|pre|rc|release)(?![a-z])[.\-_ ]?(\d+(?:\.\d+)*)?')
+
+@lru_cache(maxsize=None)
+def version_key(version: str) -> tuple:
+    """Comparable key for a version string, parsed once and cached.
+
+    "19.16.39" < "19.16.39.1", "1.2" == "1.2.0", and
+    "5.1.0-dev.3" < "5.1.0-beta.1" < "5.1.0" < "5.1.0-release2".
+    Strings without a leading number sort below everything else.
+    """
+    match = _VERSION.match(version or "")
+    if not match:
+        return ((), -1, ())
+
+    numbers = [int(part) for part in match.group(1).split('.')]
+    while len(numbers) > 1 and numbers[-1] == 0:
+        numbers.pop()
+
+    stage = _STAGE.search(match.group(2).lower())
+    if not stage:
+        return (tuple(numbers), FINAL, ())
+    counter = tuple(int(part) for part in stage.group(2).split('.')) if stage.group(2) else ()
+    return (tuple(numbers), STAGES[stage.group(1)], counter)
+
+def is_prerelease(text: str) -> bool:
+    """Whether a version (or a title such as "App 1.2.3 beta") is a pre-release"""
+    stage = _STAGE.search((text or "").lower())
+    return bool(stage) and STAGES[stage.group(1)] < FINAL
+
+def highest(versions) -> str | None:
+    versions = [v for v in versions if v]
+    return max(versions, key=version_key) if versions else None
+
+def sort(versions, reverse: bool = False) -> list[str]:
+    return sorted(versions, key=version_key, reverse=reverse)
@@ -0,0 +1,138 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from src import cache_dir, work_root, output_dir
+from src.version import sort
+
+# Shared, read-only tool cache; builds only ever link into it
+tools_dir = cache_dir / "tools"
+
+# Full output of every command a build runs, one rotating log per build
+log_dir = output_dir / "logs"
+
+# Downloaded input APKs by package/version/arch, hardlinked into builds
+apks_dir = cache_dir / "apks"
+APK_CACHE_KEEP = int(os.getenv("APK_CACHE_KEEP", "2"))
+
+@contextmanager
+def build_dir(label: str):
+    """Private scratch directory for one build, removed afterwards.
+
+    Set WORK_DIR to put it somewhere else (a tmpfs mount such as /dev/shm
+    keeps the APK shuffling off disk), KEEP_WORKDIR=1 to keep it around.
+    """
+    if work_root:
+        Path(work_root).mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{label}-", dir=work_root))
+    logging.info(f"📁 Work directory: {path}")
+    try:
+        yield path
+    finally:
+        if os.getenv("KEEP_WORKDIR"):
+            logging.info(f"Keeping work directory {path}")
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+def usage(path: Path) -> int:
+    """Bytes held by files under path (links into the tool cache count as links)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+@contextmanager
+def track_usage(path: Path, interval: float = 1.0):
+    """Sample scratch usage in the background and report the peak"""
+    stats = {"peak": 0}
+    stop = threading.Event()
+
+    def sample():
+        while True:
+            stats["peak"] = max(stats["peak"], usage(path))
+            if stop.wait(interval):
+                break
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        yield stats
+    finally:
+        stop.set()
+        sampler.join()
+        logging.info(f"📊 Peak scratch usage: {stats['peak'] / (1 << 20):.1f} MiB in {path}")
+
+def link(shared: Path, workdir: Path) -> Path:
+    """Expose a cached file inside a work directory without copying it"""
+    target = workdir / shared.name
+    if not target.exists():
+        target.symlink_to(shared.resolve())
+    return target
+
+def hardlink(source: Path, target: Path) -> Path:
+    """Share a file's data under a second name, copying across filesystems"""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+    return target
+
+def is_shared(path: Path) -> bool:
+    """Whether other names point at this file, so it must not be edited in place"""
+    return path.stat().st_nlink > 1
+
+def cached_apk(package: str, version: str, arch: str = "universal") -> Path | None:
+    directory = apks_dir / package / version / arch
+    if directory.is_dir():
+        for f in directory.iterdir():
+            if not f.name.endswith(".part"):
+                return f
+    return None
+
+def cached_versions(package: str, arch: str = "universal") -> list[str]:
+    """Versions with a cached APK, oldest first"""
+    if not (apks_dir / package).is_dir():
+        return []
+    return sort(v.name for v in (apks_dir / package).iterdir() if cached_apk(package, v.name, arch))
+
+def cache_apk(path: Path, package: str, version: str, arch: str = "universal") -> Path:
+    """Keep a downloaded APK for reruns; only the newest versions are kept"""
+    directory = apks_dir / package / version / arch
+    directory.mkdir(parents=True, exist_ok=True)
+    cached = directory / path.name
+    if not cached.exists():
+        staging = directory / f".{path.name}.part"
+        staging.unlink(missing_ok=True)
+        os.replace(hardlink(path, staging), cached)
+        seal(cached)
+
+    for old in cached_versions(package, arch)[:-APK_CACHE_KEEP]:
+        shutil.rmtree(apks_dir / package / old / arch, ignore_errors=True)
+    return cached
+
+def seal(path: Path) -> Path:
+    """Mark a file in the shared cache read-only"""
+    path.chmod(0o444)
+    return path
+
+def publish(path: Path, name: str = None) -> Path:
+    """Atomically move a finished artifact into the output directory"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    destination = output_dir / (name or path.name)
+    try:
+        os.replace(path, destination)
+    except OSError:
+        # Different filesystem (e.g. tmpfs work dir): stage next to the
+        # destination first so readers never see a partial file
+        staging = destination.with_name(f".{destination.name}.part")
+        shutil.copyfile(path, staging)
+        os.replace(staging, destination)
+        path.unlink(missing_ok=True)
+    return destination
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Keep caches, traces and logs of the tests out of the working tree
+_scratch = tempfile.mkdtemp(prefix="autobuild-tests-")
+os.environ.setdefault("CACHE_DIR", os.path.join(_scratch, "cache"))
+os.environ.setdefault("OUTPUT_DIR", os.path.join(_scratch, "output"))
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
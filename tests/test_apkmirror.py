@@ -0,0 +1,35 @@
+from types import SimpleNamespace
+import pytest
+from src import apkmirror
+
+RELEASE = "https://www.apkmirror.com/apk/example-inc/example/example-1-2-3-release/"
+RELEASE_PAGE = """<html><head><title>Example 1.2.3 APK Download</title></head><body>
+<div class="table-row headerFont">1.2.3 BUNDLE arm64-v8a nodpi <a class="accent_color" href="/bundle/">v</a></div>
+<div class="table-row headerFont">1.2.3 APK arm64-v8a 120-640dpi <a class="accent_color" href="/dpi/">v</a></div>
+<div class="table-row headerFont">1.2.3 APK arm64-v8a nodpi <a class="accent_color" href="/apk/">v</a></div>
+</body></html>"""
+
+class _Session:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get(self, url):
+        status, html = (200, self.pages[url]) if url in self.pages else (404, "")
+        return SimpleNamespace(status_code=status, content=html.encode(), url=url, raise_for_status=lambda: None)
+
+@pytest.fixture
+def pages(monkeypatch):
+    pages = {RELEASE: RELEASE_PAGE}
+    for variant in ("bundle", "dpi", "apk"):
+        pages[f"{apkmirror.base_url}/{variant}/"] = f'<a class="downloadButton" href="/{variant}/download/">Download</a>'
+        pages[f"{apkmirror.base_url}/{variant}/download/"] = f'<a id="download-link" href="/{variant}.apk">here</a>'
+    monkeypatch.setattr(apkmirror, "session", _Session(pages))
+
+@pytest.mark.parametrize("extra, expected", [
+    ({}, "/apk.apk"),
+    ({"type": "APK", "dpi": "120-640dpi"}, "/dpi.apk"),
+    ({"type": "BUNDLE", "dpi": ""}, "/bundle.apk"),
+])
+def test_variant_criteria(pages, extra, expected):
+    config = {"org": "example-inc", "name": "example", "package": "com.example", "arch": "arm64-v8a", **extra}
+    assert apkmirror.get_download_link("1.2.3", "example", config) == apkmirror.base_url + expected
@@ -0,0 +1,12 @@
+from src import aptoide
+
+def test_index_is_reloaded_after_list_ttl(monkeypatch, tmp_path):
+    monkeypatch.setattr(aptoide, "index_dir", tmp_path)
+    monkeypatch.setattr(aptoide, "_indexes", {})
+    config = {"package": "com.example", "arch": "universal"}
+
+    first = aptoide.index(config)
+    assert aptoide.index(config) is first
+
+    first.data["fetched"] -= aptoide.LIST_TTL + 1
+    assert aptoide.index(config) is not first
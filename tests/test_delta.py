@@ -0,0 +1,49 @@
+import os
+import shutil
+import pytest
+from src import delta
+
+@pytest.fixture(autouse=True)
+def published(monkeypatch, tmp_path):
+    monkeypatch.setattr(delta, "published_dir", tmp_path / "published")
+    return tmp_path / "published"
+
+def _apk(path, data):
+    path.write_bytes(data)
+    return path
+
+def test_staged_apk_is_not_a_base_until_promoted(tmp_path):
+    old = _apk(tmp_path / "app-v1.apk", b"one")
+    delta.stage("app", "src", "universal", old)
+    assert delta.previous("app", "src", "universal") is None
+
+    assert delta.promote(old) is True
+    assert delta.previous("app", "src", "universal").name == "app-v1.apk"
+
+def test_unpublished_build_keeps_the_published_base(tmp_path):
+    old = _apk(tmp_path / "app-v1.apk", b"one")
+    delta.stage("app", "src", "universal", old)
+    delta.promote(old)
+
+    # v2 is built but never published; v3 must still diff against v1
+    delta.stage("app", "src", "universal", _apk(tmp_path / "app-v2.apk", b"two"))
+    delta.stage("app", "src", "universal", _apk(tmp_path / "app-v3.apk", b"three"))
+    assert delta.previous("app", "src", "universal").name == "app-v1.apk"
+
+    assert delta.promote(tmp_path / "app-v2.apk") is False
+    assert delta.promote(tmp_path / "app-v3.apk") is True
+    assert delta.previous("app", "src", "universal").name == "app-v3.apk"
+
+@pytest.mark.skipif(not shutil.which("zstd"), reason="zstd not installed")
+def test_create_and_apply_round_trip(tmp_path):
+    base = _apk(tmp_path / "app-v1.apk", os.urandom(64 << 10))
+    delta.stage("app", "src", "universal", base)
+    delta.promote(base)
+
+    target = _apk(tmp_path / "app-v2.apk", base.read_bytes()[:32 << 10] + b"patched" + base.read_bytes()[32 << 10:])
+    patch = delta.create("app", "src", "universal", target)
+    assert patch is not None and patch.stat().st_size < target.stat().st_size
+    assert delta.previous("app", "src", "universal").name == "app-v1.apk"
+
+    rebuilt = delta.apply(base, patch, tmp_path / "rebuilt.apk")
+    assert rebuilt.read_bytes() == target.read_bytes()
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+import pytest
+from src import downloader, patcher, trace
+
+@pytest.mark.parametrize("supported, available, expected", [
+    # Highest supported version the store lists
+    (["20.07.39", "19.47.53"], ["20.10.1", "19.47.53", "19.16.39"], "19.47.53"),
+    # Any version: the newest listed
+    (None, ["20.10.1", "19.47.53"], "20.10.1"),
+    (None, [], None),
+    # The store could not be asked
+    (["20.07.39"], None, "20.07.39"),
+    # Newer than the oldest listed version but not listed: not hosted
+    (["20.07.39"], ["20.10.1", "19.47.53"], None),
+    # Older than everything the capped index read: tried anyway
+    (["20.07.39", "18.01.1"], ["20.10.1", "19.47.53"], "18.01.1"),
+    (["18.01.1"], ["20.10.1"], "18.01.1"),
+])
+def test_resolve_version(supported, available, expected):
+    assert downloader.resolve_version(supported, available) == expected
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    module = SimpleNamespace(
+        get_latest_version=lambda app_name, config: None,
+        get_download_link=lambda version, app_name, config: f"https://store.example/{version}.apk",
+    )
+    monkeypatch.setattr(downloader, "import_module", lambda name: module)
+    monkeypatch.setattr(downloader.workspace, "apks_dir", tmp_path / "apks")
+
+    def download_resource(url, name=None, directory=None):
+        path = (directory or tmp_path) / url.rsplit("/", 1)[1]
+        path.write_bytes(b"apk")
+        return path
+    monkeypatch.setattr(downloader, "download_resource", download_resource)
+    return module
+
+def test_pinned_version_skips_the_index(monkeypatch, store, tmp_path):
+    monkeypatch.setattr(downloader, "load_config", lambda app_name, platform: {"package": "com.example", "version": "1.2.3"})
+
+    def available_versions(*args, **kwargs):
+        raise AssertionError("a pinned version is not looked up in the index")
+    monkeypatch.setattr(downloader, "available_versions", available_versions)
+
+    path, version = downloader.download_platform("example", "uptodown", "cli.jar", "patches.rvp", directory=tmp_path)
+    assert version == "1.2.3" and path.name == "1.2.3.apk"
+
+def test_nothing_to_download_is_logged(monkeypatch, store, caplog, tmp_path):
+    monkeypatch.setattr(downloader, "load_config", lambda app_name, platform: {"package": "com.example"})
+    monkeypatch.setattr(patcher, "compatible_versions", lambda package, cli, patches: None)
+    monkeypatch.setattr(downloader, "available_versions", lambda *args, **kwargs: [])
+
+    assert downloader.download_platform("example", "uptodown", "cli.jar", "patches.rvp", directory=tmp_path) == (None, None)
+    assert "hosts none of the supported example versions" in caplog.text
+    assert "Unexpected error" not in caplog.text
+
+def test_tool_downloads_stay_in_the_callers_trace(monkeypatch, tmp_path):
+    source = [{"name": "revanced"}, {"user": "revanced", "repo": "revanced-cli", "tag": "latest"},
+              {"user": "revanced", "repo": "revanced-patches", "tag": "latest"}]
+    monkeypatch.setattr(downloader.catalog, "source", lambda name: source)
+    monkeypatch.setattr(downloader.github_api, "prefetch", lambda refs: None)
+    monkeypatch.setattr(downloader.utils, "detect_github_release", lambda user, repo, tag: {"assets": [
+        {"id": 1, "name": f"{repo}.jar", "browser_download_url": f"https://example.com/{repo}.jar"},
+    ]})
+    monkeypatch.setattr(downloader.workspace, "tools_dir", tmp_path / "tools")
+
+    def download_resource(url, name=None, directory=None):
+        with trace.span("download", url=url):
+            (directory / name).write_bytes(b"jar")
+        return directory / name
+    monkeypatch.setattr(downloader, "download_resource", download_resource)
+
+    before = len(trace.spans())
+    with trace.collect() as records, trace.span("build"):
+        files, name = downloader.download_required("revanced")
+
+    assert sorted(f.name for f in files) == ["revanced-cli.jar", "revanced-patches.jar"]
+    downloads = [r for r in records if r["name"] == "download"]
+    assert len(downloads) == 2 and all(r["parent"] == "build" for r in downloads)
+    assert len(trace.spans()) == before
+
+def test_only_store_downloads_are_recorded(monkeypatch, store, tmp_path):
+    recorded = []
+    monkeypatch.setattr(downloader.history, "record", lambda app_name, platform, ok, seconds: recorded.append(ok))
+    monkeypatch.setattr(downloader, "load_config", lambda app_name, platform: {"package": "com.example"})
+    monkeypatch.setattr(patcher, "compatible_versions", lambda package, cli, patches: ["2.0", "1.0"])
+
+    # Nothing supported in the listed range: not the store's fault
+    monkeypatch.setattr(downloader, "available_versions", lambda *args, **kwargs: ["2.1", "1.5", "0.9"])
+    assert downloader.download_platform("example", "apkpure", "cli.jar", "patches.rvp", directory=tmp_path) == (None, None)
+    assert recorded == []
+
+    monkeypatch.setattr(downloader, "available_versions", lambda *args, **kwargs: ["2.0"])
+    path, version = downloader.download_platform("example", "apkpure", "cli.jar", "patches.rvp", directory=tmp_path)
+    assert version == "2.0" and recorded == [True]
+
+    # The second build finds the APK in the cache
+    (tmp_path / "again").mkdir()
+    path, version = downloader.download_platform("example", "apkpure", "cli.jar", "patches.rvp", directory=tmp_path / "again")
+    assert path.parent == tmp_path / "again" and recorded == [True]
+
+    store.get_download_link = lambda version, app_name, config: 1 / 0
+    monkeypatch.setattr(patcher, "compatible_versions", lambda package, cli, patches: ["3.0"])
+    monkeypatch.setattr(downloader, "available_versions", lambda *args, **kwargs: ["3.0"])
+    assert downloader.download_platform("example", "apkpure", "cli.jar", "patches.rvp", directory=tmp_path) == (None, None)
+    assert recorded == [True, False]
@@ -0,0 +1,108 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import pytest
+import requests
+from scripts import replay_server
+from src import fixtures, aptoide
+
+FIXTURES = Path(__file__).resolve().parent.parent / "fixtures"
+
+class _Upstream(BaseHTTPRequestHandler):
+    """Stand-in for a store: JSON at /api, a redirect target at /moved"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/moved"):
+            self.send_response(302)
+            self.send_header("Location", "/api?page=2")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = json.dumps({"path": self.path}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Set-Cookie", "session=secret")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def _start(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+@pytest.fixture
+def upstream():
+    server = _start(ThreadingHTTPServer(("127.0.0.1", 0), _Upstream))
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def replay():
+    servers = []
+
+    def start(directory, **options):
+        server = replay_server.serve(directory, **options)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_record_then_replay(upstream, replay, tmp_path):
+    recorder = fixtures.FixtureSession(requests.Session(), record_dir=str(tmp_path))
+    live = recorder.get(f"{upstream}/api?page=1")
+    moved = recorder.get(f"{upstream}/moved")
+
+    saved = fixtures.load(fixtures.fixture_path(tmp_path, "GET", f"{upstream}/api?page=1"))
+    assert saved["status"] == 200 and saved["body"] == live.content
+    assert "Set-Cookie" not in saved["headers"]
+
+    player = fixtures.FixtureSession(requests.Session(), replay_url=replay(tmp_path))
+    res = player.get(f"{upstream}/api?page=1")
+    assert res.status_code == 200
+    assert res.json() == {"path": "/api?page=1"}
+    assert res.url == f"{upstream}/api?page=1"
+    assert res.headers["ETag"] == '"v1"'
+
+    # The final URL after redirects comes back too
+    assert player.get(f"{upstream}/moved").url == moved.url
+
+    assert player.get(f"{upstream}/api?page=1", headers={"If-None-Match": '"v1"'}).status_code == 304
+
+    miss = player.get(f"{upstream}/api?page=9")
+    assert miss.status_code == 404 and miss.headers["X-Fixture-Miss"] == "1"
+    assert fixtures.stats[f"127.0.0.1:{upstream.rsplit(':', 1)[1]}"] >= 5
+
+def test_injected_errors(upstream, replay, tmp_path):
+    fixtures.FixtureSession(requests.Session(), record_dir=str(tmp_path)).get(f"{upstream}/api")
+
+    url = replay(tmp_path, error_rate=1.0, seed=0)
+    res = fixtures.FixtureSession(requests.Session(), replay_url=url).get(f"{upstream}/api")
+    assert res.status_code == 503 and res.url == f"{upstream}/api"
+    assert requests.get(f"{url}/_stats").json() == {"errors": 1}
+
+    url = replay(tmp_path, error_rate=0.5, seed=1)
+    player = fixtures.FixtureSession(requests.Session(), replay_url=url)
+    codes = [player.get(f"{upstream}/api").status_code for _ in range(40)]
+    assert set(codes) == {200, 503}
+    stats = requests.get(f"{url}/_stats").json()
+    assert stats["errors"] == codes.count(503) and stats["served"] == codes.count(200)
+
+def test_committed_fixtures_replay_aptoide(replay, monkeypatch, tmp_path):
+    index = json.loads((FIXTURES / "index.json").read_text())
+    assert index["platforms"] == ["aptoide"]
+
+    monkeypatch.setattr(aptoide, "session", fixtures.FixtureSession(requests.Session(), replay_url=replay(FIXTURES)))
+    monkeypatch.setattr(aptoide, "index_dir", tmp_path)
+    monkeypatch.setattr(aptoide, "_indexes", {})
+    for app_name in index["apps"]:
+        config = json.loads((FIXTURES.parent / "apps" / "aptoide" / f"{app_name}.json").read_text())
+        version = aptoide.get_latest_version(app_name, config)
+        assert aptoide.get_download_link(version, app_name, config).endswith(".apk")
@@ -0,0 +1,97 @@
+import logging
+import pytest
+from src import github_api, downloader, OfflineError
+
+RELEASE = {
+    "tagName": "v5.0.0",
+    "isPrerelease": False,
+    "createdAt": "2026-10-01T00:00:00Z",
+    "releaseAssets": {"nodes": [
+        {"id": "RA_kwDOA", "name": "cli.jar", "downloadUrl": "https://example.com/cli.jar", "size": 10},
+    ]},
+}
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+class _Session:
+    def __init__(self, body):
+        self.body = body
+        self.queries = []
+
+    def post(self, url, json=None, headers=None):
+        self.queries.append(json["query"])
+        return _Response(self.body)
+
+@pytest.fixture(autouse=True)
+def online(monkeypatch):
+    monkeypatch.setattr(github_api, "github_token", "token")
+    monkeypatch.setattr(github_api.src, "offline", False)
+    monkeypatch.setattr(github_api, "_resolved", {})
+
+def test_prefetch_resolves_from_one_query(monkeypatch):
+    session = _Session({"data": {"r0": {"latestRelease": RELEASE, "releases": {"nodes": [RELEASE]}}}})
+    monkeypatch.setattr(github_api, "session", session)
+
+    github_api.prefetch([("revanced", "revanced-cli", "latest"), ("revanced", "revanced-cli", "v5.0.0")])
+
+    assert len(session.queries) == 1
+    assert "databaseId" not in session.queries[0]
+    release = github_api._resolved[("revanced", "revanced-cli", "latest")]
+    assert release["tag_name"] == "v5.0.0"
+    assert release["assets"][0]["browser_download_url"] == "https://example.com/cli.jar"
+    assert github_api._resolved[("revanced", "revanced-cli", "v5.0.0")] == release
+
+def test_prefetch_logs_errors_of_a_partial_answer(monkeypatch, caplog):
+    session = _Session({
+        "data": {"r0": {"latestRelease": RELEASE, "releases": {"nodes": [RELEASE]}}, "r1": None},
+        "errors": [{"type": "NOT_FOUND", "path": ["r1"], "message": "Could not resolve to a Repository"}],
+    })
+    monkeypatch.setattr(github_api, "session", session)
+
+    with caplog.at_level(logging.WARNING):
+        github_api.prefetch([("revanced", "revanced-cli", "latest"), ("gone", "repo", "latest")])
+
+    assert ("revanced", "revanced-cli", "latest") in github_api._resolved
+    assert ("gone", "repo", "latest") not in github_api._resolved
+    assert "r1: Could not resolve to a Repository" in caplog.text
+
+def test_prefetched_releases_and_tools_are_there_offline(monkeypatch, tmp_path):
+    monkeypatch.setattr(github_api, "cache_dir", tmp_path)
+    monkeypatch.setattr(downloader.workspace, "tools_dir", tmp_path / "tools")
+    monkeypatch.setattr(github_api, "session", _Session({"data": {"r0": {"latestRelease": RELEASE, "releases": {"nodes": [RELEASE]}}}}))
+    downloads = []
+
+    def download_resource(url, name=None, directory=None):
+        downloads.append(url)
+        (directory / name).write_bytes(b"jar")
+        return directory / name
+    monkeypatch.setattr(downloader, "download_resource", download_resource)
+
+    refs = [("revanced", "revanced-cli", "latest"), ("revanced", "revanced-cli", ""), ("revanced", "revanced-cli", "v5.0.0")]
+    github_api.prefetch(refs)
+    asset = github_api.resolve_release("revanced", "revanced-cli", "latest")["assets"][0]
+    online = downloader.download_tool(asset["browser_download_url"], name=asset["name"])
+
+    monkeypatch.setattr(github_api.src, "offline", True)
+    github_api.reset()
+    for ref in refs:
+        assert github_api.resolve_release(*ref)["tag_name"] == "v5.0.0"
+
+    # A REST answer for the same asset has a numeric id but the same URL
+    rest_asset = {"id": 123, "name": "cli.jar", "browser_download_url": asset["browser_download_url"]}
+    assert downloader.download_tool(rest_asset["browser_download_url"], name=rest_asset["name"]) == online
+    assert downloads == ["https://example.com/cli.jar"]
+
+def test_offline_without_a_cache_still_fails(monkeypatch, tmp_path):
+    monkeypatch.setattr(github_api, "cache_dir", tmp_path)
+    monkeypatch.setattr(github_api.src, "offline", True)
+    with pytest.raises(OfflineError):
+        github_api.resolve_release("revanced", "revanced-cli", "")
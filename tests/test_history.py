@@ -0,0 +1,46 @@
+import pytest
+from src import history
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    monkeypatch.setattr(history, "history_path", tmp_path / "platform-history.json")
+    monkeypatch.setattr(history, "_history", None)
+    clock = _Clock()
+    monkeypatch.setattr(history.time, "time", clock)
+    return clock
+
+def test_unknown_platforms_keep_their_order(clock):
+    assert history.order("youtube", ["apkmirror", "apkpure", "uptodown"]) == ["apkmirror", "apkpure", "uptodown"]
+    assert history.success_rate("youtube", "apkmirror") == 0.5
+
+def test_reliable_platform_moves_first(clock):
+    for _ in range(3):
+        history.record("youtube", "apkmirror", False, 5.0)
+        history.record("youtube", "uptodown", True, 5.0)
+    assert history.order("youtube", ["apkmirror", "apkpure", "uptodown"]) == ["uptodown", "apkpure", "apkmirror"]
+
+def test_latency_breaks_ties(clock):
+    history.record("youtube", "apkmirror", True, 9.0)
+    history.record("youtube", "uptodown", True, 1.0)
+    assert history.order("youtube", ["apkmirror", "uptodown"]) == ["uptodown", "apkmirror"]
+
+def test_old_failures_decay(clock):
+    for _ in range(4):
+        history.record("youtube", "apkmirror", False, 1.0)
+    low = history.success_rate("youtube", "apkmirror")
+
+    clock.now += 4 * history.HALF_LIFE
+    history.record("youtube", "apkmirror", True, 1.0)
+    assert history.success_rate("youtube", "apkmirror") > 0.5 > low
+
+def test_history_survives_a_restart(clock, monkeypatch):
+    history.record("youtube", "apkpure", True, 2.0)
+    monkeypatch.setattr(history, "_history", None)
+    assert history.success_rate("youtube", "apkpure") == pytest.approx(2 / 3)
@@ -0,0 +1,88 @@
+import pytest
+from src import patcher
+
+HELP = {
+    "subcommand": "Commands:\n  patch      Patch an APK file.\n  list-patches\n",
+    "unknown": "Error: Unable to access jarfile\n",
+}
+
+@pytest.fixture
+def cli(monkeypatch, tmp_path):
+    monkeypatch.setattr(patcher, "cache_dir", tmp_path / "cache")
+    monkeypatch.setattr(patcher, "_dialects", {})
+    jar = tmp_path / "revanced-cli.jar"
+    jar.write_bytes(b"jar")
+    return jar
+
+def _answers(monkeypatch, help_text):
+    calls = []
+
+    def java(cli, *args):
+        calls.append(args)
+        if args == ("--help",):
+            return help_text
+        if args == ("--version",):
+            return "ReVanced CLI v5.0.1"
+        return "--patches  --purge"
+    monkeypatch.setattr(patcher, "_java", java)
+    return calls
+
+def test_recognised_dialect_is_cached_on_disk(monkeypatch, cli):
+    _answers(monkeypatch, HELP["subcommand"])
+    dialect = patcher.probe_cli(str(cli))
+    assert dialect == {"style": "subcommand", "patches_flag": "--patches", "purge": True, "version": "5.0.1"}
+
+    patcher._dialects.clear()
+    calls = _answers(monkeypatch, HELP["unknown"])
+    assert patcher.probe_cli(str(cli)) == dialect
+    assert calls == []
+
+def test_guessed_dialect_is_not_cached_on_disk(monkeypatch, cli):
+    _answers(monkeypatch, HELP["unknown"])
+    assert patcher.probe_cli(str(cli))["guessed"] is True
+    assert not list(patcher.cache_dir.glob("cli/*.json"))
+
+    patcher.reset()
+    calls = _answers(monkeypatch, HELP["subcommand"])
+    assert patcher.probe_cli(str(cli))["style"] == "subcommand"
+    assert ("--help",) in calls
+    assert "guessed" not in patcher.probe_cli(str(cli))
+
+MIXED_BUNDLE = """\
+Index: 0
+Name: Hide ads
+Description: Removes ads.
+Enabled: true
+Compatible packages:
+\tPackage name: com.google.android.youtube
+
+Index: 1
+Name: Video ads
+Description: Removes video ads.
+Enabled: true
+Compatible packages:
+\tPackage name: com.google.android.youtube
+\tCompatible versions:
+\t\t19.16.39
+\t\t20.07.39
+\t\t19.47.53
+
+Index: 2
+Name: Experimental
+Description: Off by default.
+Enabled: false
+Compatible packages:
+\tPackage name: com.google.android.youtube
+\tCompatible versions:
+\t\t21.01.01
+"""
+
+def test_unpinned_patch_does_not_lift_the_pins_of_others():
+    metadata = {"patches": patcher.parse_patch_list(MIXED_BUNDLE)}
+    assert [p["name"] for p in metadata["patches"]] == ["Hide ads", "Video ads", "Experimental"]
+    assert patcher.supported_versions(metadata, "com.google.android.youtube") == ["20.07.39", "19.47.53", "19.16.39"]
+
+def test_supported_versions_without_pins():
+    metadata = {"patches": patcher.parse_patch_list(MIXED_BUNDLE.split("Index: 1")[0])}
+    assert patcher.supported_versions(metadata, "com.google.android.youtube") is None
+    assert patcher.supported_versions(metadata, "com.example") == []
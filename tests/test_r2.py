@@ -0,0 +1,125 @@
+from datetime import datetime, timezone, timedelta
+import pytest
+from botocore.exceptions import ClientError
+from src import r2
+
+OLD = datetime.now(timezone.utc) - timedelta(days=1)
+NEW = datetime.now(timezone.utc)
+
+class _Paginator:
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(k for k in self.s3.objects if k.startswith(Prefix))
+        for i in range(0, len(keys), 1000):
+            self.s3.calls.append("list_objects_v2")
+            yield {"Contents": [{"Key": k, **self.s3.objects[k]} for k in keys[i:i + 1000]]}
+
+class StubS3:
+    """In-memory stand-in for the few S3 calls r2 makes"""
+
+    def __init__(self, objects=None):
+        self.objects = dict(objects or {})
+        self.calls = []
+        self.deleted_batches = []
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return _Paginator(self)
+
+    def delete_objects(self, Bucket, Delete):
+        self.calls.append("delete_objects")
+        keys = [o["Key"] for o in Delete["Objects"]]
+        assert len(keys) <= 1000
+        self.deleted_batches.append(len(keys))
+        for key in keys:
+            self.objects.pop(key, None)
+        return {}
+
+    def head_object(self, Bucket, Key):
+        self.calls.append("head_object")
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        obj = self.objects[Key]
+        return {"ContentLength": obj["Size"], "ETag": obj.get("ETag", '"x"'), "Metadata": obj.get("Metadata", {})}
+
+    def upload_file(self, path, bucket, key, ExtraArgs=None, Config=None):
+        self.calls.append("upload_file")
+        data = open(path, "rb").read()
+        self.objects[key] = {"Size": len(data), "LastModified": NEW, "Metadata": ExtraArgs["Metadata"]}
+
+@pytest.fixture
+def s3(monkeypatch):
+    stub = StubS3()
+    monkeypatch.setattr(r2, "client", lambda: stub)
+    monkeypatch.setattr(r2, "transfer_config", lambda: None)
+    monkeypatch.setattr(r2, "bucket_name", "bucket")
+    return stub
+
+def test_delete_old_files_batches_over_1000_keys(s3):
+    s3.objects = {f"apps/{i:05}.apk": {"Size": 10, "LastModified": OLD} for i in range(2500)}
+    s3.objects["apps/fresh.apk"] = {"Size": 10, "LastModified": NEW}
+    s3.objects["apps/kept.apk"] = {"Size": 10, "LastModified": OLD}
+
+    count, freed = r2.delete_old_files(s3, "bucket", "apps", keep={"apps/kept.apk"})
+
+    assert (count, freed) == (2500, 25000)
+    assert s3.deleted_batches == [1000, 1000, 500]
+    assert s3.calls.count("list_objects_v2") == 3
+    assert set(s3.objects) == {"apps/fresh.apk", "apps/kept.apk"}
+
+def test_delete_old_files_dry_run(s3):
+    s3.objects = {f"apps/{i}.apk": {"Size": 7, "LastModified": OLD} for i in range(1200)}
+
+    assert r2.delete_old_files(s3, "bucket", "apps", dry_run=True) == (1200, 8400)
+    assert "delete_objects" not in s3.calls
+    assert len(s3.objects) == 1200
+
+def test_upload_skips_unchanged(s3, tmp_path):
+    apk = tmp_path / "app.apk"
+    apk.write_bytes(b"patched")
+
+    assert r2.upload(apk, "apps/app.apk") is True
+    assert r2.upload(apk, "apps/app.apk") is False
+    assert s3.calls.count("upload_file") == 1
+
+    apk.write_bytes(b"patched again")
+    assert r2.upload(apk, "apps/app.apk") is True
+
+def test_is_unchanged_falls_back_to_etag(s3, tmp_path):
+    apk = tmp_path / "app.apk"
+    apk.write_bytes(b"data")
+    s3.objects["apps/app.apk"] = {"Size": 4, "LastModified": NEW, "ETag": f'"{r2._md5(apk)}"'}
+    assert r2.is_unchanged(s3, apk, "apps/app.apk", "unused") is True
+
+    s3.objects["apps/app.apk"]["ETag"] = f'"{r2._md5(apk)}-2"'
+    assert r2.is_unchanged(s3, apk, "apps/app.apk", "unused") is False
+
+def test_upload_sweeps_stale_neighbours(s3, tmp_path):
+    s3.objects = {"apps/old.apk": {"Size": 1, "LastModified": OLD}}
+    apk = tmp_path / "new.apk"
+    apk.write_bytes(b"new")
+
+    r2.upload(apk, "apps/new.apk")
+    assert set(s3.objects) == {"apps/new.apk"}
+
+def test_upload_many_sweeps_once(s3, tmp_path):
+    s3.objects = {"apps/old.apk": {"Size": 1, "LastModified": OLD}}
+    items = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.apk"
+        path.write_bytes(name.encode())
+        items.append((path, f"apps/{name}.apk"))
+
+    assert r2.upload_many(items) == {"apps/a.apk": True, "apps/b.apk": True, "apps/c.apk": True}
+    assert s3.calls.count("list_objects_v2") == 1
+    assert set(s3.objects) == {"apps/a.apk", "apps/b.apk", "apps/c.apk"}
+
+def test_upload_many_dry_run_cleanup_keeps_objects(s3, tmp_path):
+    s3.objects = {"apps/old.apk": {"Size": 1, "LastModified": OLD}}
+    path = tmp_path / "a.apk"
+    path.write_bytes(b"a")
+
+    r2.upload_many([(path, "apps/a.apk")], dry_run_cleanup=True)
+    assert "apps/old.apk" in s3.objects
@@ -0,0 +1,70 @@
+import pytest
+from github import Github
+from scripts import mock_github
+from src import release
+
+REPO = "builder/apks"
+
+@pytest.fixture
+def github(tmp_path):
+    old = tmp_path / "old.apk"
+    old.write_bytes(b"old build")
+    server = mock_github.serve(0, {REPO: [
+        {"tag_name": "youtube-v4.9.0", "assets": [{"name": "youtube-arm64-v8a.apk", "path": old}]},
+        {"tag_name": "youtube-v5.0.0", "assets": [{"name": "youtube-arm64-v8a.apk", "path": old}]},
+    ]})
+    try:
+        yield mock_github.Handler.state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def _repo(github):
+    # No client-side throttling against the local server
+    return Github(base_url=github.base, seconds_between_requests=0, seconds_between_writes=0).get_repo(REPO)
+
+def _artifact(tmp_path, name, apk_name, data):
+    apk = tmp_path / apk_name
+    apk.write_bytes(data)
+    return {"name": name, "patches_name": "patches-5.0.0.rvp", "cli_name": "revanced-cli-5.0.1-all.jar", "apk_file_path": str(apk)}
+
+def test_publish_against_mock_github(github, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    artifacts = [
+        _artifact(out, "youtube", "youtube-arm64-v8a.apk", b"new youtube"),
+        _artifact(out, "tiktok", "tiktok-universal.apk", b"new tiktok"),
+    ]
+    repo = _repo(github)
+
+    plan = release.publish(artifacts, repo)
+
+    assert [r.tag_name for r in plan["delete_releases"]] == ["youtube-v4.9.0"]
+    assert [a.name for a in plan["delete_assets"]] == ["youtube-arm64-v8a.apk"]
+    assert list(plan["create"]) == ["tiktok-v5.0.0"]
+    assert plan["create"]["tiktok-v5.0.0"]["name"] == "Tiktok v5.0.0"
+    assert "**ReVanced CLI:** v5.0.1" in plan["create"]["tiktok-v5.0.0"]["message"]
+    assert [(tag, path.name) for tag, path in plan["upload"]] == [
+        ("youtube-v5.0.0", "youtube-arm64-v8a.apk"),
+        ("tiktok-v5.0.0", "tiktok-universal.apk"),
+    ]
+
+    state = github.repo(REPO)
+    releases = {r["tag_name"]: r for r in state["releases"]}
+    assert set(releases) == {"youtube-v5.0.0", "tiktok-v5.0.0"}
+    for tag, name, data in [("youtube-v5.0.0", "youtube-arm64-v8a.apk", b"new youtube"),
+                            ("tiktok-v5.0.0", "tiktok-universal.apk", b"new tiktok")]:
+        [asset] = releases[tag]["assets"]
+        assert asset["name"] == name
+        assert asset["content_type"] == release.CONTENT_TYPES[".apk"]
+        assert state["blobs"][asset["id"]] == data
+
+def test_publish_again_replaces_in_place(github, tmp_path):
+    artifacts = [_artifact(tmp_path, "youtube", "youtube-arm64-v8a.apk", b"rebuilt")]
+    repo = _repo(github)
+    release.publish(artifacts, repo)
+    plan = release.publish(artifacts, repo)
+
+    assert plan["create"] == {} and plan["delete_releases"] == []
+    [youtube] = github.repo(REPO)["releases"]
+    assert [a["name"] for a in youtube["assets"]] == ["youtube-arm64-v8a.apk"]
@@ -0,0 +1,102 @@
+import json
+import time
+import urllib.request
+import urllib.error
+import pytest
+from src import server, trace, catalog, github_api
+
+@pytest.fixture(autouse=True)
+def stub_catalog(monkeypatch, tmp_path):
+    monkeypatch.setattr(catalog, "refresh", lambda: None)
+    monkeypatch.setattr(catalog, "source", lambda name: {"name": name})
+    monkeypatch.setattr(catalog, "apps", lambda: ["youtube", "broken"])
+    monkeypatch.setattr(trace, "trace_dir", tmp_path / "traces")
+
+def stub_build(app_name, source, arches):
+    with trace.span("download", bytes=100):
+        pass
+    if app_name == "broken":
+        raise RuntimeError("no APK")
+    return [(arch, f"/out/{app_name}-{arch}.apk") for arch in arches or ["universal"]], []
+
+def wait(jobs, job_id):
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id)["state"] in ("queued", "running"):
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+def test_job_runs_and_exports_its_spans(tmp_path):
+    jobs = server.Jobs(stub_build)
+    job = wait(jobs, jobs.submit("youtube", "revanced", ["arm64-v8a"])["id"])
+
+    assert job["state"] == "done"
+    assert job["built"] == ["/out/youtube-arm64-v8a.apk"]
+    assert (tmp_path / "traces" / "trace-youtube-revanced.json").exists()
+    assert not any(r["name"] == "download" for r in trace.spans())
+    assert 'autobuild_span_bytes_total{span="download"} 100' in jobs.metrics()
+
+def test_failed_job_keeps_the_error():
+    jobs = server.Jobs(stub_build)
+    job = wait(jobs, jobs.submit("broken", "revanced")["id"])
+    assert job["state"] == "failed"
+    assert job["error"] == "no APK"
+
+def test_unknown_app_and_arch_are_rejected():
+    jobs = server.Jobs(stub_build)
+    with pytest.raises(ValueError):
+        jobs.submit("nope", "revanced")
+    with pytest.raises(ValueError):
+        jobs.submit("youtube", "revanced", ["mips"])
+
+def test_job_history_is_capped(monkeypatch):
+    monkeypatch.setattr(server, "KEEP_JOBS", 3)
+    jobs = server.Jobs(stub_build)
+    ids = [jobs.submit("youtube", "revanced")["id"] for _ in range(6)]
+    wait(jobs, ids[-1])
+    jobs.submit("youtube", "revanced")
+
+    assert len(jobs.all()) <= 3
+    assert jobs.get(ids[0]) is None
+    assert 'autobuild_span_count{span="download"} 6' in jobs.metrics()
+
+def test_jobs_under_the_cap_are_kept():
+    jobs = server.Jobs(stub_build)
+    ids = [jobs.submit("youtube", "revanced")["id"] for _ in range(80)]
+    wait(jobs, ids[-1])
+    assert len(jobs.all()) == 80
+
+def test_release_lookups_are_forgotten_between_jobs():
+    github_api._resolved[("user", "repo", "latest")] = {"tag_name": "v1"}
+    jobs = server.Jobs(stub_build)
+    wait(jobs, jobs.submit("youtube", "revanced")["id"])
+    assert ("user", "repo", "latest") not in github_api._resolved
+
+def _request(url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=5) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode()
+
+def test_handler_over_http():
+    daemon = server.serve(stub_build, port=0)
+    base = f"http://127.0.0.1:{daemon.server_address[1]}"
+    try:
+        status, body = _request(f"{base}/jobs", {"app": "youtube", "source": "revanced", "arches": "arm64-v8a,armeabi-v7a"})
+        assert status == 202
+        job_id = json.loads(body)["id"]
+        wait(server.Handler.jobs, job_id)
+
+        status, body = _request(f"{base}/jobs/{job_id}")
+        assert status == 200 and json.loads(body)["state"] == "done"
+        assert _request(f"{base}/jobs/999")[0] == 404
+        assert _request(f"{base}/jobs", {"app": "nope", "source": "revanced"})[0] == 400
+        assert _request(f"{base}/jobs", {"source": "revanced"})[0] == 400
+        status, body = _request(f"{base}/metrics")
+        assert status == 200 and 'autobuild_jobs{state="done"} 1' in body
+        assert _request(f"{base}/health") == (200, json.dumps({"ok": True}, indent=2))
+    finally:
+        daemon.shutdown()
+        daemon.server_close()
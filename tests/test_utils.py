@@ -0,0 +1,35 @@
+from src import utils
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_echo_fractional_rate(monkeypatch, capsys):
+    clock = _Clock()
+    monkeypatch.setattr(utils.time, "monotonic", clock)
+    echo = utils._Echo(0.5)
+    for step in range(40):
+        clock.now = step * 0.1
+        echo.write([f"line {step}"])
+    echo.close()
+
+    printed = [line for line in capsys.readouterr().out.splitlines() if line.startswith("line")]
+    # One line up front, then one more every two seconds
+    assert printed == ["line 0", "line 20"]
+
+def test_echo_caps_lines_per_second(monkeypatch, capsys):
+    clock = _Clock()
+    monkeypatch.setattr(utils.time, "monotonic", clock)
+    echo = utils._Echo(10)
+    echo.write([f"line {i}" for i in range(100)])
+    clock.now = 1.0
+    echo.write([f"more {i}" for i in range(100)])
+    echo.close()
+
+    out = capsys.readouterr().out.splitlines()
+    assert sum(line.startswith("line") for line in out) == 10
+    assert sum(line.startswith("more") for line in out) == 10
+    assert out[-1].startswith("  … 90 lines not shown")
@@ -0,0 +1,89 @@
+import random
+import itertools
+import pytest
+from src.version import version_key, highest, sort, is_prerelease
+
+# Each list is in ascending order
+ORDERED = [
+    ["5.1.0-dev.3", "5.1.0-alpha.1", "5.1.0-beta.1", "5.1.0-pre.1", "5.1.0-rc.1", "5.1.0", "5.1.0-release2"],
+    ["1.2.0-dev.1", "1.2.0-dev.2", "1.2.0-dev.10"],
+    ["1.9", "1.10", "1.10.1", "2.0"],
+    ["19.16.39", "19.16.39.1", "19.17", "20.1"],
+    ["v1.0.0-beta.9", "v1.0.0-beta.10", "v1.0.0"],
+    ["not-a-version", "0.0.1"],
+]
+
+@pytest.mark.parametrize("versions", ORDERED)
+def test_ascending(versions):
+    assert sort(reversed(versions)) == versions
+    for lower, higher in zip(versions, versions[1:]):
+        assert version_key(lower) < version_key(higher)
+
+@pytest.mark.parametrize("a, b", [
+    ("1.2", "1.2.0"),
+    ("1.2.0", "1.2.0.0"),
+    ("v3.4.5", "3.4.5"),
+    ("1.0.0-rc.1", "1.0.0-rc1"),
+    ("2.0-preview.1", "2.0-pre.1"),
+])
+def test_equal(a, b):
+    assert version_key(a) == version_key(b)
+
+@pytest.mark.parametrize("a, b", [
+    ("1.10", "1.9"),
+    ("10.0", "9.99.99"),
+    ("1.0.10", "1.0.9"),
+    ("1.0.0-beta.10", "1.0.0-beta.9"),
+])
+def test_numeric_not_lexical(a, b):
+    assert version_key(a) > version_key(b)
+    assert a < b  # the lexical order would get these wrong
+
+@pytest.mark.parametrize("text, expected", [
+    ("5.1.0-dev.3", True),
+    ("1.0.0-alpha", True),
+    ("App 1.2.3 beta", True),
+    ("2.0-preview.1", True),
+    ("4.0.0-rc.2", True),
+    ("1.2.0-release2", False),
+    ("1.2.0", False),
+    ("", False),
+    (None, False),
+    ("developer-edition 1.0", False),
+])
+def test_is_prerelease(text, expected):
+    assert is_prerelease(text) is expected
+
+def test_highest():
+    assert highest(["1.9", "1.10", "1.10-beta.1"]) == "1.10"
+    assert highest(["", None, "0.1"]) == "0.1"
+    assert highest([]) is None
+
+def _random_version(rng: random.Random) -> str:
+    numbers = ".".join(str(rng.randint(0, 12)) for _ in range(rng.randint(1, 4)))
+    stage = rng.choice(["", "-dev", "-alpha", "-beta", "-pre", "-preview", "-rc", "-release"])
+    counter = f".{rng.randint(0, 12)}" if stage and rng.random() < 0.7 else ""
+    return rng.choice(["", "v"]) + numbers + stage + counter
+
+def test_order_is_total_and_consistent():
+    rng = random.Random(0)
+    versions = [_random_version(rng) for _ in range(300)] + ["junk", ""]
+    keys = {v: version_key(v) for v in versions}
+
+    for a, b in itertools.combinations(versions, 2):
+        # Exactly one of <, ==, > holds, and it is antisymmetric
+        assert (keys[a] < keys[b]) + (keys[a] == keys[b]) + (keys[a] > keys[b]) == 1
+        assert (keys[a] < keys[b]) == (keys[b] > keys[a])
+
+    ordered = [keys[v] for v in sort(versions)]
+    assert ordered == sorted(keys[v] for v in versions)
+    assert [keys[v] for v in sort(reversed(versions))] == ordered
+    assert [keys[v] for v in sort(versions, reverse=True)] == ordered[::-1]
+    assert keys[highest(versions)] == ordered[-1]
+
+def test_transitive_sample():
+    rng = random.Random(1)
+    versions = [_random_version(rng) for _ in range(60)]
+    for a, b, c in itertools.permutations(versions, 3):
+        if version_key(a) <= version_key(b) <= version_key(c):
+            assert version_key(a) <= version_key(c)